@@ -79,13 +79,95 @@ recognize_speech(audio_file)
 # In[144]:
 
 
+import os
+import queue
 import pyaudio
 import wave
 import time
 import threading
+import soundfile as sf
 from datetime import datetime
 
-def save_audio_from_microphone(output_folder, sample_rate):
+class CaptureSession:
+    def __init__(self, sample_rate, channels = 1, frames_per_buffer = 1024, input_device_index = None):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.frames_per_buffer = frames_per_buffer
+        self.input_device_index = input_device_index
+        self.bytes_per_frame = 2 * channels # 16-bit samples
+        self.frames = queue.Queue() # Recorded audio; None is put on it once the recording has stopped
+        self.started = threading.Event()
+        self.start_time = None # Stream clock time at which to start/stop keeping samples
+        self.stop_time = None
+        self.start_timestamp = None # Wall-clock time of the first recorded sample
+        self.frames_captured = 0
+        self.finished = False
+
+    def open(self):
+        # Initialize PyAudio and open the stream right away, so the device is already running by the time we start recording
+        self.audio = pyaudio.PyAudio()
+        self.stream = self.audio.open(format = pyaudio.paInt16,
+                                      channels = self.channels,
+                                      rate = self.sample_rate,
+                                      input = True,
+                                      input_device_index = self.input_device_index,
+                                      frames_per_buffer = self.frames_per_buffer,
+                                      stream_callback = self.callback) # PortAudio calls this with every buffer it captures
+        # Offset between the stream's sample clock and the wall clock, used to timestamp the recording
+        self.clock_offset = time.time() - self.stream.get_time()
+        self.input_latency = self.stream.get_input_latency()
+
+    def callback(self, in_data, frame_count, time_info, status):
+        if self.start_time is None or self.finished:
+            return (None, pyaudio.paContinue) # Still warming up (or already done), so the buffer is discarded
+
+        # Time at which the first sample of this buffer was captured by the sound card
+        adc_time = time_info.get("input_buffer_adc_time") or (time_info["current_time"] - self.input_latency)
+        buffer_end_time = adc_time + frame_count / self.sample_rate
+
+        # Keep only the samples captured between the start and stop times
+        first = max(0, min(frame_count, int(round((self.start_time - adc_time) * self.sample_rate))))
+        last = frame_count
+        if self.stop_time is not None:
+            last = max(first, min(frame_count, int(round((self.stop_time - adc_time) * self.sample_rate))))
+
+        if last > first:
+            if not self.started.is_set():
+                self.start_timestamp = adc_time + first / self.sample_rate + self.clock_offset
+                self.started.set()
+            self.frames.put(in_data[first * self.bytes_per_frame:last * self.bytes_per_frame])
+            self.frames_captured += last - first
+
+        if self.stop_time is not None and self.stop_time <= buffer_end_time:
+            self.finished = True
+            if not self.started.is_set():
+                self.start_timestamp = self.start_time + self.clock_offset
+                self.started.set()
+            self.frames.put(None)
+        return (None, pyaudio.paContinue)
+
+    def start(self, at = None):
+        # Ready signal: samples captured from this moment (or from the given wall-clock time) on are kept
+        self.start_time = self.stream.get_time() if at is None else at - self.clock_offset
+
+    def stop(self, at = None):
+        self.stop_time = self.stream.get_time() if at is None else at - self.clock_offset
+
+    @property
+    def duration(self):
+        # Based on the number of samples recorded rather than the wall clock
+        return self.frames_captured / self.sample_rate
+
+    def close(self):
+        self.stream.stop_stream()
+        self.stream.close()
+        self.audio.terminate()
+
+def save_audio_from_microphone(output_folder, sample_rate, file_format = "wav"):
+    # Open and warm up the microphone before the countdown, so device initialization never cuts off the start of the speech
+    session = CaptureSession(sample_rate)
+    session.open()
+
     print("Press Enter to start recording...")
     input()
 
@@ -94,78 +176,75 @@ def save_audio_from_microphone(output_folder, sample_rate):
         print(i)
         time.sleep(1)
 
+    session.start()
     print()
     print("Recording started. Speak now...")
     print()
-    start_time = time.time()
-
-    # Create a stop event
-    stop_event = threading.Event()
 
-    def stop_recording():
-        # Set the stop event when the user presses Enter again
-        input("Press Enter again to stop recording...")
-        print()
-        stop_event.set()
-
-    # Start recording audio from the default microphone in a separate thread
-    recording_thread = threading.Thread(target = record_audio, args = (output_folder, sample_rate, start_time, stop_event))
+    # Save the audio captured from the default microphone in a separate thread
+    recording_thread = threading.Thread(target = record_audio, args = (output_folder, session, file_format))
     recording_thread.start()
 
-    stop_recording()
+    # Stop the recording when the user presses Enter again
+    input("Press Enter again to stop recording...")
+    print()
+    session.stop()
 
     # Wait for the recording thread to finish
     recording_thread.join()
+    session.close()
+
+def encode_flac(file_path, sample_rate, frame_queue):
+    # Losslessly encode the audio frames to FLAC as they arrive from the recording loop
+    with sf.SoundFile(file_path, 'w', samplerate = sample_rate, channels = 1, format = 'FLAC', subtype = 'PCM_16') as flac_file:
+        while True:
+            data = frame_queue.get()
+            if data is None: # The recording loop puts None on the queue once it has stopped
+                break
+            flac_file.buffer_write(data, dtype = 'int16')
 
-def record_audio(output_folder, sample_rate, start_time, stop_event):
-    # Initialize PyAudio
-    audio = pyaudio.PyAudio()
+def record_audio(output_folder, session, file_format = "wav"):
+    # Wait for the first sample so the recording can be named after the moment it was actually captured
+    session.started.wait()
+    timestamp = datetime.fromtimestamp(session.start_timestamp).strftime("%Y-%m-%d_%H-%M-%S") # Note, we utilize current timestamp to name our recordings!!
+    file_name = f"recording_{timestamp}.{file_format}"
+    file_path = os.path.join(output_folder, file_name)
 
-    # Open audio stream
-    stream = audio.open(format = pyaudio.paInt16, # Specifies the format of the audio data, in this case, pyaudio.paInt16 represents 16-bit signed integer format.
-                        channels = 1, # Specifies the number of audio channels to record, in this case, 1 for mono audio.
-                        rate = sample_rate, # Specifies the sample rate of the audio stream, which is set to sample_rate variable.
-                        input = True, # Sets the audio stream for input (recording) mode.
-                        frames_per_buffer = 1024) # Specifies the number of audio frames to read at a time, which is set to 1024.
+    if file_format == "flac":
+        # Encode the frames to FLAC while the microphone keeps recording
+        encode_flac(file_path, session.sample_rate, session.frames)
+    else:
+        frames = [] # This line initializes an empty list called frames. This list will be used to store the audio frames captured from the microphone. Each audio frame contains a chunk of audio data.
 
-    frames = [] # This line initializes an empty list called frames. This list will be used to store the audio frames captured from the microphone. Each audio frame contains a chunk of audio data.
+        # Collect audio until the session signals that the recording has stopped
+        while True:
+            data = session.frames.get()
+            if data is None:
+                break
+            frames.append(data)
 
-    # Record audio until the stop event is set
-    while not stop_event.is_set():
-        data = stream.read(1024)
-        frames.append(data)
+        # Save the recorded audio as a WAV file
+        wf = wave.open(file_path, 'wb')
+        wf.setnchannels(1)
+        wf.setsampwidth(pyaudio.get_sample_size(pyaudio.paInt16))
+        wf.setframerate(session.sample_rate)
+        wf.writeframes(b''.join(frames))
+        wf.close()
 
     print("Recording finished.")
     print()
-
-    # Stop the stream and close the audio stream
-    stream.stop_stream()
-    stream.close()
-    audio.terminate()
-
-    # Calculate the duration of the recording
-    end_time = time.time()
-    duration = end_time - start_time
-
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S") # Note, we utilize current timestamp to name our recordings!!
-    file_name = f"recording_{timestamp}.wav"
-
-    # Save the recorded audio as a WAV file
-    file_path = os.path.join(output_folder, file_name)
-    wf = wave.open(file_path, 'wb')
-    wf.setnchannels(1)
-    wf.setsampwidth(audio.get_sample_size(pyaudio.paInt16))
-    wf.setframerate(sample_rate)
-    wf.writeframes(b''.join(frames))
-    wf.close()
-
     print(f"Audio saved as '{file_name}'.")
+    print(f"Started at {datetime.fromtimestamp(session.start_timestamp).isoformat(timespec = 'milliseconds')}, duration: {session.duration:.3f} seconds")
 
 
 # This code allows you to record audio from the microphone and save it as a WAV file. It prompts the user to start the recording and displays a countdown. The audio is recorded in a separate thread until the user presses Enter again to stop it. The duration of the recording is calculated, and the recorded audio is saved as a WAV file in the specified output directory.
 # 
+# Note that the microphone is opened by the __CaptureSession__ before the countdown even starts. Opening an audio device can take a noticeable fraction of a second, and if we only did it once the countdown was over, the first words spoken would be lost. Instead, the stream is already running (and its buffers are simply discarded) while we count down, and the countdown ending is the signal to start keeping samples. Every buffer PortAudio hands us comes with the time at which its first sample was captured, measured on the stream's own sample clock, so the session can start and stop exactly on the right sample and timestamp the recording with the moment its first sample was captured (taking the input latency into account). The duration is computed from the number of samples recorded rather than from the wall clock, which makes both the timestamps and the durations accurate enough to line the recording up with other audio or video streams.
+# 
 # Note, the parameter __sample_rate__ in the __save_audio_from_microphone__ function controls the sample rate at which the audio is captured. The sample rate refers to the number of samples (audio data points) captured per second during the recording. It is measured in Hertz (Hz). A higher sample rate provides a more accurate representation of the audio waveform but also results in larger file sizes. Common sample rates include 44100 Hz (CD quality), 48000 Hz (DVD quality), and 16000 Hz (standard for speech recognition). You can adjust the __sample_rate__ parameter to match your desired audio quality and storage constraints.
 # 
+# Storage can also be reduced by setting __file_format__ to "flac". In that case the frames are not kept in memory; instead, a background thread losslessly encodes them to a FLAC file while the recording is still going. FLAC files are typically half the size of the equivalent WAV file (or less), which also means fewer bytes to upload to Google Cloud Storage later on, and the __Google Cloud Speech-to-Text API__ accepts them directly without any loss in accuracy.
+# 
 
 # In[145]:
 
@@ -173,7 +252,129 @@ def record_audio(output_folder, sample_rate, start_time, stop_event):
 # Example usage
 output_folder = '/Users/Jesse/Desktop/Speech_Recognition_Exercise/Recordings'
 sample_rate = 16000  # Audio sample rate in hertz
-save_audio_from_microphone(output_folder, sample_rate)
+file_format = "wav"  # Set to "flac" to encode the recording to FLAC while capturing
+save_audio_from_microphone(output_folder, sample_rate, file_format)
+
+
+# ### Recording from Several Microphones
+# 
+# In a meeting room with one microphone per participant (or an audio interface with several inputs), it is much easier to transcribe each speaker from their own track than to rely on diarization to separate them afterwards. The code below records from several input devices, or several channels of the same device, at the same time. Each source gets its own __CaptureSession__, whose callback fills that source's own buffer queue, and its own writer thread. All sessions are told to start (and stop) at the same wall-clock time, which each session converts to its own sample clock, so the tracks line up sample for sample. The recording can be saved either as one mono file per channel, ready to be transcribed in parallel, or as a single interleaved file with one channel per input.
+
+# In[146]:
+
+
+import os
+import time
+import threading
+import numpy as np
+import pyaudio
+import soundfile as sf
+from datetime import datetime
+
+def list_input_devices():
+    audio = pyaudio.PyAudio()
+    devices = []
+    for index in range(audio.get_device_count()):
+        info = audio.get_device_info_by_index(index)
+        if info["maxInputChannels"] > 0:
+            devices.append((index, info["name"], info["maxInputChannels"]))
+    audio.terminate()
+    return devices
+
+def read_session_frames(session):
+    # Yield the session's buffers as (num_frames, channels) arrays until the recording stops
+    while True:
+        data = session.frames.get()
+        if data is None:
+            return
+        yield np.frombuffer(data, dtype = np.int16).reshape(-1, session.channels)
+
+def write_channels(session, file_paths, file_format):
+    # One mono file per channel of this source
+    files = [sf.SoundFile(path, 'w', samplerate = session.sample_rate, channels = 1, format = file_format.upper(), subtype = 'PCM_16')
+             for path in file_paths]
+    for block in read_session_frames(session):
+        for channel, sound_file in enumerate(files):
+            sound_file.write(block[:, channel])
+    for sound_file in files:
+        sound_file.close()
+
+def write_interleaved(sessions, file_path, file_format):
+    # One file with the channels of every source side by side, written as soon as every source has delivered the samples
+    total_channels = sum(session.channels for session in sessions)
+    readers = [read_session_frames(session) for session in sessions]
+    pending = [np.zeros((0, session.channels), dtype = np.int16) for session in sessions]
+    finished = [False] * len(sessions)
+
+    with sf.SoundFile(file_path, 'w', samplerate = sessions[0].sample_rate, channels = total_channels,
+                      format = file_format.upper(), subtype = 'PCM_16') as sound_file:
+        while not all(finished):
+            for i, reader in enumerate(readers):
+                if not finished[i]:
+                    block = next(reader, None)
+                    if block is None:
+                        finished[i] = True
+                    else:
+                        pending[i] = np.concatenate([pending[i], block])
+            # Write the part that every source has already captured
+            ready = min(len(samples) for samples in pending)
+            if ready:
+                sound_file.write(np.hstack([samples[:ready] for samples in pending]))
+                pending = [samples[ready:] for samples in pending]
+
+        # Pad sources that stopped a few samples early so the file ends cleanly
+        longest = max(len(samples) for samples in pending)
+        if longest:
+            sound_file.write(np.hstack([np.pad(samples, ((0, longest - len(samples)), (0, 0))) for samples in pending]))
+
+def record_multichannel(output_folder, sources, sample_rate, output_mode = "per_channel", file_format = "wav"):
+    # sources is a list of (device index, number of channels) pairs
+    sessions = [CaptureSession(sample_rate, channels = channels, input_device_index = device_index)
+                for device_index, channels in sources]
+    for session in sessions:
+        session.open()
+
+    input("Press Enter to start recording...")
+
+    # A common start time slightly in the future, so every stream is already running when it is reached
+    start_timestamp = time.time() + 0.1
+    for session in sessions:
+        session.start(at = start_timestamp)
+
+    timestamp = datetime.fromtimestamp(start_timestamp).strftime("%Y-%m-%d_%H-%M-%S")
+    if output_mode == "per_channel":
+        writers = []
+        for session, (device_index, channels) in zip(sessions, sources):
+            file_paths = [os.path.join(output_folder, f"recording_{timestamp}_device{device_index}_ch{channel}.{file_format}")
+                          for channel in range(channels)]
+            writers.append(threading.Thread(target = write_channels, args = (session, file_paths, file_format)))
+    else:
+        file_path = os.path.join(output_folder, f"recording_{timestamp}_multichannel.{file_format}")
+        writers = [threading.Thread(target = write_interleaved, args = (sessions, file_path, file_format))]
+
+    for writer in writers:
+        writer.start()
+
+    print("Recording started. Speak now...")
+    input("Press Enter again to stop recording...")
+    print()
+
+    stop_timestamp = time.time()
+    for session in sessions:
+        session.stop(at = stop_timestamp)
+    for writer in writers:
+        writer.join()
+    for session in sessions:
+        session.close()
+
+    print("Recording finished.")
+    for session, (device_index, channels) in zip(sessions, sources):
+        print(f"Device {device_index}: {channels} channel(s), {session.duration:.3f} seconds")
+
+# Example usage
+print(list_input_devices())
+sources = [(0, 1), (1, 1)] # (device index, number of channels) for each microphone, e.g. [(2, 4)] for four inputs of one interface
+record_multichannel(output_folder, sources, sample_rate, output_mode = "per_channel") # or "interleaved"
 
 
 # ### Upload & Convert Audio Files
@@ -374,6 +575,125 @@ for file_num in selected_files:
 # 
 # We will move on to working with __Google Cloud Speech API__, which requires API credentials. The __Google Cloud Speech-to-Text API__ provides advanced speech recognition capabilities, including the ability to recognize and include punctuation marks in the transcriptions. We may also want to be able to translate numeric information into text for further natural language processing (NLP) analysis, as well as distinguish the number of users and their lines (i.e, diarization) to count the number of conversational turns, for example, and this can be all done through the __Google Cloud Speech API__.
 
+# ### Transcribing Long Audio Files
+# 
+# Both __recognize_speech__ and __transcribe_audio__ call __r.record(source)__, which reads the entire file into a single block of memory before anything is sent to the recognizer. That is fine for the short recordings above, but a multi-hour recording would need gigabytes of memory, and we would have to wait for the whole file to be read before the first word is recognized. Since a WAV file is just a short header followed by raw PCM samples, we can instead memory-map the file and hand out windows of it (say 30 seconds at a time) directly from the mapped data. The operating system only loads the parts of the file we actually touch, so memory use stays bounded no matter how long the recording is, and recognition of the first window can start immediately.
+
+# In[64]:
+
+
+import os
+import mmap
+import struct
+import numpy as np
+import speech_recognition as sr
+
+class WavWindowReader:
+    def __init__(self, audio_file):
+        self.file = open(audio_file, "rb")
+        self.mapped = None
+        try:
+            self.mapped = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+            data_offset, data_size = self.read_header()
+        except BaseException:
+            # Not a file that can be mapped; nobody else holds the handles to close them
+            if self.mapped is not None:
+                self.mapped.close()
+            self.file.close()
+            raise
+
+        # A (num_frames, channels) view of the samples; nothing is read from disk until a window is used
+        num_frames = data_size // (self.sample_width * self.channels)
+        self.samples = np.frombuffer(self.mapped, dtype = f"<i{self.sample_width}", count = num_frames * self.channels,
+                                     offset = data_offset).reshape(num_frames, self.channels)
+
+    def read_header(self):
+        # Walk the RIFF chunks to find the format description and where the PCM data starts
+        if self.mapped[0:4] != b"RIFF" or self.mapped[8:12] != b"WAVE":
+            raise ValueError("Not a WAV file")
+        position = 12
+        while position + 8 <= len(self.mapped):
+            chunk_id, chunk_size = struct.unpack("<4sI", self.mapped[position:position + 8])
+            if chunk_id == b"fmt ":
+                audio_format, self.channels, self.sample_rate = struct.unpack("<HHI", self.mapped[position + 8:position + 16])
+                self.sample_width = struct.unpack("<H", self.mapped[position + 22:position + 24])[0] // 8
+                if audio_format != 1 or self.sample_width not in (2, 4):
+                    raise ValueError("Only 16-bit and 32-bit PCM WAV files can be memory-mapped")
+            elif chunk_id == b"data":
+                return position + 8, min(chunk_size, len(self.mapped) - position - 8)
+            position += 8 + chunk_size + (chunk_size % 2) # Chunks are padded to an even size
+        raise ValueError("WAV file has no data chunk")
+
+    @property
+    def duration(self):
+        return len(self.samples) / self.sample_rate
+
+    def window(self, start_seconds, duration_seconds):
+        # Zero-copy NumPy slice of the samples between the two offsets
+        start = int(start_seconds * self.sample_rate)
+        end = start + int(duration_seconds * self.sample_rate)
+        return self.samples[start:end]
+
+    def window_bytes(self, start_seconds, duration_seconds):
+        # The same window as a memoryview over the mapped file
+        return memoryview(self.window(start_seconds, duration_seconds)).cast("B")
+
+    def iter_windows(self, window_seconds = 30, overlap_seconds = 0):
+        # Checked here rather than in the generator, so bad arguments fail at the call instead of at the first window;
+        # an overlap as long as the window would never move past the first window
+        if window_seconds <= 0:
+            raise ValueError(f"window_seconds must be positive, got {window_seconds}")
+        if not 0 <= overlap_seconds < window_seconds:
+            raise ValueError(f"overlap_seconds must be at least 0 and less than window_seconds ({window_seconds}), got {overlap_seconds}")
+        return self.generate_windows(window_seconds, window_seconds - overlap_seconds)
+
+    def generate_windows(self, window_seconds, step_seconds):
+        start_seconds = 0.0
+        while start_seconds < self.duration:
+            yield start_seconds, self.window(start_seconds, window_seconds)
+            start_seconds += step_seconds
+
+    def close(self):
+        # Drop our view first; the mapping cannot be closed while it is still referenced
+        self.samples = None
+        try:
+            self.mapped.close()
+        except BufferError:
+            pass # Windows handed out earlier are still in use; the mapping is released once they are garbage collected
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def transcribe_audio_windows(audio_file, window_seconds = 30):
+    # Initialize the recognizer once and feed it one window at a time
+    r = sr.Recognizer()
+
+    with WavWindowReader(audio_file) as reader:
+        for start_seconds, window in reader.iter_windows(window_seconds):
+            # Only mono audio can be recognized, so multi-channel windows are downmixed first
+            if reader.channels > 1:
+                window = window.mean(axis = 1).astype(window.dtype)
+            # AudioData needs its own bytes, so this is the only copy made, and only of the current window
+            audio = sr.AudioData(window.tobytes(), reader.sample_rate, reader.sample_width)
+            try:
+                yield start_seconds, r.recognize_google(audio)
+            except sr.UnknownValueError:
+                print(f"Speech recognition could not understand audio at {start_seconds:.0f} seconds")
+            except sr.RequestError as e:
+                print(f"Could not request results from speech recognition service: {e}")
+
+# Example usage
+audio_file = '/Users/Jesse/Desktop/Speech_Recognition_Exercise/Recordings/small_talk_everyday_english_mono.wav'
+for start_seconds, text in transcribe_audio_windows(audio_file):
+    print(f"[{start_seconds:.0f}s] {text}")
+
+
+# Because __transcribe_audio_windows__ is a generator, each window's transcription is printed as soon as it is ready. Keep in mind that a fixed window may cut a word in half at its boundaries; passing a small __overlap_seconds__ to __iter_windows__ (e.g., 1 second) reduces the chance of losing a word at the cost of occasionally transcribing it twice.
+
 # Note, if you want to listen to the audio file and compare it it to transcription above run the following: 
 
 # In[83]:
@@ -465,6 +785,61 @@ os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = '/path/to/service_account_key.jso
 
 # 3. After setting the environment variable, you can use the Google Cloud Speech-to-Text API in your notebook without explicitly specifying the credentials. The API client libraries will automatically look for the GOOGLE_APPLICATION_CREDENTIALS environment variable to authenticate the requests. 
 
+# ### Avoiding Duplicate Uploads
+
+# Naming the objects in our bucket after the audio files themselves has a couple of drawbacks: the same recording saved under two different names is uploaded twice, a file that was re-recorded under an existing name is wrongly skipped, and every single file costs an extra request to Google Cloud Storage just to check whether it already exists. Instead, we can name each object after a hash of its audio content and keep a small local manifest that maps each hash to its GCS URI. Recordings we have already uploaded are then skipped without touching the network at all, and the manifest can be rebuilt from a single listing of the bucket whenever it gets out of sync.
+
+# In[65]:
+
+
+import os
+import json
+import hashlib
+import soundfile as sf
+from google.cloud import storage
+
+def hash_audio_pcm(local_file, block_size = 65536):
+    # Hash the decoded samples (plus the container format, sample rate and channel count) rather than the file name
+    sha = hashlib.sha256()
+    with sf.SoundFile(local_file, "r") as sound_file:
+        sha.update(f"{sound_file.format}:{sound_file.samplerate}:{sound_file.channels}".encode())
+        for block in sound_file.blocks(blocksize = block_size, dtype = 'int16'):
+            sha.update(block.tobytes())
+    return sha.hexdigest()
+
+def load_upload_manifest(manifest_file):
+    if not os.path.exists(manifest_file):
+        return {}
+    with open(manifest_file, "r") as f:
+        return json.load(f)
+
+def save_upload_manifest(manifest, manifest_file):
+    # Write to a temporary file first so an interrupted run never leaves a half-written manifest behind
+    temp_file = manifest_file + ".tmp"
+    with open(temp_file, "w") as f:
+        json.dump(manifest, f, indent = 2, sort_keys = True)
+    os.replace(temp_file, manifest_file)
+
+def reconcile_upload_manifest(manifest, gcs_bucket, gcs_folder):
+    # Rebuild the manifest entries for this bucket folder from a single (paginated) listing of the bucket
+    client = storage.Client()
+    prefix = f"gs://{gcs_bucket}/{gcs_folder}/"
+    listed = {}
+    for blob in client.list_blobs(gcs_bucket, prefix = f"{gcs_folder}/"):
+        audio_hash = os.path.splitext(os.path.basename(blob.name))[0]
+        listed[audio_hash] = f"gs://{gcs_bucket}/{blob.name}"
+
+    # Drop entries whose objects were deleted from the bucket, then add the ones we did not know about
+    for audio_hash, gcs_uri in list(manifest.items()):
+        if gcs_uri.startswith(prefix) and audio_hash not in listed:
+            del manifest[audio_hash]
+    manifest.update(listed)
+    print(f"Manifest reconciled with {len(listed)} objects in {prefix}")
+    return manifest
+
+
+# The __hash_audio_pcm__ function reads the audio in blocks, so even long recordings are hashed without loading them into memory at once. Because the hash is computed over the decoded samples, renaming a file does not change it, while re-recording a file under the same name does. The __upload_audio_to_gcs__ functions below use it to name each object __<gcs_folder>/<hash>.<extension>__ and record the resulting URI in the manifest.
+
 # ### Transcribe Audio Files with Punctuation
 
 # In[86]:
@@ -475,6 +850,7 @@ import os
 import soundfile as sf
 from google.cloud import storage
 from google.cloud import speech
+from google.api_core.exceptions import PreconditionFailed
 from num2words import num2words
 
 # Disable debug messages from google.auth
@@ -486,23 +862,34 @@ logging.getLogger('google.api_core').setLevel(logging.WARNING)
 # Disable debug messages from urllib3
 logging.getLogger('urllib3').setLevel(logging.WARNING)
 
-def upload_audio_to_gcs(local_file, gcs_bucket, gcs_filename):
+def upload_audio_to_gcs(local_file, gcs_bucket, gcs_folder, manifest):
     file_name = os.path.basename(local_file)
+    audio_hash = hash_audio_pcm(local_file)
+
+    # Known content is skipped without a single request to GCS
+    if audio_hash in manifest:
+        print(f"File {file_name} already uploaded as {manifest[audio_hash]}. Skipping upload.")
+        return manifest[audio_hash]
+
     print(f"Uploading {file_name} to GCS Bucket: {gcs_bucket}...")
     print()
     client = storage.Client()
     bucket = client.bucket(gcs_bucket)
+    gcs_filename = f"{gcs_folder}/{audio_hash}{os.path.splitext(file_name)[1]}"
     blob = bucket.blob(gcs_filename)
 
-    if blob.exists():
-        print(f"File {gcs_filename} already exists. Skipping upload.")
-    else:
-        blob.upload_from_filename(local_file)
+    # Only create the object if it does not exist yet, instead of checking with a separate request first
+    try:
+        blob.upload_from_filename(local_file, if_generation_match = 0)
         print(f"File {gcs_filename} uploaded successfully.")
+    except PreconditionFailed:
+        print(f"File {gcs_filename} already exists. Skipping upload.")
 
-    return f"gs://{gcs_bucket}/{gcs_filename}"
+    manifest[audio_hash] = f"gs://{gcs_bucket}/{gcs_filename}"
+    return manifest[audio_hash]
 
-def transcribe_audio(gcs_uri, convert_numeric_to_text = True, sample_rate = None):
+def transcribe_audio(gcs_uri, convert_numeric_to_text = True, sample_rate = None,
+                     encoding = speech.RecognitionConfig.AudioEncoding.LINEAR16):
     print(f"Transcribing with punctuation...")
     print()
     client = speech.SpeechClient()
@@ -510,7 +897,7 @@ def transcribe_audio(gcs_uri, convert_numeric_to_text = True, sample_rate = None
     # Configure the audio settings
     audio = speech.RecognitionAudio(uri = gcs_uri)
     config = speech.RecognitionConfig(
-        encoding = speech.RecognitionConfig.AudioEncoding.LINEAR16,
+        encoding = encoding,
         sample_rate_hertz = sample_rate,
         language_code = "en-US",
         enable_automatic_punctuation = True,
@@ -549,7 +936,7 @@ def save_transcription(transcription, text_filename):
 def list_audio_files(directory):
     audio_files = []
     for file in os.listdir(directory):
-        if file.endswith(".wav"):
+        if file.endswith((".wav", ".flac")):
             audio_files.append(file)
     return audio_files
 
@@ -574,22 +961,37 @@ def measure_sample_rate(local_file):
         sample_rate = sound_file.samplerate
     return sample_rate
 
+def get_audio_encoding(local_file):
+    # Pick the encoding from the file's container so FLAC recordings are not sent as LINEAR16
+    with sf.SoundFile(local_file, "r") as sound_file:
+        file_format = sound_file.format
+    if file_format == "FLAC":
+        return speech.RecognitionConfig.AudioEncoding.FLAC
+    return speech.RecognitionConfig.AudioEncoding.LINEAR16
+
 def main():
     directory = "/Users/Jesse/Desktop/Speech_Recognition_Exercise/Recordings" # /path/to/audio/files
     gcs_bucket = "sample-voice-recordings" # your-gcs-bucket
     gcs_folder = "audio_files" # your-gcs-bucket-folder
     text_folder = "/Users/Jesse/Desktop/Speech_Recognition_Exercise/Transcriptions/WithPunctuation" # /path/to/transcriptions
+    manifest_file = os.path.join(directory, "gcs_manifest.json") # maps audio hashes to their GCS URIs
+    reconcile_manifest = False # Set to True to sync the manifest with the bucket before uploading
+
+    manifest = load_upload_manifest(manifest_file)
+    if reconcile_manifest:
+        manifest = reconcile_upload_manifest(manifest, gcs_bucket, gcs_folder)
 
     audio_files = list_audio_files(directory)
     selected_files = select_files(audio_files)
 
     for audio_file in selected_files:
         local_file = os.path.join(directory, audio_file)
-        gcs_filename = os.path.join(gcs_folder, audio_file)
-        gcs_uri = upload_audio_to_gcs(local_file, gcs_bucket, gcs_filename)
+        gcs_uri = upload_audio_to_gcs(local_file, gcs_bucket, gcs_folder, manifest)
+        save_upload_manifest(manifest, manifest_file)
         sample_rate = measure_sample_rate(local_file)
-        transcription = transcribe_audio(gcs_uri, convert_numeric_to_text = True, sample_rate = sample_rate) # Set the flag to True or False for numeric conversion to text
-        text_filename = os.path.join(text_folder, audio_file.replace(".wav", ".txt"))
+        encoding = get_audio_encoding(local_file)
+        transcription = transcribe_audio(gcs_uri, convert_numeric_to_text = True, sample_rate = sample_rate, encoding = encoding) # Set the flag to True or False for numeric conversion to text
+        text_filename = os.path.join(text_folder, os.path.splitext(audio_file)[0] + ".txt")
         save_transcription(transcription, text_filename)
         print(f"Transcription saved for {audio_file}")
         print("Transcription:")
@@ -604,12 +1006,12 @@ if __name__ == "__main__":
 # Here's a more detailed breakdown of what the code does:
 # 
 # 1. It imports the necessary modules and sets the log levels to enable/disable debug messages.
-# 2. The __upload_audio_to_gcs__ function takes a local audio file, Google Cloud Storage bucket, and filename as input. It uploads the audio file to the specified bucket in Google Cloud Storage (GCS). Saving the data in the GCS bucket is needed to utilize the API. 
+# 2. The __upload_audio_to_gcs__ function takes a local audio file, Google Cloud Storage bucket, folder, and upload manifest as input. It uploads the audio file to the specified bucket in Google Cloud Storage (GCS) under a name derived from its content hash, unless the manifest shows that the same audio was uploaded before. Saving the data in the GCS bucket is needed to utilize the API. 
 # 3. The __transcribe_audio__ function takes a GCS URI (i.e., Uniform Resource Identifier), a flag for converting numeric values to text, and a sample rate as input. It uses the Speech-to-Text API to perform asynchronous audio transcription and returns the transcriptions as a string.
 # 4. The __save_transcription__ function takes a transcription string and a text filename as input. It saves the transcription to a text file.
 # 5. The __list_audio_files__ function takes a directory path as input and returns a list of audio files in that directory.
 # 6. The __select_files__ function takes a list of audio files as input and prompts the user to select the files they want to transcribe.
-# 7. The __measure_sample_rate__ function determines the sample rate of an audio file by accessing its samplerate attribute. It returns the sample rate value in hertz.
+# 7. The __measure_sample_rate__ function determines the sample rate of an audio file by accessing its samplerate attribute. It returns the sample rate value in hertz. Similarly, the __get_audio_encoding__ function reads the file's container format so that FLAC recordings are transcribed with the FLAC encoding rather than LINEAR16.
 # 8. The __main__ function is the main entry point of the script. It defines the directory where the audio files are located, the GCS bucket and folder names, and the directory where the transcriptions will be saved. It lists the audio files, prompts the user to select the files they want to transcribe, and then iterates over the selected files. For each file, it uploads the audio to GCS, transcribes the audio, saves the transcription to a text file, and prints the transcription.
 # 9. Finally, the script calls the __main__ function if it is executed directly.
 # 
@@ -635,6 +1037,7 @@ import os
 import soundfile as sf
 from google.cloud import storage
 from google.cloud import speech
+from google.api_core.exceptions import PreconditionFailed
 from num2words import num2words
 
 # Disable debug messages from google.auth
@@ -646,24 +1049,35 @@ logging.getLogger('google.api_core').setLevel(logging.WARNING)
 # Disable debug messages from urllib3
 logging.getLogger('urllib3').setLevel(logging.WARNING)
 
-def upload_audio_to_gcs(local_file, gcs_bucket, gcs_filename):
+def upload_audio_to_gcs(local_file, gcs_bucket, gcs_folder, manifest):
     file_name = os.path.basename(local_file)
+    audio_hash = hash_audio_pcm(local_file)
+
+    # Known content is skipped without a single request to GCS
+    if audio_hash in manifest:
+        print(f"File {file_name} already uploaded as {manifest[audio_hash]}. Skipping upload.")
+        return manifest[audio_hash]
+
     print(f"Uploading {file_name} to GCS Bucket: {gcs_bucket}...")
     print()
     client = storage.Client()
     bucket = client.bucket(gcs_bucket)
+    gcs_filename = f"{gcs_folder}/{audio_hash}{os.path.splitext(file_name)[1]}"
     blob = bucket.blob(gcs_filename)
 
-    if blob.exists():
-        print(f"File {gcs_filename} already exists. Skipping upload.")
-    else:
-        blob.upload_from_filename(local_file)
+    # Only create the object if it does not exist yet, instead of checking with a separate request first
+    try:
+        blob.upload_from_filename(local_file, if_generation_match = 0)
         print(f"File {gcs_filename} uploaded successfully.")
+    except PreconditionFailed:
+        print(f"File {gcs_filename} already exists. Skipping upload.")
 
-    return f"gs://{gcs_bucket}/{gcs_filename}"
+    manifest[audio_hash] = f"gs://{gcs_bucket}/{gcs_filename}"
+    return manifest[audio_hash]
 
 def transcribe_audio(gcs_uri, convert_numeric_to_text = True, sample_rate = None,
-                     enable_diarization = False, min_num_speaker = None, max_num_speaker = None): # as default, diarization won't be enabled
+                     enable_diarization = False, min_num_speaker = None, max_num_speaker = None, # as default, diarization won't be enabled
+                     encoding = speech.RecognitionConfig.AudioEncoding.LINEAR16):
                 
     print(f"Transcribing with punctuation and diarization...")
     print()
@@ -672,7 +1086,7 @@ def transcribe_audio(gcs_uri, convert_numeric_to_text = True, sample_rate = None
     # Configure the audio settings
     audio = speech.RecognitionAudio(uri = gcs_uri)
     config = speech.RecognitionConfig(
-        encoding = speech.RecognitionConfig.AudioEncoding.LINEAR16,
+        encoding = encoding,
         sample_rate_hertz = sample_rate,
         language_code = "en-US",
         enable_automatic_punctuation = True,
@@ -715,7 +1129,7 @@ def save_transcription(transcriptions, text_filename):
 def list_audio_files(directory):
     audio_files = []
     for file in os.listdir(directory):
-        if file.endswith(".wav"):
+        if file.endswith((".wav", ".flac")):
             audio_files.append(file)
     return audio_files
 
@@ -740,23 +1154,39 @@ def measure_sample_rate(local_file):
         sample_rate = sound_file.samplerate
     return sample_rate
 
+def get_audio_encoding(local_file):
+    # Pick the encoding from the file's container so FLAC recordings are not sent as LINEAR16
+    with sf.SoundFile(local_file, "r") as sound_file:
+        file_format = sound_file.format
+    if file_format == "FLAC":
+        return speech.RecognitionConfig.AudioEncoding.FLAC
+    return speech.RecognitionConfig.AudioEncoding.LINEAR16
+
 def main():
     directory = "/Users/Jesse/Desktop/Speech_Recognition_Exercise/Recordings"  
     gcs_bucket = "sample-voice-recordings"  
     gcs_folder = "audio_files"  
     text_folder = "/Users/Jesse/Desktop/Speech_Recognition_Exercise/Transcriptions/WithDiarization"  
+    manifest_file = os.path.join(directory, "gcs_manifest.json")
+    reconcile_manifest = False
+
+    manifest = load_upload_manifest(manifest_file)
+    if reconcile_manifest:
+        manifest = reconcile_upload_manifest(manifest, gcs_bucket, gcs_folder)
 
     audio_files = list_audio_files(directory)
     selected_files = select_files(audio_files)
 
     for audio_file in selected_files:
         local_file = os.path.join(directory, audio_file)
-        gcs_filename = os.path.join(gcs_folder, audio_file)
-        gcs_uri = upload_audio_to_gcs(local_file, gcs_bucket, gcs_filename)
+        gcs_uri = upload_audio_to_gcs(local_file, gcs_bucket, gcs_folder, manifest)
+        save_upload_manifest(manifest, manifest_file)
         sample_rate = measure_sample_rate(local_file)
+        encoding = get_audio_encoding(local_file)
         transcriptions = transcribe_audio(gcs_uri, convert_numeric_to_text = True, sample_rate = sample_rate,
-                                          enable_diarization = True, min_num_speaker = 1, max_num_speaker = 2) # Set to True to enable speaker diarization & specify speaker count 
-        text_filename = os.path.join(text_folder, audio_file.replace(".wav", ".txt"))
+                                          enable_diarization = True, min_num_speaker = 1, max_num_speaker = 2, # Set to True to enable speaker diarization & specify speaker count 
+                                          encoding = encoding)
+        text_filename = os.path.join(text_folder, os.path.splitext(audio_file)[0] + ".txt")
         save_transcription(transcriptions, text_filename)
         print(f"Transcription saved for {audio_file}")
         print("Transcription:")
@@ -779,6 +1209,224 @@ if __name__ == "__main__":
 # 
 # By enabling the speaker diarization flag (__enable_speaker_diarization__ = True) in the __transcribe_audio__ function and setting the appropriate values for __min_num_speaker__ and __max_num_speaker__, we can utilize the pre-trained speaker diarization capabilities of the API. However, it is important to note that while pre-trained models can be effective in many cases, the accuracy of diarization can vary depending on factors such as audio quality, speaker characteristics, background noise, etc.
 
+# ## Overlapping Upload, Recognition and Persistence
+# 
+# The __main__ functions above process one file at a time: the audio is uploaded, probed, transcribed and saved before the next file is even looked at, so the network sits idle while we wait on the API and vice versa. Since most of that time is spent waiting on Google Cloud, we can instead organize the work as a pipeline of stages connected by small queues, where each stage has its own number of workers. While file N is being recognized, file N+1 is already being uploaded and the transcription of file N-1 is being written to disk. Each stage runs its blocking client calls in a thread pool of its own size, and because the queues are bounded, a slow stage (usually recognition) makes the faster stages wait instead of piling up work in memory. A file that fails in one stage is reported and skipped while the rest keep going; if the run is interrupted, every stage is cancelled together.
+# 
+# The stages receive the storage and speech clients as arguments, so the same pipeline can be run against the local stand-ins defined below to try it out without credentials or network access.
+
+# In[94]:
+
+
+import os
+import time
+import asyncio
+import shutil
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+import soundfile as sf
+from google.cloud import storage
+from google.cloud import speech
+from google.api_core.exceptions import PreconditionFailed
+from num2words import num2words
+
+PIPELINE_DONE = object() # Placed on a queue once the previous stage has no more files to pass on
+
+def probe_audio(item, manifest):
+    # Read the header information and content hash the later stages need
+    item["sample_rate"] = measure_sample_rate(item["local_file"])
+    item["encoding"] = get_audio_encoding(item["local_file"])
+    item["audio_hash"] = hash_audio_pcm(item["local_file"])
+    return item
+
+def upload_audio(item, storage_client, gcs_bucket, gcs_folder, manifest):
+    if item["audio_hash"] in manifest:
+        item["gcs_uri"] = manifest[item["audio_hash"]]
+        return item
+
+    gcs_filename = f"{gcs_folder}/{item['audio_hash']}{os.path.splitext(item['local_file'])[1]}"
+    blob = storage_client.bucket(gcs_bucket).blob(gcs_filename)
+    try:
+        blob.upload_from_filename(item["local_file"], if_generation_match = 0)
+    except PreconditionFailed:
+        pass
+    item["gcs_uri"] = manifest[item["audio_hash"]] = f"gs://{gcs_bucket}/{gcs_filename}"
+    return item
+
+def submit_recognition(item, speech_client, enable_diarization = True, min_num_speaker = 1, max_num_speaker = 2):
+    # Start the long-running operation but do not wait for it, so this worker can submit the next file right away
+    audio = speech.RecognitionAudio(uri = item["gcs_uri"])
+    config = speech.RecognitionConfig(
+        encoding = item["encoding"],
+        sample_rate_hertz = item["sample_rate"],
+        language_code = "en-US",
+        enable_automatic_punctuation = True,
+        enable_word_time_offsets = True,
+        diarization_config = speech.SpeakerDiarizationConfig(
+            enable_speaker_diarization = enable_diarization,
+            min_speaker_count = min_num_speaker,
+            max_speaker_count = max_num_speaker,
+        ),
+    )
+    item["operation"] = speech_client.long_running_recognize(config = config, audio = audio)
+    return item
+
+def await_recognition(item):
+    item["response"] = item.pop("operation").result()
+    return item
+
+def extract_transcriptions(item, convert_numeric_to_text = True):
+    transcriptions = []
+    for result in item.pop("response").results:
+        alternative = result.alternatives[0]
+        words = []
+        for word_info in alternative.words:
+            word = word_info.word
+            if convert_numeric_to_text and word.isdigit():
+                word = num2words(int(word), lang = 'en')
+            words.append(word)
+        if alternative.words:
+            transcriptions.append({"transcript": " ".join(words), "speaker_label": alternative.words[0].speaker_tag})
+    item["transcriptions"] = transcriptions
+    return item
+
+def write_transcription(item, text_folder):
+    text_filename = os.path.join(text_folder, os.path.splitext(os.path.basename(item["local_file"]))[0] + ".txt")
+    save_transcription(item["transcriptions"], text_filename)
+    item["text_filename"] = text_filename
+    return item
+
+async def run_stage(name, stage_function, in_queue, out_queue, concurrency, executor):
+    # The executor has (at least) concurrency threads of its own, so the stages never compete for threads
+    loop = asyncio.get_running_loop()
+
+    async def worker():
+        while True:
+            item = await in_queue.get()
+            if item is PIPELINE_DONE:
+                await in_queue.put(PIPELINE_DONE) # Pass the signal on to the other workers of this stage
+                return
+            try:
+                # The client libraries are blocking, so each call runs in a thread while the event loop keeps the other stages going
+                item = await loop.run_in_executor(executor, stage_function, item)
+            except Exception as e:
+                print(f"{name} failed for {os.path.basename(item['local_file'])}: {e}")
+                continue
+            if out_queue is not None:
+                await out_queue.put(item)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    if out_queue is not None:
+        await out_queue.put(PIPELINE_DONE)
+
+async def run_transcription_pipeline(local_files, storage_client, speech_client, gcs_bucket, gcs_folder, text_folder, manifest,
+                                     concurrency = None, queue_size = 4):
+    # Number of workers per stage; recognition gets the most since that is where files spend most of their time
+    concurrency = {"probe": 2, "upload": 4, "submit": 2, "await": 8, "post-process": 1, "write": 1, **(concurrency or {})}
+    stages = [
+        ("probe", lambda item: probe_audio(item, manifest)),
+        ("upload", lambda item: upload_audio(item, storage_client, gcs_bucket, gcs_folder, manifest)),
+        ("submit", lambda item: submit_recognition(item, speech_client)),
+        ("await", await_recognition),
+        ("post-process", extract_transcriptions),
+        ("write", lambda item: write_transcription(item, text_folder)),
+    ]
+    completed = []
+
+    def record_completed(item):
+        completed.append(item)
+        print(f"Transcription saved for {os.path.basename(item['local_file'])}")
+        return item
+
+    stages.append(("report", record_completed))
+    concurrency["report"] = 1
+
+    # One bounded queue in front of every stage, which is what provides the backpressure between them, and one
+    # thread pool per stage, since asyncio's shared default executor would cap every stage at a handful of threads
+    queues = [asyncio.Queue(maxsize = queue_size) for _ in stages]
+    executors = {name: ThreadPoolExecutor(max_workers = concurrency[name], thread_name_prefix = f"pipeline-{name}") for name, _ in stages}
+    tasks = [asyncio.ensure_future(run_stage(name, function, queues[i], queues[i + 1] if i + 1 < len(queues) else None,
+                                             concurrency[name], executors[name]))
+             for i, (name, function) in enumerate(stages)]
+
+    try:
+        for local_file in local_files:
+            await queues[0].put({"local_file": local_file})
+        await queues[0].put(PIPELINE_DONE)
+        await asyncio.gather(*tasks)
+    finally:
+        # A file that fails in a stage is reported and dropped while the others carry on; the stages themselves
+        # are only cancelled when the run is (e.g. Ctrl+C), which must not leave them running in the background
+        for task in tasks:
+            task.cancel()
+        for executor in executors.values():
+            executor.shutdown(wait = False)
+    return completed
+
+class LocalStorageClient:
+    # Stand-in for storage.Client() that copies "uploads" into a local directory
+    def __init__(self, root_directory, latency = 0.0):
+        self.root_directory = root_directory
+        self.latency = latency
+
+    def bucket(self, gcs_bucket):
+        return SimpleNamespace(blob = lambda gcs_filename: LocalBlob(os.path.join(self.root_directory, gcs_bucket, gcs_filename), self.latency))
+
+class LocalBlob:
+    def __init__(self, path, latency):
+        self.path = path
+        self.latency = latency
+
+    def upload_from_filename(self, local_file, if_generation_match = None):
+        time.sleep(self.latency)
+        if if_generation_match == 0 and os.path.exists(self.path):
+            raise PreconditionFailed(f"{self.path} already exists")
+        os.makedirs(os.path.dirname(self.path), exist_ok = True)
+        shutil.copyfile(local_file, self.path)
+
+class LocalSpeechClient:
+    # Stand-in for speech.SpeechClient() whose operations finish after a fixed delay with a placeholder transcript
+    def __init__(self, latency = 1.0):
+        self.latency = latency
+
+    def long_running_recognize(self, config, audio):
+        words = [SimpleNamespace(word = word, speaker_tag = 1) for word in f"transcript of {audio.uri}".split()]
+        response = SimpleNamespace(results = [SimpleNamespace(alternatives = [SimpleNamespace(words = words)])])
+        finish_time = time.time() + self.latency
+        return SimpleNamespace(result = lambda: time.sleep(max(0.0, finish_time - time.time())) or response)
+
+def main():
+    directory = "/Users/Jesse/Desktop/Speech_Recognition_Exercise/Recordings"
+    gcs_bucket = "sample-voice-recordings"
+    gcs_folder = "audio_files"
+    text_folder = "/Users/Jesse/Desktop/Speech_Recognition_Exercise/Transcriptions/WithDiarization"
+    manifest_file = os.path.join(directory, "gcs_manifest.json")
+    use_local_clients = False # Set to True to run the pipeline against the local stand-ins instead of Google Cloud
+
+    if use_local_clients:
+        storage_client = LocalStorageClient("/tmp/local_gcs")
+        speech_client = LocalSpeechClient()
+    else:
+        storage_client = storage.Client()
+        speech_client = speech.SpeechClient()
+
+    manifest = load_upload_manifest(manifest_file)
+    audio_files = list_audio_files(directory)
+    selected_files = select_files(audio_files)
+    local_files = [os.path.join(directory, audio_file) for audio_file in selected_files]
+
+    start_time = time.time()
+    completed = asyncio.run(run_transcription_pipeline(local_files, storage_client, speech_client,
+                                                       gcs_bucket, gcs_folder, text_folder, manifest))
+    save_upload_manifest(manifest, manifest_file)
+    print(f"Transcribed {len(completed)} of {len(local_files)} files in {time.time() - start_time:.2f} seconds")
+
+if __name__ == "__main__":
+    main()
+
+
+# Each stage is an ordinary function that takes a dictionary describing one file, adds what it produced (sample rate, GCS URI, long-running operation, response, transcriptions) and returns it. The __run_stage__ function runs a given number of workers for a stage, each one taking files from the stage's queue, calling the blocking client library in a thread and passing the result on to the next queue. Splitting recognition into a __submit__ stage and an __await__ stage means that several long-running operations can be in flight at once while only a couple of workers are needed to submit them. A file that fails in one stage is reported and dropped, while the other files keep moving through the pipeline.
+
 # ## Model Optimization
 # 
 # Google offers ways to optimize the Speech-to-Text API using advanced techniques such as speaker diarization neural networks and speaker adaptation. These techniques can help improve the accuracy and efficiency of the transcription process. A few of the optimization options provided by Google are:
@@ -788,6 +1436,133 @@ if __name__ == "__main__":
 # 
 # These optimization techniques require additional setup and configuration, and they may have associated costs and limitations. You can refer to the Google Cloud Speech-to-Text documentation for more information on how to implement these optimization methods by going to https://cloud.google.com/speech-to-text/docs. 
 
+# ## Feature Extraction
+# 
+# The Google APIs take care of feature extraction for us, but if we want to train or evaluate our own models we need to compute the acoustic features ourselves. The two most common ones are log-mel spectrograms, which describe how much energy the signal has in each of a set of frequency bands that are spaced like human hearing, and MFCCs, which are a compact summary of the log-mel spectrogram obtained with a discrete cosine transform. Both are computed from short overlapping frames of the signal (typically 25 ms every 10 ms):
+# 
+# 1. __Framing__: The signal is split into overlapping frames, and each frame is multiplied by a Hamming window.
+# 2. __FFT__: The power spectrum of every frame is computed with a real FFT.
+# 3. __Mel filter bank__: The power spectrum is projected onto a set of triangular filters spaced evenly on the mel scale, and the logarithm is taken.
+# 4. __DCT__: For MFCCs, a discrete cosine transform of the log-mel energies keeps only the first few coefficients.
+# 
+# Computing features is the expensive part of most experiments, and we usually want to compute them over and over with the same settings. The code below therefore stores the features as .npy files named after the audio's content hash and the feature parameters, and loads them back as memory-mapped arrays, so repeated experiments or training runs only read the frames they actually use instead of decoding and transforming the audio again.
+
+# In[95]:
+
+
+import os
+import json
+import hashlib
+import tempfile
+import numpy as np
+import soundfile as sf
+from concurrent.futures import ProcessPoolExecutor
+
+FEATURE_PARAMS = {
+    "frame_ms": 25, # Length of each frame in milliseconds
+    "hop_ms": 10, # Step between consecutive frames in milliseconds
+    "n_mels": 40, # Number of mel filters
+    "n_mfcc": 13, # Number of cepstral coefficients to keep
+    "pre_emphasis": 0.97, # Boosts the high frequencies before framing
+}
+
+def frame_signal(signal, frame_length, hop_length):
+    # Return a (num_frames, frame_length) view of the signal without copying it
+    if len(signal) < frame_length:
+        signal = np.pad(signal, (0, frame_length - len(signal)))
+    return np.lib.stride_tricks.sliding_window_view(signal, frame_length)[::hop_length]
+
+def hz_to_mel(hz):
+    return 2595.0 * np.log10(1.0 + hz / 700.0)
+
+def mel_to_hz(mel):
+    return 700.0 * (10.0 ** (mel / 2595.0) - 1.0)
+
+def mel_filter_bank(n_mels, n_fft, sample_rate):
+    # Triangular filters spaced evenly on the mel scale, built for all filters at once
+    mel_points = np.linspace(hz_to_mel(0.0), hz_to_mel(sample_rate / 2.0), n_mels + 2)
+    hz_points = mel_to_hz(mel_points)
+    fft_freqs = np.fft.rfftfreq(n_fft, d = 1.0 / sample_rate)
+    lower, center, upper = hz_points[:-2, None], hz_points[1:-1, None], hz_points[2:, None]
+    rising = (fft_freqs - lower) / (center - lower)
+    falling = (upper - fft_freqs) / (upper - center)
+    return np.maximum(0.0, np.minimum(rising, falling))
+
+def dct_matrix(n_mfcc, n_mels):
+    # Orthonormal DCT-II basis, so the MFCCs are a single matrix product
+    n = np.arange(n_mels)
+    k = np.arange(n_mfcc)[:, None]
+    basis = np.cos(np.pi * k * (2 * n + 1) / (2 * n_mels)) * np.sqrt(2.0 / n_mels)
+    basis[0] /= np.sqrt(2.0)
+    return basis
+
+def compute_features(signal, sample_rate, params = FEATURE_PARAMS):
+    frame_length = int(round(sample_rate * params["frame_ms"] / 1000))
+    hop_length = int(round(sample_rate * params["hop_ms"] / 1000))
+    n_fft = 1 << (frame_length - 1).bit_length() # Next power of two
+
+    emphasized = np.append(signal[:1], signal[1:] - params["pre_emphasis"] * signal[:-1])
+    frames = frame_signal(emphasized, frame_length, hop_length) * np.hamming(frame_length)
+    power_spectrum = np.abs(np.fft.rfft(frames, n = n_fft)) ** 2 / n_fft
+
+    mel_energies = power_spectrum @ mel_filter_bank(params["n_mels"], n_fft, sample_rate).T
+    log_mel = np.log(np.maximum(mel_energies, np.finfo(np.float32).eps)).astype(np.float32)
+    mfcc = (log_mel @ dct_matrix(params["n_mfcc"], params["n_mels"]).T).astype(np.float32)
+    return log_mel, mfcc
+
+def feature_cache_paths(cache_directory, audio_hash, params = FEATURE_PARAMS):
+    # The parameters are part of the file name, so changing any of them never returns stale features
+    params_key = hashlib.sha1(json.dumps(params, sort_keys = True).encode()).hexdigest()[:12]
+    base_name = os.path.join(cache_directory, f"{audio_hash}_{params_key}")
+    return {"log_mel": base_name + "_logmel.npy", "mfcc": base_name + "_mfcc.npy"}
+
+def save_feature_array(array, path):
+    # A temporary file of its own, since two workers may compute the same features (recordings with the same audio) at once
+    fd, temp_file = tempfile.mkstemp(dir = os.path.dirname(path), suffix = ".tmp.npy")
+    with os.fdopen(fd, "wb") as f:
+        np.save(f, array)
+    os.replace(temp_file, path)
+
+def extract_file_features(audio_file, cache_directory, params = FEATURE_PARAMS):
+    # Runs in a worker process; returns the cache paths, computing the features only if they are missing
+    paths = feature_cache_paths(cache_directory, hash_audio_pcm(audio_file), params)
+    if all(os.path.exists(path) for path in paths.values()):
+        return audio_file, paths, True
+
+    signal, sample_rate = sf.read(audio_file, dtype = 'float32')
+    if signal.ndim > 1:
+        signal = signal.mean(axis = 1) # Downmix to mono
+    log_mel, mfcc = compute_features(signal, sample_rate, params)
+    save_feature_array(log_mel, paths["log_mel"])
+    save_feature_array(mfcc, paths["mfcc"])
+    return audio_file, paths, False
+
+def extract_corpus_features(audio_files, cache_directory, params = FEATURE_PARAMS, max_workers = None):
+    # Worker processes started with "spawn" (the default on macOS and Windows) cannot import functions defined in a
+    # notebook, so the pool runs the same extract_file_features from the speech_recognition_exercise package
+    from speech_recognition_exercise import features as feature_workers
+    os.makedirs(cache_directory, exist_ok = True)
+    features = {}
+    with ProcessPoolExecutor(max_workers = max_workers) as executor:
+        futures = [executor.submit(feature_workers.extract_file_features, audio_file, cache_directory, params) for audio_file in audio_files]
+        for future in futures:
+            audio_file, paths, cached = future.result()
+            # Memory-map the arrays so only the frames that are actually used get read from disk
+            features[audio_file] = {name: np.load(path, mmap_mode = 'r') for name, path in paths.items()}
+            print(f"{'Loaded cached' if cached else 'Computed'} features for {os.path.basename(audio_file)}: "
+                  f"{features[audio_file]['log_mel'].shape[0]} frames")
+    return features
+
+# Example usage
+if __name__ == "__main__":
+    directory = "/Users/Jesse/Desktop/Speech_Recognition_Exercise/Recordings"
+    cache_directory = "/Users/Jesse/Desktop/Speech_Recognition_Exercise/Features"
+    audio_files = [os.path.join(directory, file) for file in list_audio_files(directory)]
+    features = extract_corpus_features(audio_files, cache_directory)
+
+
+# Note that all of the frames of a file are processed at once: __frame_signal__ returns a strided view of the signal rather than copying each frame, and the FFT, the mel filter bank and the DCT are each applied to the whole matrix of frames in a single NumPy call. Files are processed in parallel in a pool of worker processes (one per CPU core by default), and each worker writes its arrays to the cache under a temporary name of its own first, so an interrupted run never leaves a truncated feature file behind and two workers computing the same features never collide. The worker processes run __extract_file_features__ from the `speech_recognition_exercise` package rather than the copy defined above: on macOS and Windows, new processes are started with the spawn method and can only run functions they can import, which excludes functions defined in a notebook.
+
 # ## Data Analysis with Spark
 
 # Spark is a powerful distributed computing framework that can be used for large-scale data processing and analysis, including speech recognition tasks. By leveraging the distributed computing capabilities of Spark, we can efficiently process and analyze large volumes of audio data for speech recognition purposes. Here's an outline of how Spark can be utilized for speech recognition analysis:
@@ -808,22 +1583,15 @@ import os
 import logging
 import pandas as pd
 from pyspark import SparkContext
-import string
+from speech_recognition_exercise.tokenizer import tokenize
 
 def count_word_occurrences(text_file):
     # Create a SparkContext
     sc = SparkContext(appName = "WordCount")
 
-    # Read the text file and split it into words
+    # Read the text file and split it into lowercase words without punctuation, with the package's tokenizer
     lines = sc.textFile(text_file)
-    words = lines.flatMap(lambda line: line.split(" "))
-
-    # Remove punctuations from the words
-    translator = str.maketrans("", "", string.punctuation)
-    words = words.map(lambda word: word.translate(translator))
-
-    # Convert words to lowercase
-    words = words.map(lambda word: word.lower())
+    words = lines.flatMap(tokenize)
 
     # Map each word to a tuple (word, 1) for counting
     word_counts = words.map(lambda word: (word, 1))
@@ -887,7 +1655,7 @@ df.tail(10)
 # The code above utilizes Spark to count word occurrences in multiple transcription files and saves the results as CSV files. It performs the following steps:
 # 
 # 1. Creates a SparkContext and reads the text file, splitting it into words.
-# 2. Removes punctuation and converts words to lowercase.
+# 2. Removes punctuation and converts words to lowercase. Both are done by __tokenize__ from `speech_recognition_exercise.tokenizer`, the same tokenizer the package's analyses use, so "can't" stays one word and the counts here match the ones from `python -m speech_recognition_exercise analyze`.
 # 3. Maps each word to a tuple (word, 1) for counting.
 # 4. Reduces by key to count the occurrences of each word.
 # 5. Collects the results into a dictionary, saves word count DataFrames as CSV files, and concatenates them into a single DataFrame   before saving it as "word_counts.csv".
@@ -902,7 +1670,7 @@ df.tail(10)
 import os
 import pandas as pd
 from pyspark import SparkContext
-import string
+from speech_recognition_exercise.tokenizer import tokenize
 
 def count_word_occurrences(text_file):
     # Create a SparkContext
@@ -923,12 +1691,8 @@ def count_word_occurrences(text_file):
     # Count the total number of different lines
     total_lines = lines.distinct().count()
 
-    # Split the lines into words and remove punctuation
-    words = lines.flatMap(lambda line: line.split())
-    words = words.map(lambda word: word.translate(str.maketrans("", "", string.punctuation)))
-
-    # Convert words to lowercase
-    words = words.map(lambda word: word.lower())
+    # Split the lines into lowercase words without punctuation
+    words = lines.flatMap(tokenize)
 
     # Map each word to a tuple (word, speaker) for counting
     word_speaker_counts = words.map(lambda word: (word, 1))
@@ -1004,7 +1768,7 @@ df.tail()
 import os
 import pandas as pd
 from pyspark import SparkContext
-import string
+from speech_recognition_exercise.tokenizer import tokenize
 
 def count_word_occurrences(text_file):
     # Create a SparkContext
@@ -1039,12 +1803,8 @@ def count_word_occurrences(text_file):
         total_lines = speaker_lines.distinct().count()
         speaker_total_lines[speaker] = total_lines
 
-        # Split the speaker text into words and remove punctuation
-        words = speaker_text.flatMap(lambda line: line.split())
-        words = words.map(lambda word: word.translate(str.maketrans("", "", string.punctuation)))
-
-        # Convert words to lowercase
-        words = words.map(lambda word: word.lower())
+        # Split the speaker text into lowercase words without punctuation
+        words = speaker_text.flatMap(tokenize)
 
         # Count the occurrences of each word for the speaker
         word_counts = words.countByValue()
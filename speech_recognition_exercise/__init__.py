@@ -0,0 +1,30 @@
+# Speech Recognition Exercise
+#
+# Importable version of the functions from Speech_Recognition_Exercise.py. The package itself
+# imports nothing heavy: pyaudio, google.cloud, pyspark, pandas, etc. are only loaded by the
+# submodule that needs them, so e.g. `python -m speech_recognition_exercise transcribe` never
+# pays for Spark.
+#
+# Submodules:
+#   audio_files  - listing, selecting, probing and hashing local audio files
+#   conversion   - MP3 to WAV and stereo to mono conversion (pydub)
+#   recording    - microphone capture (pyaudio)
+#   recognition  - SpeechRecognition-based transcription of local files and the microphone
+#   listener     - long-running microphone listener with a warm, calibrated recognizer
+#   fingerprint  - spectral-peak audio fingerprints for skipping duplicate recordings
+#   normalization- pre-upload downmixing, polyphase resampling to 16 kHz and level normalization
+#   cloud        - Google Cloud Storage uploads and Speech-to-Text transcription
+#   pipeline     - asyncio pipeline overlapping upload, recognition and persistence
+#   jobqueue     - durable SQLite job queue for resumable, multi-process batch transcription
+#   distributed  - Spark mapPartitions recognition for very large archives
+#   scheduler    - quota-aware request scheduler for the recognition backends
+#   local_clients- local stand-ins for the Google Cloud clients
+#   evaluation   - word error rate of transcripts against references
+#   loadtest     - load tests of the transcription path against simulated backends
+#   features     - cached log-mel / MFCC feature extraction
+#   transcripts  - structured (.jsonl) transcript records next to the text transcripts
+#   tokenizer    - the shared tokenizer used by every analysis
+#   analysis     - Spark word counts and speaker statistics over transcripts
+#   text_analytics - sparse n-gram TF-IDF, top terms and transcript similarity
+#   playback     - playing audio files in a notebook or from the command line
+#   cli          - command line interface
@@ -0,0 +1,4 @@
+from speech_recognition_exercise.cli import main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+import os
+import pandas as pd
+from pyspark import SparkContext
+from speech_recognition_exercise.tokenizer import tokenize
+from speech_recognition_exercise.transcripts import records_file, parse_record, parse_archive_record, parse_transcript_line
+
+# Every report reads all transcripts into one RDD of (transcription, speaker, text) records and computes
+# its counts for all of them at once, keyed by (transcription, word) or (transcription, speaker), so the
+# number of Spark jobs does not grow with the number of transcripts or speakers. The results are split
+# per transcription on the driver.
+
+def list_transcription_files(transcriptions_folder):
+    return [file_name for file_name in sorted(os.listdir(transcriptions_folder)) if file_name.endswith(".txt")]
+
+def parse_transcript_file(path_and_content):
+    # Records of one file read with wholeTextFiles: its .jsonl records, or the "Speaker N: text" lines of a transcript saved without them
+    path, content = path_and_content
+    transcription = os.path.splitext(os.path.basename(path))[0]
+    if path.endswith(".jsonl"):
+        return [(transcription, *parse_record(line)) for line in content.splitlines() if line.strip()]
+    return [(transcription, *parse_transcript_line(line)) for line in content.splitlines()]
+
+def transcript_records(sc, transcriptions_folder):
+    # (transcription names, records) for the folder. A folder written by Spark (see distributed.py) is one
+    # partitioned dataset holding the records of all its transcripts.
+    if os.path.exists(os.path.join(transcriptions_folder, "_SUCCESS")):
+        records = sc.textFile(transcriptions_folder).filter(lambda line: line.strip()).map(parse_archive_record).cache()
+        return sorted(records.map(lambda record: record[0]).distinct().collect()), records
+
+    file_names = list_transcription_files(transcriptions_folder)
+    if not file_names:
+        return [], sc.emptyRDD()
+    # The structured records of every transcript that has them, the text of the others
+    paths = [records_file(path) if os.path.exists(records_file(path)) else path
+             for path in (os.path.abspath(os.path.join(transcriptions_folder, file_name)) for file_name in file_names)]
+    records = sc.wholeTextFiles(",".join(paths)).flatMap(parse_transcript_file).cache()
+    return [os.path.splitext(file_name)[0] for file_name in file_names], records
+
+def split_by_transcription(pairs):
+    # {transcription: {key: value}} from ((transcription, key), value) pairs
+    by_transcription = {}
+    for (transcription, key), value in pairs:
+        by_transcription.setdefault(transcription, {})[key] = value
+    return by_transcription
+
+def count_word_occurrences(records):
+    # Split every record into lowercase words without punctuation, keyed by the transcription they belong to
+    words = records.flatMap(lambda record: [((record[0], word), 1) for word in tokenize(record[2])])
+
+    # Count the occurrences of each word in each transcription
+    word_counts = words.reduceByKey(lambda a, b: a + b)
+
+    # Collect the results into a dictionary per transcription
+    return split_by_transcription(word_counts.collect())
+
+def count_conversational_turns(records):
+    word_counts = count_word_occurrences(records)
+
+    # Count the distinct speakers of each transcription
+    conversational_turns = records.filter(lambda record: record[1] is not None).map(lambda record: record[:2]).distinct().countByKey()
+
+    # Count the different lines of each transcription
+    total_lines = records.distinct().map(lambda record: (record[0], 1)).countByKey()
+
+    # Count the total number of words spoken in each transcription
+    total_words_spoken = {transcription: sum(counts.values()) for transcription, counts in word_counts.items()}
+
+    return word_counts, dict(conversational_turns), total_words_spoken, dict(total_lines)
+
+def count_speaker_statistics(records):
+    # Only records with a speaker label count towards a speaker
+    speaker_records = records.filter(lambda record: record[1] is not None)
+
+    # Count the occurrences of each word per (transcription, speaker)
+    words = speaker_records.flatMap(lambda record: [((record[0], record[1], word), 1) for word in tokenize(record[2])])
+    word_counts = words.reduceByKey(lambda a, b: a + b).map(lambda item: ((item[0][0], item[0][1]), (item[0][2], item[1]))).collect()
+
+    # Count the conversational turns and different lines per (transcription, speaker)
+    turns = speaker_records.map(lambda record: (record[:2], 1)).countByKey()
+    lines = speaker_records.distinct().map(lambda record: (record[:2], 1)).countByKey()
+
+    # Initialize dictionaries to store the speaker statistics of each transcription
+    speaker_word_counts = {}
+    speaker_conversational_turns = {}
+    speaker_total_lines = {}
+    speaker_total_words = {}
+    speaker_unique_words = {}
+
+    for (transcription, speaker), count in turns.items():
+        speaker_word_counts.setdefault(transcription, {})[speaker] = {}
+        speaker_conversational_turns.setdefault(transcription, {})[speaker] = count
+        speaker_total_lines.setdefault(transcription, {})[speaker] = lines[(transcription, speaker)]
+    for (transcription, speaker), (word, count) in word_counts:
+        speaker_word_counts[transcription][speaker][word] = count
+    for transcription, speakers in speaker_word_counts.items():
+        speaker_total_words[transcription] = {speaker: sum(counts.values()) for speaker, counts in speakers.items()}
+        speaker_unique_words[transcription] = {speaker: len(counts) for speaker, counts in speakers.items()}
+
+    return (
+        speaker_word_counts,
+        speaker_conversational_turns,
+        speaker_total_lines,
+        speaker_total_words,
+        speaker_unique_words,
+    )
+
+def word_counts_report(transcriptions_folder, output_directory):
+    # One SparkContext for all transcripts instead of starting a new one per file
+    sc = SparkContext(appName = "WordCount")
+    df_list = []
+    try:
+        transcriptions, records = transcript_records(sc, transcriptions_folder)
+        word_counts = count_word_occurrences(records)
+        for transcription in transcriptions:
+            file_name = transcription + ".txt"
+
+            # Create a DataFrame for the current transcription and save it as a separate CSV file
+            transcription_df = pd.DataFrame(word_counts.get(transcription, {}).items(), columns = ["Word", "Count"])
+            transcription_df["Transcription"] = file_name
+            transcription_df.to_csv(os.path.join(output_directory, file_name.replace(".txt", ".csv")), index = False)
+            df_list.append(transcription_df)
+    finally:
+        sc.stop()
+
+    df = pd.concat(df_list, ignore_index = True)
+    df.to_csv(os.path.join(output_directory, "word_counts_all_transcripts.csv"), index = False)
+    return df
+
+def conversational_turns_report(transcriptions_folder, output_directory):
+    sc = SparkContext(appName = "WordCount")
+    df_list = []
+    try:
+        transcriptions, records = transcript_records(sc, transcriptions_folder)
+        word_counts, conversational_turns, total_words_spoken, total_lines = count_conversational_turns(records)
+        for transcription in transcriptions:
+            file_name = transcription + ".txt"
+
+            # Create a DataFrame for the current transcription and save it as a separate CSV file
+            transcription_df = pd.DataFrame(word_counts.get(transcription, {}).items(), columns = ["Word", "Count"])
+            transcription_df["Transcription"] = transcription
+            transcription_df["Total Conversational Turns"] = conversational_turns.get(transcription, 0)
+            transcription_df["Total Words Spoken"] = total_words_spoken.get(transcription, 0)
+            transcription_df["Total Lines"] = total_lines.get(transcription, 0)
+            transcription_df.to_csv(os.path.join(output_directory, file_name.replace(".txt", ".csv")), index = False)
+            df_list.append(transcription_df)
+    finally:
+        sc.stop()
+
+    df = pd.concat(df_list, ignore_index = True)
+    df.to_csv(os.path.join(output_directory, "word_counts_conversational_turns_all_transcripts.csv"), index = False)
+    return df
+
+def speaker_statistics_report(transcriptions_folder, output_directory):
+    sc = SparkContext(appName = "WordCount")
+    statistics_list = []
+    try:
+        transcriptions, records = transcript_records(sc, transcriptions_folder)
+        word_counts, conversational_turns, total_lines, total_words, unique_words = count_speaker_statistics(records)
+        for transcription in transcriptions:
+            file_name = transcription + ".txt"
+
+            # Store the speaker statistics
+            speaker_stats = {}
+            for speaker in word_counts.get(transcription, {}):
+                speaker_stats[speaker] = {
+                    "Total Words": total_words[transcription][speaker],
+                    "Unique Words": unique_words[transcription][speaker],
+                    "Conversational Turns": conversational_turns[transcription][speaker],
+                    "Total Lines": total_lines[transcription][speaker],
+                }
+            if not speaker_stats:
+                continue # Transcribed without diarization
+
+            # Create a DataFrame for speaker statistics with the speaker label as a column
+            df_speaker_stats = pd.DataFrame.from_dict(speaker_stats, orient = "index")
+            df_speaker_stats["Speaker_Label"] = df_speaker_stats.index
+            df_speaker_stats = df_speaker_stats[
+                ["Speaker_Label", "Total Words", "Unique Words", "Conversational Turns", "Total Lines"]
+            ]
+            df_speaker_stats["Transcription"] = file_name
+
+            # Save the speaker statistics as a CSV file for each transcription
+            df_speaker_stats.to_csv(os.path.join(output_directory, file_name.replace(".txt", ".csv")), index = False)
+            statistics_list.append(df_speaker_stats)
+    finally:
+        sc.stop()
+
+    df_merged = pd.concat(statistics_list, ignore_index = True)
+    df_merged.to_csv(os.path.join(output_directory, "speaker_statistics_all_transcripts.csv"), index = False)
+    return df_merged
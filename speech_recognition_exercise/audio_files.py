@@ -0,0 +1,138 @@
+import os
+import mmap
+import wave
+import struct
+import hashlib
+import numpy as np
+import soundfile as sf
+
+AUDIO_EXTENSIONS = (".wav", ".flac")
+
+def list_audio_files(directory, extensions = AUDIO_EXTENSIONS):
+    audio_files = []
+    for file in sorted(os.listdir(directory)):
+        if file.endswith(extensions):
+            audio_files.append(file)
+    return audio_files
+
+def select_files(audio_files, prompt = "Select the files (separated by commas): "):
+    selected_files = []
+    print("Available audio files:")
+    for i, file in enumerate(audio_files):
+        print(f"{i + 1}. {file}")
+    while True:
+        print()
+        selection = input(prompt)
+        try:
+            selected_indexes = [int(index.strip()) - 1 for index in selection.split(",")]
+            if any(index < 0 for index in selected_indexes):
+                raise IndexError
+            selected_files = [audio_files[index] for index in selected_indexes]
+            break
+        except (ValueError, IndexError):
+            print("Invalid selection. Please try again.")
+    return selected_files
+
+def measure_sample_rate(local_file):
+    with sf.SoundFile(local_file, "r") as sound_file:
+        sample_rate = sound_file.samplerate
+    return sample_rate
+
+def measure_duration(local_file):
+    # Read from the header only, without decoding the audio
+    info = sf.info(local_file)
+    return info.frames / info.samplerate
+
+def get_audio_channels(audio_file):
+    with wave.open(audio_file, 'rb') as wav:
+        num_channels = wav.getnchannels()
+    return num_channels
+
+def hash_audio_pcm(local_file, block_size = 65536):
+    # Hash the decoded samples (plus the container format, sample rate and channel count) rather than the file name
+    sha = hashlib.sha256()
+    with sf.SoundFile(local_file, "r") as sound_file:
+        sha.update(f"{sound_file.format}:{sound_file.samplerate}:{sound_file.channels}".encode())
+        for block in sound_file.blocks(blocksize = block_size, dtype = 'int16'):
+            sha.update(block.tobytes())
+    return sha.hexdigest()
+
+class WavWindowReader:
+    def __init__(self, audio_file):
+        self.file = open(audio_file, "rb")
+        self.mapped = None
+        try:
+            self.mapped = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+            data_offset, data_size = self.read_header()
+        except BaseException:
+            # Not a file that can be mapped; nobody else holds the handles to close them
+            if self.mapped is not None:
+                self.mapped.close()
+            self.file.close()
+            raise
+
+        # A (num_frames, channels) view of the samples; nothing is read from disk until a window is used
+        num_frames = data_size // (self.sample_width * self.channels)
+        self.samples = np.frombuffer(self.mapped, dtype = f"<i{self.sample_width}", count = num_frames * self.channels,
+                                     offset = data_offset).reshape(num_frames, self.channels)
+
+    def read_header(self):
+        # Walk the RIFF chunks to find the format description and where the PCM data starts
+        if self.mapped[0:4] != b"RIFF" or self.mapped[8:12] != b"WAVE":
+            raise ValueError("Not a WAV file")
+        position = 12
+        while position + 8 <= len(self.mapped):
+            chunk_id, chunk_size = struct.unpack("<4sI", self.mapped[position:position + 8])
+            if chunk_id == b"fmt ":
+                audio_format, self.channels, self.sample_rate = struct.unpack("<HHI", self.mapped[position + 8:position + 16])
+                self.sample_width = struct.unpack("<H", self.mapped[position + 22:position + 24])[0] // 8
+                if audio_format != 1 or self.sample_width not in (2, 4):
+                    raise ValueError("Only 16-bit and 32-bit PCM WAV files can be memory-mapped")
+            elif chunk_id == b"data":
+                return position + 8, min(chunk_size, len(self.mapped) - position - 8)
+            position += 8 + chunk_size + (chunk_size % 2) # Chunks are padded to an even size
+        raise ValueError("WAV file has no data chunk")
+
+    @property
+    def duration(self):
+        return len(self.samples) / self.sample_rate
+
+    def window(self, start_seconds, duration_seconds):
+        # Zero-copy NumPy slice of the samples between the two offsets
+        start = int(start_seconds * self.sample_rate)
+        end = start + int(duration_seconds * self.sample_rate)
+        return self.samples[start:end]
+
+    def window_bytes(self, start_seconds, duration_seconds):
+        # The same window as a memoryview over the mapped file
+        return memoryview(self.window(start_seconds, duration_seconds)).cast("B")
+
+    def iter_windows(self, window_seconds = 30, overlap_seconds = 0):
+        # Checked here rather than in the generator, so bad arguments fail at the call instead of at the first window;
+        # an overlap as long as the window would never move past the first window
+        if window_seconds <= 0:
+            raise ValueError(f"window_seconds must be positive, got {window_seconds}")
+        if not 0 <= overlap_seconds < window_seconds:
+            raise ValueError(f"overlap_seconds must be at least 0 and less than window_seconds ({window_seconds}), got {overlap_seconds}")
+        return self.generate_windows(window_seconds, window_seconds - overlap_seconds)
+
+    def generate_windows(self, window_seconds, step_seconds):
+        start_seconds = 0.0
+        while start_seconds < self.duration:
+            yield start_seconds, self.window(start_seconds, window_seconds)
+            start_seconds += step_seconds
+
+    def close(self):
+        # Drop our view first; the mapping cannot be closed while it is still referenced
+        self.samples = None
+        try:
+            self.mapped.close()
+        except BufferError:
+            pass # Windows handed out earlier are still in use; the mapping is released once they are garbage collected
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
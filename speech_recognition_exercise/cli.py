@@ -0,0 +1,342 @@
+import os
+import sys
+import argparse
+
+# Each subcommand imports the modules it needs inside its handler, so e.g. `transcribe` never loads
+# pyspark or pandas and `analyze` never loads the Google Cloud libraries.
+
+DEFAULT_RECORDINGS = "Recordings"
+DEFAULT_TRANSCRIPTIONS = "Transcriptions"
+
+def resolve_audio_files(files, directory, prompt):
+    # Use the files given on the command line, or let the user pick from the directory
+    if files:
+        return list(files)
+    from speech_recognition_exercise.audio_files import list_audio_files, select_files
+    selected_files = select_files(list_audio_files(directory), prompt)
+    return [os.path.join(directory, audio_file) for audio_file in selected_files]
+
+def record_command(args):
+    from speech_recognition_exercise import recording
+    os.makedirs(args.output_folder, exist_ok = True)
+    if args.source:
+        sources = [tuple(int(value) for value in source.split(":")) for source in args.source]
+        recording.record_multichannel(args.output_folder, sources, args.sample_rate,
+                                      output_mode = "interleaved" if args.interleaved else "per_channel", file_format = args.format)
+    elif args.transcribe:
+        # Recognize the captured audio from memory while the recording is still being written to disk
+        text_folder = os.path.join(DEFAULT_TRANSCRIPTIONS, "WithPunctuation")
+        os.makedirs(text_folder, exist_ok = True)
+        recording.record_and_transcribe(args.output_folder, text_folder, args.sample_rate, args.format)
+    else:
+        recording.save_audio_from_microphone(args.output_folder, args.sample_rate, args.format)
+
+def convert_command(args):
+    from speech_recognition_exercise import conversion
+    # Directories are converted as a whole: every MP3/M4A/OGG file in them (and WAV/FLAC files too with --mono)
+    extensions = conversion.CONVERTIBLE_EXTENSIONS if args.mono else (".mp3", ".m4a", ".ogg")
+    source_files = []
+    for path in args.files:
+        if os.path.isdir(path):
+            source_files.extend(os.path.join(path, file) for file in sorted(os.listdir(path)) if file.lower().endswith(extensions))
+        else:
+            source_files.append(path)
+    try:
+        conversion.convert_audio_files(source_files, args.output_folder, args.mono, args.check, args.workers)
+    except ValueError as e:
+        sys.exit(f"{e}. Convert them into separate output folders.")
+
+def run_for_each_file(args, audio_files, function):
+    # Transcribe one file after the other, or through the quota-aware scheduler when limits are given
+    if not (args.requests_per_minute or args.audio_seconds_per_minute):
+        for audio_file in audio_files:
+            function(audio_file)
+        return
+
+    from concurrent.futures import as_completed
+    from speech_recognition_exercise.scheduler import QuotaScheduler, schedule_audio_files
+    with QuotaScheduler(args.requests_per_minute or float("inf"), args.audio_seconds_per_minute or float("inf"),
+                        max_workers = args.workers) as scheduler:
+        futures = schedule_audio_files(scheduler, audio_files, function)
+        for future in as_completed(futures.values()):
+            if future.exception() is not None:
+                print(f"Transcription failed: {future.exception()}")
+
+def transcribe_command(args):
+    if args.retry_failed and not args.job_queue:
+        sys.exit("--retry-failed is only available with --job-queue")
+    if args.job_queue and not args.files:
+        audio_files = [] # Resume the jobs that are already in the queue
+    else:
+        audio_files = resolve_audio_files(args.files, args.directory, "Select the files to transcribe (separated by commas): ")
+    output_folder = args.output_folder or os.path.join(DEFAULT_TRANSCRIPTIONS, "WithDiarization" if args.diarize else "WithPunctuation")
+    os.makedirs(output_folder, exist_ok = True)
+
+    if not args.skip_duplicates:
+        transcribe_files(args, audio_files, output_folder)
+        return
+
+    # Files that are acoustically the same as (or part of) an already transcribed recording get a copy of its transcript
+    from speech_recognition_exercise.fingerprint import FingerprintIndex, deduplicate_audio_files, copy_transcripts
+    index = FingerprintIndex(os.path.join(args.directory, "fingerprints.db"))
+    try:
+        audio_files, pending = deduplicate_audio_files(audio_files, index, output_folder)
+    finally:
+        index.close()
+    transcribe_files(args, audio_files, output_folder)
+    copy_transcripts(pending, output_folder)
+
+def transcribe_files(args, audio_files, output_folder):
+    if args.normalize:
+        # Upload and recognize 16 kHz mono copies instead of the original recordings
+        from speech_recognition_exercise.normalization import normalize_audio_files
+        try:
+            audio_files = normalize_audio_files(audio_files, os.path.join(args.directory, "Normalized"), file_format = args.normalize_format)
+        except ValueError as e:
+            sys.exit(f"{e}. Rename one of them or transcribe them separately.")
+
+    if args.engine == "fake" and not args.spark:
+        sys.exit("--engine fake is only available with --spark")
+    if args.spark:
+        # Every partition of the catalog is transcribed on a Spark executor with its own warm backend
+        from pyspark import SparkContext
+        from speech_recognition_exercise.distributed import transcribe_archive
+        options = {}
+        if args.engine == "cloud":
+            options = {"gcs_bucket": args.bucket, "gcs_folder": args.gcs_folder, "convert_numeric_to_text": not args.keep_numbers,
+                       "enable_diarization": args.diarize}
+            if args.diarize:
+                options.update(min_num_speaker = args.min_speakers, max_num_speaker = args.max_speakers)
+        sc = SparkContext(appName = "Transcription")
+        try:
+            transcribe_archive(sc, [os.path.abspath(audio_file) for audio_file in audio_files], args.spark, backend = args.engine,
+                               num_partitions = args.partitions, **options)
+        finally:
+            sc.stop()
+        return
+
+    if args.engine == "web":
+        from speech_recognition_exercise.recognition import transcribe_audio_file
+
+        def transcribe_web(audio_file):
+            transcription = transcribe_audio_file(audio_file)
+            if transcription is None:
+                return
+            text_filename = os.path.join(output_folder, os.path.splitext(os.path.basename(audio_file))[0] + ".txt")
+            with open(text_filename, "w") as f:
+                f.write(transcription)
+            print(f"Transcription saved as: {text_filename}")
+
+        run_for_each_file(args, audio_files, transcribe_web)
+        return
+
+    import threading
+    from speech_recognition_exercise import cloud
+    manifest_file = os.path.join(args.directory, "gcs_manifest.json")
+    manifest = cloud.load_upload_manifest(manifest_file)
+    if args.reconcile_manifest:
+        manifest = cloud.reconcile_upload_manifest(manifest, args.bucket, args.gcs_folder)
+
+    min_num_speaker, max_num_speaker = (args.min_speakers, args.max_speakers) if args.diarize else (None, None)
+    if args.job_queue:
+        from speech_recognition_exercise import jobqueue
+        queue = jobqueue.JobQueue(args.job_queue)
+        print(f"Queued {queue.enqueue(audio_files)} new files")
+        if args.retry_failed:
+            print(f"Retrying {queue.retry_failed()} failed files")
+        queue.close()
+        jobqueue.run_worker_processes(args.job_queue, args.worker_processes, args.bucket, args.gcs_folder, output_folder, manifest,
+                                      enable_diarization = args.diarize, min_num_speaker = min_num_speaker,
+                                      max_num_speaker = max_num_speaker, convert_numeric_to_text = not args.keep_numbers)
+        cloud.save_upload_manifest(jobqueue.record_uploads(args.job_queue, manifest), manifest_file)
+        queue = jobqueue.JobQueue(args.job_queue)
+        print(f"Jobs by state: {queue.counts()}")
+        queue.close()
+        return
+
+    if args.pipeline:
+        import asyncio
+        from google.cloud import storage, speech
+        from speech_recognition_exercise.pipeline import run_transcription_pipeline
+        completed = asyncio.run(run_transcription_pipeline(audio_files, storage.Client(), speech.SpeechClient(),
+                                                           args.bucket, args.gcs_folder, output_folder, manifest,
+                                                           enable_diarization = args.diarize, min_num_speaker = min_num_speaker,
+                                                           max_num_speaker = max_num_speaker,
+                                                           convert_numeric_to_text = not args.keep_numbers))
+        cloud.save_upload_manifest(manifest, manifest_file)
+        print(f"Transcribed {len(completed)} of {len(audio_files)} files")
+        return
+
+    from speech_recognition_exercise.audio_files import measure_sample_rate
+    manifest_lock = threading.Lock()
+
+    def transcribe_cloud(audio_file):
+        gcs_uri = cloud.upload_audio_to_gcs(audio_file, args.bucket, args.gcs_folder, manifest)
+        with manifest_lock:
+            cloud.save_upload_manifest(manifest, manifest_file)
+        transcriptions = cloud.transcribe_audio(gcs_uri, convert_numeric_to_text = not args.keep_numbers,
+                                                sample_rate = measure_sample_rate(audio_file),
+                                                enable_diarization = args.diarize, min_num_speaker = min_num_speaker,
+                                                max_num_speaker = max_num_speaker, encoding = cloud.get_audio_encoding(audio_file))
+        text_filename = os.path.join(output_folder, os.path.splitext(os.path.basename(audio_file))[0] + ".txt")
+        cloud.save_transcription(transcriptions, text_filename, with_speaker_labels = args.diarize)
+        print(f"Transcription saved for {os.path.basename(audio_file)}")
+
+    run_for_each_file(args, audio_files, transcribe_cloud)
+
+def analyze_command(args):
+    if args.report == "tfidf":
+        from speech_recognition_exercise.text_analytics import tfidf_report
+        output_directory = args.output_folder or os.path.join(DEFAULT_TRANSCRIPTIONS, "WordCount", "TFIDF")
+        os.makedirs(output_directory, exist_ok = True)
+        tfidf_report(args.transcriptions_folder or os.path.join(DEFAULT_TRANSCRIPTIONS, "WithDiarization"), output_directory,
+                     k = args.top_k, n_features = args.hash_features)
+        return
+
+    from speech_recognition_exercise import analysis
+    reports = {
+        "word-counts": (analysis.word_counts_report, DEFAULT_TRANSCRIPTIONS, os.path.join(DEFAULT_TRANSCRIPTIONS, "WordCount")),
+        "conversational-turns": (analysis.conversational_turns_report, os.path.join(DEFAULT_TRANSCRIPTIONS, "WithDiarization"),
+                                 os.path.join(DEFAULT_TRANSCRIPTIONS, "WordCount", "ConversationalTurns")),
+        "speaker-statistics": (analysis.speaker_statistics_report, os.path.join(DEFAULT_TRANSCRIPTIONS, "WithDiarization"),
+                               os.path.join(DEFAULT_TRANSCRIPTIONS, "WordCount", "SpeakerStatistics")),
+    }
+    report, transcriptions_folder, output_directory = reports[args.report]
+    transcriptions_folder = args.transcriptions_folder or transcriptions_folder
+    output_directory = args.output_folder or output_directory
+    os.makedirs(output_directory, exist_ok = True)
+    df = report(transcriptions_folder, output_directory)
+    print(df.head(10))
+
+def evaluate_command(args):
+    from speech_recognition_exercise.evaluation import evaluate_transcripts
+    evaluate_transcripts(args.reference_folder, args.hypothesis_folders,
+                         args.output_folder or os.path.join(DEFAULT_TRANSCRIPTIONS, "Evaluation"), max_workers = args.workers)
+
+def loadtest_command(args):
+    from speech_recognition_exercise import loadtest
+    if args.synthetic:
+        audio_files = loadtest.synthetic_recordings(os.path.join(args.directory, "Synthetic"), args.synthetic, args.duration)
+    else:
+        audio_files = loadtest.corpus_files(args.directory)
+    loadtest.run_load_test(audio_files, args.concurrency, args.mode, args.requests, args.upload_latency, args.recognize_latency,
+                           args.jitter, args.error_rate, args.requests_per_minute, args.audio_seconds_per_minute, args.output_file)
+
+def listen_command(args):
+    from speech_recognition_exercise.listener import run_listener
+    run_listener(engine = args.engine, workers = args.workers, device_index = args.device,
+                 sample_rate = args.sample_rate, phrase_time_limit = args.phrase_time_limit)
+
+def play_command(args):
+    from speech_recognition_exercise.playback import play_audio_file_locally
+    for audio_file in resolve_audio_files(args.files, args.directory, "Select the files to play (separated by commas): "):
+        print(f"Currently Playing: {os.path.basename(audio_file)}")
+        play_audio_file_locally(audio_file)
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog = "speech_recognition_exercise", description = "Record, convert, transcribe and analyze speech.")
+    subparsers = parser.add_subparsers(dest = "command", required = True)
+
+    record = subparsers.add_parser("record", help = "record audio from the microphone")
+    record.add_argument("--output-folder", default = DEFAULT_RECORDINGS)
+    record.add_argument("--sample-rate", type = int, default = 16000)
+    record.add_argument("--format", choices = ["wav", "flac"], default = "wav")
+    record.add_argument("--source", action = "append", metavar = "DEVICE:CHANNELS",
+                        help = "record from several devices/channels at once (repeatable)")
+    record.add_argument("--interleaved", action = "store_true", help = "with --source, write one interleaved file")
+    record.add_argument("--transcribe", action = "store_true",
+                        help = "transcribe the recording with the Google Web Speech API straight from memory once it stops")
+    record.set_defaults(handler = record_command)
+
+    convert = subparsers.add_parser("convert", help = "convert MP3/M4A/OGG files or whole directories to WAV and/or to mono")
+    convert.add_argument("files", nargs = "+", help = "audio files or directories")
+    convert.add_argument("--mono", action = "store_true", help = "write mono files (named *_mono.wav)")
+    convert.add_argument("--output-folder", help = "default: next to each source file")
+    convert.add_argument("--check", choices = ["mtime", "hash"], default = "mtime",
+                         help = "skip files whose output is newer than the source, or whose source content is unchanged")
+    convert.add_argument("--workers", type = int, help = "worker processes (default: one per core)")
+    convert.set_defaults(handler = convert_command)
+
+    transcribe = subparsers.add_parser("transcribe", help = "transcribe audio files")
+    transcribe.add_argument("files", nargs = "*", help = "audio files (prompts for a selection from --directory if omitted)")
+    transcribe.add_argument("--directory", default = DEFAULT_RECORDINGS)
+    transcribe.add_argument("--output-folder")
+    transcribe.add_argument("--engine", choices = ["cloud", "web", "fake"], default = "cloud",
+                            help = "Google Cloud Speech-to-Text, the Google Web Speech API, or (with --spark) "
+                                   "local stand-ins for the Cloud clients that need no credentials")
+    transcribe.add_argument("--bucket", default = "sample-voice-recordings")
+    transcribe.add_argument("--gcs-folder", default = "audio_files")
+    transcribe.add_argument("--reconcile-manifest", action = "store_true")
+    transcribe.add_argument("--diarize", action = "store_true")
+    transcribe.add_argument("--min-speakers", type = int, default = 1)
+    transcribe.add_argument("--max-speakers", type = int, default = 2)
+    transcribe.add_argument("--keep-numbers", action = "store_true", help = "do not convert numbers to words")
+    transcribe.add_argument("--skip-duplicates", action = "store_true",
+                            help = "reuse the transcript of an acoustically identical recording instead of transcribing again")
+    transcribe.add_argument("--normalize", action = "store_true", help = "downmix, resample to 16 kHz and normalize the level before uploading")
+    transcribe.add_argument("--normalize-format", choices = ["wav", "flac"], default = "wav", help = "file format of the normalized copies")
+    transcribe.add_argument("--pipeline", action = "store_true", help = "overlap uploads, recognition and writes across files")
+    transcribe.add_argument("--spark", metavar = "DIRECTORY",
+                            help = "transcribe on Spark executors and write a partitioned dataset to DIRECTORY (analyze can read it)")
+    transcribe.add_argument("--partitions", type = int, help = "with --spark, number of partitions of the audio catalog")
+    transcribe.add_argument("--job-queue", metavar = "DATABASE",
+                            help = "track the files in a SQLite job queue; rerun without files to resume an interrupted batch")
+    transcribe.add_argument("--retry-failed", action = "store_true", help = "give the failed files in the job queue new attempts")
+    transcribe.add_argument("--worker-processes", type = int, default = 1, help = "processes working on the job queue")
+    transcribe.add_argument("--requests-per-minute", type = float, help = "recognition request quota; enables the quota-aware scheduler")
+    transcribe.add_argument("--audio-seconds-per-minute", type = float, help = "seconds of audio per minute quota; enables the quota-aware scheduler")
+    transcribe.add_argument("--workers", type = int, default = 8, help = "files recognized in parallel by the scheduler")
+    transcribe.set_defaults(handler = transcribe_command)
+
+    analyze = subparsers.add_parser("analyze", help = "run the word-count and TF-IDF analyses over transcripts")
+    analyze.add_argument("report", choices = ["word-counts", "conversational-turns", "speaker-statistics", "tfidf"])
+    analyze.add_argument("--transcriptions-folder")
+    analyze.add_argument("--output-folder")
+    analyze.add_argument("--top-k", type = int, default = 10, help = "tfidf: terms and similar transcripts to report")
+    analyze.add_argument("--hash-features", type = int, help = "tfidf: hash n-grams into this many columns instead of building a vocabulary")
+    analyze.set_defaults(handler = analyze_command)
+
+    evaluate = subparsers.add_parser("evaluate", help = "word error rate of transcripts against reference transcripts")
+    evaluate.add_argument("reference_folder")
+    evaluate.add_argument("hypothesis_folders", nargs = "+", help = "one folder per backend or configuration, with the same file names")
+    evaluate.add_argument("--output-folder")
+    evaluate.add_argument("--workers", type = int, help = "number of worker processes")
+    evaluate.set_defaults(handler = evaluate_command)
+
+    loadtest = subparsers.add_parser("loadtest", help = "replay recordings through the transcription path against simulated backends")
+    loadtest.add_argument("--directory", default = DEFAULT_RECORDINGS)
+    loadtest.add_argument("--synthetic", type = int, metavar = "COUNT", help = "generate COUNT synthetic recordings instead of using --directory")
+    loadtest.add_argument("--duration", type = float, default = 10.0, help = "average length of the synthetic recordings in seconds")
+    loadtest.add_argument("--mode", choices = ["streams", "batch"], default = "streams",
+                          help = "independent per-file streams or batches through the asyncio pipeline")
+    loadtest.add_argument("--concurrency", type = int, nargs = "+", default = [1, 2, 4, 8, 16])
+    loadtest.add_argument("--requests", type = int, help = "requests per concurrency level (default: 4 per stream)")
+    loadtest.add_argument("--upload-latency", type = float, default = 0.05)
+    loadtest.add_argument("--recognize-latency", type = float, default = 1.0)
+    loadtest.add_argument("--jitter", type = float, default = 0.5, help = "random extra latency, as a fraction of the latency")
+    loadtest.add_argument("--error-rate", type = float, default = 0.0, help = "fraction of simulated requests that fail")
+    loadtest.add_argument("--requests-per-minute", type = float, help = "quota of the simulated recognition backend")
+    loadtest.add_argument("--audio-seconds-per-minute", type = float, help = "audio quota of the simulated recognition backend")
+    loadtest.add_argument("--output-file", help = "save the results as CSV")
+    loadtest.set_defaults(handler = loadtest_command)
+
+    listen = subparsers.add_parser("listen", help = "continuously transcribe speech from the microphone")
+    listen.add_argument("--engine", default = "google", help = "SpeechRecognition engine, e.g. google or sphinx")
+    listen.add_argument("--workers", type = int, default = 4, help = "number of utterances recognized in parallel")
+    listen.add_argument("--device", type = int, help = "input device index")
+    listen.add_argument("--sample-rate", type = int, default = 16000)
+    listen.add_argument("--phrase-time-limit", type = float, help = "maximum length of an utterance in seconds")
+    listen.set_defaults(handler = listen_command)
+
+    play = subparsers.add_parser("play", help = "play audio files")
+    play.add_argument("files", nargs = "*")
+    play.add_argument("--directory", default = DEFAULT_RECORDINGS)
+    play.set_defaults(handler = play_command)
+    return parser
+
+def main(argv = None):
+    args = build_parser().parse_args(argv)
+    args.handler(args)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,156 @@
+import os
+import json
+import logging
+import soundfile as sf
+from google.cloud import storage
+from google.cloud import speech
+from google.api_core import operation
+from google.api_core.exceptions import PreconditionFailed
+from num2words import num2words
+from speech_recognition_exercise.audio_files import hash_audio_pcm
+from speech_recognition_exercise.transcripts import save_transcript_records
+
+# Disable debug messages from google.auth
+logging.getLogger('google.auth').setLevel(logging.WARNING)
+
+# Disable debug messages from google-api-core
+logging.getLogger('google.api_core').setLevel(logging.WARNING)
+
+# Disable debug messages from urllib3
+logging.getLogger('urllib3').setLevel(logging.WARNING)
+
+def load_upload_manifest(manifest_file):
+    if not os.path.exists(manifest_file):
+        return {}
+    with open(manifest_file, "r") as f:
+        return json.load(f)
+
+def save_upload_manifest(manifest, manifest_file):
+    # Write to a temporary file first so an interrupted run never leaves a half-written manifest behind
+    temp_file = manifest_file + ".tmp"
+    with open(temp_file, "w") as f:
+        json.dump(manifest, f, indent = 2, sort_keys = True)
+    os.replace(temp_file, manifest_file)
+
+def reconcile_upload_manifest(manifest, gcs_bucket, gcs_folder, client = None):
+    # Rebuild the manifest entries for this bucket folder from a single (paginated) listing of the bucket
+    client = client or storage.Client()
+    prefix = f"gs://{gcs_bucket}/{gcs_folder}/"
+    listed = {}
+    for blob in client.list_blobs(gcs_bucket, prefix = f"{gcs_folder}/"):
+        audio_hash = os.path.splitext(os.path.basename(blob.name))[0]
+        listed[audio_hash] = f"gs://{gcs_bucket}/{blob.name}"
+
+    # Drop entries whose objects were deleted from the bucket, then add the ones we did not know about
+    for audio_hash, gcs_uri in list(manifest.items()):
+        if gcs_uri.startswith(prefix) and audio_hash not in listed:
+            del manifest[audio_hash]
+    manifest.update(listed)
+    print(f"Manifest reconciled with {len(listed)} objects in {prefix}")
+    return manifest
+
+def upload_audio_to_gcs(local_file, gcs_bucket, gcs_folder, manifest, client = None, audio_hash = None):
+    file_name = os.path.basename(local_file)
+    audio_hash = audio_hash or hash_audio_pcm(local_file)
+
+    # Known content is skipped without a single request to GCS
+    if audio_hash in manifest:
+        print(f"File {file_name} already uploaded as {manifest[audio_hash]}. Skipping upload.")
+        return manifest[audio_hash]
+
+    print(f"Uploading {file_name} to GCS Bucket: {gcs_bucket}...")
+    client = client or storage.Client()
+    bucket = client.bucket(gcs_bucket)
+    gcs_filename = f"{gcs_folder}/{audio_hash}{os.path.splitext(file_name)[1]}"
+    blob = bucket.blob(gcs_filename)
+
+    # Only create the object if it does not exist yet, instead of checking with a separate request first
+    try:
+        blob.upload_from_filename(local_file, if_generation_match = 0)
+        print(f"File {gcs_filename} uploaded successfully.")
+    except PreconditionFailed:
+        print(f"File {gcs_filename} already exists. Skipping upload.")
+
+    manifest[audio_hash] = f"gs://{gcs_bucket}/{gcs_filename}"
+    return manifest[audio_hash]
+
+def get_audio_encoding(local_file):
+    # Pick the encoding from the file's container so FLAC recordings are not sent as LINEAR16
+    with sf.SoundFile(local_file, "r") as sound_file:
+        file_format = sound_file.format
+    if file_format == "FLAC":
+        return speech.RecognitionConfig.AudioEncoding.FLAC
+    return speech.RecognitionConfig.AudioEncoding.LINEAR16
+
+def build_recognition_config(sample_rate = None, encoding = speech.RecognitionConfig.AudioEncoding.LINEAR16,
+                             enable_diarization = False, min_num_speaker = None, max_num_speaker = None):
+    return speech.RecognitionConfig(
+        encoding = encoding,
+        sample_rate_hertz = sample_rate,
+        language_code = "en-US",
+        enable_automatic_punctuation = True,
+        enable_word_time_offsets = True, # Enable word-level time offsets
+        diarization_config = speech.SpeakerDiarizationConfig(
+            enable_speaker_diarization = enable_diarization,
+            min_speaker_count = min_num_speaker,
+            max_speaker_count = max_num_speaker,
+        ),
+    )
+
+def extract_transcriptions(response, convert_numeric_to_text = True, enable_diarization = False):
+    # Extract the transcriptions with speaker labels, confidence and word timings, converting numeric values to text if enabled.
+    # Without diarization the API reports speaker tag 0 for every word, which is stored as no speaker label (None) instead.
+    speaker_label = lambda word_info: word_info.speaker_tag if enable_diarization else None
+    transcriptions = []
+    for result in response.results:
+        alternative = result.alternatives[0]
+        if not alternative.words:
+            continue
+        words = []
+        for word_info in alternative.words:
+            word = word_info.word
+            if convert_numeric_to_text and word.isdigit():
+                word = num2words(int(word), lang = 'en')
+            words.append({"word": word, "start_time": word_info.start_time.total_seconds(),
+                          "end_time": word_info.end_time.total_seconds(), "speaker_label": speaker_label(word_info)})
+        transcriptions.append({
+            "transcript": " ".join(word["word"] for word in words),
+            "speaker_label": speaker_label(alternative.words[0]),
+            "confidence": alternative.confidence,
+            "start_time": words[0]["start_time"],
+            "end_time": words[-1]["end_time"],
+            "words": words,
+        })
+    return transcriptions
+
+def transcribe_audio(gcs_uri, convert_numeric_to_text = True, sample_rate = None,
+                     enable_diarization = False, min_num_speaker = None, max_num_speaker = None, # as default, diarization won't be enabled
+                     encoding = speech.RecognitionConfig.AudioEncoding.LINEAR16, client = None):
+    print("Transcribing with punctuation and diarization..." if enable_diarization else "Transcribing with punctuation...")
+    client = client or speech.SpeechClient()
+
+    # Configure the audio settings
+    audio = speech.RecognitionAudio(uri = gcs_uri)
+    config = build_recognition_config(sample_rate, encoding, enable_diarization, min_num_speaker, max_num_speaker)
+
+    # Perform the asynchronous transcription
+    operation = client.long_running_recognize(config = config, audio = audio)
+    response = operation.result()
+    return extract_transcriptions(response, convert_numeric_to_text, enable_diarization)
+
+def resume_recognition(operation_name, client = None):
+    # Pick up a long-running recognition submitted by an earlier run by its operation name, instead of resubmitting it
+    client = client or speech.SpeechClient()
+    operations_client = client.transport.operations_client
+    return operation.from_gapic(operations_client.get_operation(operation_name), operations_client,
+                                speech.LongRunningRecognizeResponse, metadata_type = speech.LongRunningRecognizeMetadata)
+
+def save_transcription(transcriptions, text_filename, with_speaker_labels = True):
+    # The structured records (.jsonl) are what the analyses read; the text file is for people
+    save_transcript_records(transcriptions, text_filename)
+    with open(text_filename, "w") as f:
+        if with_speaker_labels:
+            for transcription in transcriptions:
+                f.write(f"Speaker {transcription['speaker_label']}: {transcription['transcript']}\n")
+        else:
+            f.write(" ".join(transcription["transcript"] for transcription in transcriptions))
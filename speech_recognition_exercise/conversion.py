@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from pydub import AudioSegment
+
+CONVERTIBLE_EXTENSIONS = (".mp3", ".m4a", ".ogg", ".wav", ".flac")
+
+def convert_mp3_to_wav(mp3_file):
+    wav_file = os.path.splitext(mp3_file)[0] + '.wav'  # Generate the WAV file name
+    audio = AudioSegment.from_mp3(mp3_file)
+    audio.export(wav_file, format = 'wav')
+    return wav_file
+
+def convert_to_mono(audio_file):
+    output_file = os.path.splitext(audio_file)[0] + '_mono.wav'
+    audio = AudioSegment.from_wav(audio_file)
+    audio = audio.set_channels(1)  # Convert to mono
+    audio.export(output_file, format = 'wav')
+    return output_file
+
+# Batch conversion of whole directories. Files are decoded and exported in a process pool (one worker
+# per core by default), each output is written to a temporary file and renamed into place, and files
+# whose output is already up to date are skipped, either by modification time or by a content hash of
+# the source recorded in a manifest next to the outputs. Outputs of an earlier --mono run are never
+# converted again, and sources that would be converted to the same output are refused up front.
+
+def batch_output_file(source_file, output_directory, mono = False):
+    base_name = os.path.splitext(os.path.basename(source_file))[0]
+    return os.path.join(output_directory or os.path.dirname(source_file), base_name + ("_mono" if mono else "") + ".wav")
+
+def is_mono_output(source_file):
+    base_name, extension = os.path.splitext(os.path.basename(source_file))
+    return base_name.endswith("_mono") and extension.lower() == ".wav"
+
+def find_output_conflicts(source_files, output_directory = None, mono = False):
+    # {output file: [source files]} for outputs that more than one source would be converted to, e.g. talk.mp3 and talk.wav
+    sources_by_output = {}
+    for source_file in source_files:
+        output_file = os.path.abspath(batch_output_file(source_file, output_directory, mono))
+        sources_by_output.setdefault(output_file, []).append(source_file)
+    return {output_file: sources for output_file, sources in sources_by_output.items() if len(sources) > 1}
+
+def hash_file(path, block_size = 1 << 20):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+def convert_audio_file(source_file, output_file, mono = False, with_hash = False):
+    # Runs in a worker process; decodes any format ffmpeg can read and exports it as WAV
+    start_time = time.perf_counter()
+    source_hash = hash_file(source_file) if with_hash else None
+    audio = AudioSegment.from_file(source_file)
+    if mono:
+        audio = audio.set_channels(1)
+    temp_file = output_file + ".tmp"
+    audio.export(temp_file, format = 'wav')
+    os.replace(temp_file, output_file)
+    return {"seconds": time.perf_counter() - start_time, "audio_seconds": audio.duration_seconds,
+            "bytes": os.path.getsize(source_file) + os.path.getsize(output_file), "source_hash": source_hash}
+
+def convert_audio_files(source_files, output_directory = None, mono = False, check = "mtime", max_workers = None):
+    # Converts the files that are not up to date; check is "mtime" (output newer than source) or "hash" (source content unchanged)
+    if mono:
+        skipped = [source_file for source_file in source_files if is_mono_output(source_file)]
+        if skipped:
+            print(f"Skipping {len(skipped)} files that are already mono conversions")
+        source_files = [source_file for source_file in source_files if not is_mono_output(source_file)]
+    if not source_files:
+        return []
+    # Two sources with the same output would race on its temporary file and overwrite each other
+    conflicts = find_output_conflicts(source_files, output_directory, mono)
+    if conflicts:
+        raise ValueError("Several files would be converted to the same output: " + "; ".join(
+            f"{', '.join(os.path.basename(source_file) for source_file in sources)} -> {os.path.basename(output_file)}"
+            for output_file, sources in conflicts.items()))
+    if output_directory:
+        os.makedirs(output_directory, exist_ok = True)
+    manifest_file = os.path.join(output_directory or os.path.dirname(os.path.abspath(source_files[0])), "conversion_manifest.json")
+    manifest = {}
+    if check == "hash" and os.path.exists(manifest_file):
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+
+    jobs, output_files, source_hashes = [], [], {}
+    for source_file in source_files:
+        output_file = batch_output_file(source_file, output_directory, mono)
+        output_files.append(output_file)
+        if os.path.abspath(output_file) == os.path.abspath(source_file):
+            continue # Already a WAV with nothing to change
+        if os.path.exists(output_file):
+            if check == "mtime" and os.path.getmtime(output_file) >= os.path.getmtime(source_file):
+                continue
+            if check == "hash":
+                source_hashes[output_file] = hash_file(source_file)
+                if manifest.get(os.path.abspath(output_file)) == source_hashes[output_file]:
+                    continue
+        jobs.append((source_file, output_file))
+    print(f"Converting {len(jobs)} files, {len(source_files) - len(jobs)} already up to date")
+
+    start_time = time.perf_counter()
+    total_audio_seconds = total_bytes = 0
+    with ProcessPoolExecutor(max_workers = max_workers or os.cpu_count()) as executor:
+        futures = [executor.submit(convert_audio_file, source_file, output_file, mono, check == "hash" and output_file not in source_hashes)
+                   for source_file, output_file in jobs]
+        for (source_file, output_file), future in zip(jobs, futures):
+            try:
+                stats = future.result()
+            except Exception as e:
+                print(f"Could not convert {os.path.basename(source_file)}: {e}")
+                continue
+            total_audio_seconds += stats["audio_seconds"]
+            total_bytes += stats["bytes"]
+            if check == "hash":
+                manifest[os.path.abspath(output_file)] = source_hashes.get(output_file) or stats["source_hash"]
+            print(f"Converted {os.path.basename(source_file)} -> {os.path.basename(output_file)} in {stats['seconds']:.2f} seconds "
+                  f"({stats['audio_seconds'] / stats['seconds']:.0f}x realtime, {stats['bytes'] / stats['seconds'] / 1e6:.1f} MB/s)")
+    elapsed = time.perf_counter() - start_time
+
+    if check == "hash" and jobs:
+        temp_file = manifest_file + ".tmp"
+        with open(temp_file, "w") as f:
+            json.dump(manifest, f, indent = 2, sort_keys = True)
+        os.replace(temp_file, manifest_file)
+    if jobs:
+        print(f"Total: {len(jobs)} files, {total_audio_seconds / 60:.1f} minutes of audio in {elapsed:.1f} seconds "
+              f"({total_audio_seconds / elapsed:.0f}x realtime, {total_bytes / elapsed / 1e6:.1f} MB/s)")
+    return output_files
@@ -0,0 +1,94 @@
+import os
+import json
+import shutil
+import tempfile
+
+# Distributed recognition over Spark for archive-scale backfills. The audio catalog (a list of paths
+# every executor can read, e.g. on a shared file system) is split into partitions and each partition
+# is transcribed with mapPartitions, so every partition creates its backend (Cloud clients or a
+# Recognizer) once and reuses it for all of its files. The transcripts are written as a partitioned
+# JSONL dataset, one record per segment tagged with its transcription, which the word-count analyses
+# in analysis.py read directly.
+#
+# Backends:
+#   cloud - upload to GCS and Google Cloud Speech-to-Text, as in `transcribe --engine cloud`
+#   web   - the Google Web Speech API through SpeechRecognition
+#   fake  - the cloud path against the local stand-in clients, for running in Spark local mode
+#
+# A backend is a function transcribing one audio file; it may have a close() method, which is called
+# once its partition is done.
+
+def cloud_backend(gcs_bucket, gcs_folder, storage_client = None, speech_client = None, convert_numeric_to_text = True,
+                  enable_diarization = False, min_num_speaker = None, max_num_speaker = None):
+    from google.cloud import storage, speech
+    from speech_recognition_exercise.audio_files import measure_sample_rate
+    from speech_recognition_exercise.cloud import upload_audio_to_gcs, transcribe_audio, get_audio_encoding
+    storage_client = storage_client or storage.Client()
+    speech_client = speech_client or speech.SpeechClient()
+    manifest = {} # Per partition; uploads of content that already exists are skipped by GCS itself
+
+    def transcribe(audio_file):
+        gcs_uri = upload_audio_to_gcs(audio_file, gcs_bucket, gcs_folder, manifest, client = storage_client)
+        return transcribe_audio(gcs_uri, convert_numeric_to_text = convert_numeric_to_text, sample_rate = measure_sample_rate(audio_file),
+                                enable_diarization = enable_diarization, min_num_speaker = min_num_speaker,
+                                max_num_speaker = max_num_speaker, encoding = get_audio_encoding(audio_file), client = speech_client)
+    return transcribe
+
+def web_backend():
+    import speech_recognition as sr
+    from speech_recognition_exercise.recognition import is_windowed, iter_audio_windows
+    r = sr.Recognizer()
+
+    def recognize(audio):
+        try:
+            return r.recognize_google(audio)
+        except sr.UnknownValueError:
+            return None
+
+    def transcribe(audio_file):
+        if is_windowed(audio_file):
+            # Long WAV files window by window, as in recognition.transcribe_audio_file
+            texts = [recognize(audio) for _, audio in iter_audio_windows(audio_file)]
+            text = " ".join(text for text in texts if text)
+        else:
+            with sr.AudioFile(audio_file) as source:
+                text = recognize(r.record(source))
+        return [{"transcript": text, "speaker_label": None}] if text else [] # No diarization
+    return transcribe
+
+def fake_backend(latency = 0.0):
+    from speech_recognition_exercise.local_clients import LocalStorageClient, LocalSpeechClient
+    storage_root = tempfile.mkdtemp(prefix = "fake_gcs_")
+    transcribe = cloud_backend("fake-bucket", "audio_files", storage_client = LocalStorageClient(storage_root),
+                               speech_client = LocalSpeechClient(latency = latency))
+    transcribe.close = lambda: shutil.rmtree(storage_root, ignore_errors = True) # The "bucket" only lives as long as the partition
+    return transcribe
+
+BACKENDS = {"cloud": cloud_backend, "web": web_backend, "fake": fake_backend}
+
+def transcribe_partition(audio_files, backend, options, failures):
+    # Runs on an executor: one backend for the whole partition, one JSON line per transcript segment
+    transcribe = BACKENDS[backend](**options)
+    try:
+        for audio_file in audio_files:
+            transcription = os.path.splitext(os.path.basename(audio_file))[0]
+            try:
+                transcriptions = transcribe(audio_file)
+            except Exception as e:
+                print(f"Transcription failed for {os.path.basename(audio_file)}: {e}")
+                failures.add(1)
+                continue
+            for segment in transcriptions:
+                yield json.dumps({"transcription": transcription, **segment})
+    finally:
+        if hasattr(transcribe, "close"):
+            transcribe.close()
+
+def transcribe_archive(sc, audio_files, output_directory, backend = "cloud", num_partitions = None, **options):
+    # Writes the partitioned dataset to output_directory, which must not exist yet
+    failures = sc.accumulator(0)
+    catalog = sc.parallelize(audio_files, num_partitions or sc.defaultParallelism)
+    records = catalog.mapPartitions(lambda partition: transcribe_partition(partition, backend, options, failures))
+    records.saveAsTextFile(output_directory)
+    print(f"Transcribed {len(audio_files) - failures.value} of {len(audio_files)} files into {output_directory}")
+    return output_directory
@@ -0,0 +1,158 @@
+import os
+import csv
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from speech_recognition_exercise.tokenizer import tokenize
+from speech_recognition_exercise.transcripts import read_transcript_records
+
+# Word error rate (WER) evaluation. Hypothesis transcripts are aligned against reference transcripts
+# with a word-level edit distance: words are interned to integer ids and the dynamic program is
+# computed one row at a time with NumPy, so each row costs a few vector operations instead of a
+# Python loop over every cell. Files are scored in parallel in a process pool.
+#
+# WER = (substitutions + deletions + insertions) / number of reference words
+
+EQUAL, SUBSTITUTION, DELETION, INSERTION = "=", "S", "D", "I"
+
+def read_speaker_tokens(text_file):
+    # Tokens of a transcript together with the speaker label of the segment they come from (None without labels)
+    tokens, speakers = [], []
+    for speaker, text in read_transcript_records(text_file):
+        segment_tokens = tokenize(text)
+        tokens.extend(segment_tokens)
+        speakers.extend([speaker] * len(segment_tokens))
+    return tokens, speakers
+
+def intern_tokens(reference, hypothesis):
+    vocabulary = {}
+    to_ids = lambda tokens: np.fromiter((vocabulary.setdefault(token, len(vocabulary)) for token in tokens), dtype = np.int32, count = len(tokens))
+    return to_ids(reference), to_ids(hypothesis)
+
+def edit_distance_matrix(reference_ids, hypothesis_ids):
+    # distance[i, j] is the edit distance between the first i reference words and the first j hypothesis words
+    n, m = len(reference_ids), len(hypothesis_ids)
+    distance = np.empty((n + 1, m + 1), dtype = np.int32)
+    distance[0] = np.arange(m + 1)
+    columns = np.arange(m + 1, dtype = np.int32)
+    for i in range(1, n + 1):
+        previous = distance[i - 1]
+        # Substitution (or match) and deletion only depend on the previous row
+        row = np.empty(m + 1, dtype = np.int32)
+        row[0] = i
+        row[1:] = np.minimum(previous[:-1] + (hypothesis_ids != reference_ids[i - 1]), previous[1:] + 1)
+        # Insertions chain along the row: row[j] = min over k <= j of row[k] + (j - k), i.e. a running minimum
+        distance[i] = np.minimum.accumulate(row - columns) + columns
+    return distance
+
+def align(reference, hypothesis):
+    # Backtrace through the edit distance matrix; returns (operation, reference index, hypothesis index) triples
+    reference_ids, hypothesis_ids = intern_tokens(reference, hypothesis)
+    distance = edit_distance_matrix(reference_ids, hypothesis_ids)
+    alignment = []
+    i, j = len(reference), len(hypothesis)
+    while i > 0 or j > 0:
+        if i > 0 and j > 0 and distance[i, j] == distance[i - 1, j - 1] + (reference_ids[i - 1] != hypothesis_ids[j - 1]):
+            alignment.append((EQUAL if reference_ids[i - 1] == hypothesis_ids[j - 1] else SUBSTITUTION, i - 1, j - 1))
+            i, j = i - 1, j - 1
+        elif i > 0 and distance[i, j] == distance[i - 1, j] + 1:
+            alignment.append((DELETION, i - 1, None))
+            i -= 1
+        else:
+            alignment.append((INSERTION, None, j - 1))
+            j -= 1
+    alignment.reverse()
+    return alignment
+
+def score_file(reference_file, hypothesis_file):
+    # Runs in a worker process
+    reference, speakers = read_speaker_tokens(reference_file)
+    hypothesis, _ = read_speaker_tokens(hypothesis_file)
+    alignment = align(reference, hypothesis)
+
+    # Errors are charged to the reference speaker; an insertion goes to the speaker of the reference word before it
+    per_speaker = {}
+    speaker = speakers[0] if speakers else None
+    for operation, i, j in alignment:
+        if i is not None:
+            speaker = speakers[i]
+        counts = per_speaker.setdefault(speaker, {"Reference Words": 0, EQUAL: 0, SUBSTITUTION: 0, DELETION: 0, INSERTION: 0})
+        counts[operation] += 1
+        counts["Reference Words"] += operation != INSERTION
+
+    diff = []
+    for operation, i, j in alignment:
+        if operation == EQUAL:
+            diff.append(f"  {reference[i]}")
+        elif operation == SUBSTITUTION:
+            diff.append(f"S {reference[i]} -> {hypothesis[j]}")
+        elif operation == DELETION:
+            diff.append(f"D {reference[i]}")
+        else:
+            diff.append(f"I {hypothesis[j]}")
+    return hypothesis_file, per_speaker, diff
+
+def error_counts(counts):
+    reference_words = counts["Reference Words"]
+    errors = counts[SUBSTITUTION] + counts[DELETION] + counts[INSERTION]
+    return {
+        "Reference Words": reference_words,
+        "Substitutions": counts[SUBSTITUTION],
+        "Deletions": counts[DELETION],
+        "Insertions": counts[INSERTION],
+        "WER": errors / reference_words if reference_words else float(errors > 0),
+    }
+
+def add_counts(total, counts):
+    for key, value in counts.items():
+        total[key] = total.get(key, 0) + value
+    return total
+
+def diff_directories(hypothesis_folders, output_directory):
+    # Each hypothesis folder's diffs go into a directory named after its path relative to the folders' common parent,
+    # so folders with the same name (e.g. a/Transcriptions and b/Transcriptions) do not overwrite each other's diffs
+    folders = [os.path.abspath(hypothesis_folder) for hypothesis_folder in hypothesis_folders]
+    parent = os.path.commonpath([os.path.dirname(folder) for folder in folders])
+    return {hypothesis_folder: os.path.join(output_directory, "diffs", os.path.relpath(folder, parent))
+            for hypothesis_folder, folder in zip(hypothesis_folders, folders)}
+
+def evaluate_transcripts(reference_folder, hypothesis_folders, output_directory, max_workers = None):
+    # Scores every hypothesis folder (e.g. one per backend or configuration) against the same references
+    os.makedirs(output_directory, exist_ok = True)
+    references = sorted(file_name for file_name in os.listdir(reference_folder) if file_name.endswith(".txt"))
+    file_rows, speaker_rows, summary = [], [], {}
+    diff_directory = diff_directories(hypothesis_folders, output_directory)
+    with ProcessPoolExecutor(max_workers = max_workers) as executor:
+        futures = [(hypothesis_folder, executor.submit(score_file, os.path.join(reference_folder, file_name),
+                                                       os.path.join(hypothesis_folder, file_name)))
+                   for hypothesis_folder in hypothesis_folders for file_name in references
+                   if os.path.exists(os.path.join(hypothesis_folder, file_name))]
+        for hypothesis_folder, future in futures:
+            hypothesis_file, per_speaker, diff = future.result()
+            file_name = os.path.basename(hypothesis_file)
+            transcription = os.path.splitext(file_name)[0]
+            file_counts = {}
+            for speaker, counts in per_speaker.items():
+                add_counts(file_counts, counts)
+                speaker_rows.append({"Hypothesis": hypothesis_folder, "Transcription": transcription, "Speaker_Label": speaker,
+                                     **error_counts(counts)})
+            file_rows.append({"Hypothesis": hypothesis_folder, "Transcription": transcription, **error_counts(file_counts)})
+            add_counts(summary.setdefault(hypothesis_folder, {}), file_counts)
+
+            # One aligned diff per transcript and hypothesis folder
+            os.makedirs(diff_directory[hypothesis_folder], exist_ok = True)
+            diff_file = os.path.join(diff_directory[hypothesis_folder], f"{transcription}_diff.txt")
+            with open(diff_file, "w") as f:
+                f.write("\n".join(diff) + "\n")
+
+    for file_name, rows in (("wer_by_transcription.csv", file_rows), ("wer_by_speaker.csv", speaker_rows)):
+        if rows:
+            with open(os.path.join(output_directory, file_name), "w", newline = "") as f:
+                writer = csv.DictWriter(f, fieldnames = list(rows[0]))
+                writer.writeheader()
+                writer.writerows(rows)
+
+    for hypothesis_folder, counts in summary.items():
+        result = error_counts(counts)
+        print(f"{hypothesis_folder}: WER {result['WER']:.2%} over {result['Reference Words']} reference words "
+              f"({result['Substitutions']} substitutions, {result['Deletions']} deletions, {result['Insertions']} insertions)")
+    return file_rows, speaker_rows
@@ -0,0 +1,100 @@
+import os
+import json
+import hashlib
+import tempfile
+import numpy as np
+import soundfile as sf
+from concurrent.futures import ProcessPoolExecutor
+from speech_recognition_exercise.audio_files import hash_audio_pcm
+
+FEATURE_PARAMS = {
+    "frame_ms": 25, # Length of each frame in milliseconds
+    "hop_ms": 10, # Step between consecutive frames in milliseconds
+    "n_mels": 40, # Number of mel filters
+    "n_mfcc": 13, # Number of cepstral coefficients to keep
+    "pre_emphasis": 0.97, # Boosts the high frequencies before framing
+}
+
+def frame_signal(signal, frame_length, hop_length):
+    # Return a (num_frames, frame_length) view of the signal without copying it
+    if len(signal) < frame_length:
+        signal = np.pad(signal, (0, frame_length - len(signal)))
+    return np.lib.stride_tricks.sliding_window_view(signal, frame_length)[::hop_length]
+
+def hz_to_mel(hz):
+    return 2595.0 * np.log10(1.0 + hz / 700.0)
+
+def mel_to_hz(mel):
+    return 700.0 * (10.0 ** (mel / 2595.0) - 1.0)
+
+def mel_filter_bank(n_mels, n_fft, sample_rate):
+    # Triangular filters spaced evenly on the mel scale, built for all filters at once
+    mel_points = np.linspace(hz_to_mel(0.0), hz_to_mel(sample_rate / 2.0), n_mels + 2)
+    hz_points = mel_to_hz(mel_points)
+    fft_freqs = np.fft.rfftfreq(n_fft, d = 1.0 / sample_rate)
+    lower, center, upper = hz_points[:-2, None], hz_points[1:-1, None], hz_points[2:, None]
+    rising = (fft_freqs - lower) / (center - lower)
+    falling = (upper - fft_freqs) / (upper - center)
+    return np.maximum(0.0, np.minimum(rising, falling))
+
+def dct_matrix(n_mfcc, n_mels):
+    # Orthonormal DCT-II basis, so the MFCCs are a single matrix product
+    n = np.arange(n_mels)
+    k = np.arange(n_mfcc)[:, None]
+    basis = np.cos(np.pi * k * (2 * n + 1) / (2 * n_mels)) * np.sqrt(2.0 / n_mels)
+    basis[0] /= np.sqrt(2.0)
+    return basis
+
+def compute_features(signal, sample_rate, params = FEATURE_PARAMS):
+    frame_length = int(round(sample_rate * params["frame_ms"] / 1000))
+    hop_length = int(round(sample_rate * params["hop_ms"] / 1000))
+    n_fft = 1 << (frame_length - 1).bit_length() # Next power of two
+
+    emphasized = np.append(signal[:1], signal[1:] - params["pre_emphasis"] * signal[:-1])
+    frames = frame_signal(emphasized, frame_length, hop_length) * np.hamming(frame_length)
+    power_spectrum = np.abs(np.fft.rfft(frames, n = n_fft)) ** 2 / n_fft
+
+    mel_energies = power_spectrum @ mel_filter_bank(params["n_mels"], n_fft, sample_rate).T
+    log_mel = np.log(np.maximum(mel_energies, np.finfo(np.float32).eps)).astype(np.float32)
+    mfcc = (log_mel @ dct_matrix(params["n_mfcc"], params["n_mels"]).T).astype(np.float32)
+    return log_mel, mfcc
+
+def feature_cache_paths(cache_directory, audio_hash, params = FEATURE_PARAMS):
+    # The parameters are part of the file name, so changing any of them never returns stale features
+    params_key = hashlib.sha1(json.dumps(params, sort_keys = True).encode()).hexdigest()[:12]
+    base_name = os.path.join(cache_directory, f"{audio_hash}_{params_key}")
+    return {"log_mel": base_name + "_logmel.npy", "mfcc": base_name + "_mfcc.npy"}
+
+def save_feature_array(array, path):
+    # A temporary file of its own, since two workers may compute the same features (recordings with the same audio) at once
+    fd, temp_file = tempfile.mkstemp(dir = os.path.dirname(path), suffix = ".tmp.npy")
+    with os.fdopen(fd, "wb") as f:
+        np.save(f, array)
+    os.replace(temp_file, path)
+
+def extract_file_features(audio_file, cache_directory, params = FEATURE_PARAMS):
+    # Runs in a worker process; returns the cache paths, computing the features only if they are missing
+    paths = feature_cache_paths(cache_directory, hash_audio_pcm(audio_file), params)
+    if all(os.path.exists(path) for path in paths.values()):
+        return audio_file, paths, True
+
+    signal, sample_rate = sf.read(audio_file, dtype = 'float32')
+    if signal.ndim > 1:
+        signal = signal.mean(axis = 1) # Downmix to mono
+    log_mel, mfcc = compute_features(signal, sample_rate, params)
+    save_feature_array(log_mel, paths["log_mel"])
+    save_feature_array(mfcc, paths["mfcc"])
+    return audio_file, paths, False
+
+def extract_corpus_features(audio_files, cache_directory, params = FEATURE_PARAMS, max_workers = None):
+    os.makedirs(cache_directory, exist_ok = True)
+    features = {}
+    with ProcessPoolExecutor(max_workers = max_workers) as executor:
+        futures = [executor.submit(extract_file_features, audio_file, cache_directory, params) for audio_file in audio_files]
+        for future in futures:
+            audio_file, paths, cached = future.result()
+            # Memory-map the arrays so only the frames that are actually used get read from disk
+            features[audio_file] = {name: np.load(path, mmap_mode = 'r') for name, path in paths.items()}
+            print(f"{'Loaded cached' if cached else 'Computed'} features for {os.path.basename(audio_file)}: "
+                  f"{features[audio_file]['log_mel'].shape[0]} frames")
+    return features
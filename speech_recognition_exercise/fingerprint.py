@@ -0,0 +1,172 @@
+import os
+import shutil
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import soundfile as sf
+from scipy.ndimage import maximum_filter
+from scipy.signal import resample_poly
+from speech_recognition_exercise.features import frame_signal
+from speech_recognition_exercise.normalization import resampling_factors
+from speech_recognition_exercise.transcripts import records_file
+
+# Acoustic fingerprints for finding recordings that were already transcribed: _mono.wav variants,
+# WAVs converted from MP3s, re-exports, or excerpts of a longer recording. Every file is downmixed
+# and resampled to 8 kHz, so format, channel count and sample rate do not matter. The strongest
+# local peaks of its spectrogram are paired up, and each pair (both frequencies and the time between
+# them) is hashed into one integer. Two recordings of the same audio share many hashes at a constant
+# time offset, even when one of them is only part of the other.
+# Only duplicates reuse a transcript; excerpts are reported but transcribed like any other file.
+
+FINGERPRINT_PARAMS = {
+    "sample_rate": 8000,
+    "n_fft": 512,
+    "hop_length": 128, # 16 ms
+    "neighborhood": (15, 15), # (frequency bins, frames) a peak has to be the maximum of
+    "peaks_per_second": 30, # Only the strongest peaks are kept
+    "fan_out": 5, # Each peak is paired with this many following peaks
+    "max_delta": 63, # Largest time between paired peaks in frames (6 bits)
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    file_id INTEGER PRIMARY KEY,
+    audio_file TEXT UNIQUE NOT NULL,
+    num_hashes INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS hashes (
+    hash INTEGER NOT NULL,
+    file_id INTEGER NOT NULL,
+    offset INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS hashes_hash ON hashes (hash);
+"""
+
+def load_fingerprint_audio(audio_file, sample_rate):
+    signal, file_sample_rate = sf.read(audio_file, dtype = 'float32', always_2d = True)
+    signal = signal.mean(axis = 1)
+    up, down = resampling_factors(file_sample_rate, sample_rate)
+    return resample_poly(signal, up, down) if up != down else signal
+
+def spectral_peaks(signal, params = FINGERPRINT_PARAMS):
+    # (frame, frequency bin) of the strongest local maxima of the log spectrogram, sorted by time
+    frames = frame_signal(signal, params["n_fft"], params["hop_length"]) * np.hanning(params["n_fft"])
+    spectrogram = np.log(np.abs(np.fft.rfft(frames)).T + 1e-6) # (frequency bins, frames)
+    is_peak = (spectrogram == maximum_filter(spectrogram, size = params["neighborhood"])) & (spectrogram > spectrogram.mean())
+    frequencies, times = np.nonzero(is_peak)
+
+    max_peaks = int(params["peaks_per_second"] * len(signal) / params["sample_rate"]) + 1
+    if len(times) > max_peaks:
+        strongest = np.argpartition(-spectrogram[frequencies, times], max_peaks - 1)[:max_peaks]
+        frequencies, times = frequencies[strongest], times[strongest]
+    order = np.lexsort((frequencies, times))
+    return times[order], frequencies[order]
+
+def peak_hashes(times, frequencies, params = FINGERPRINT_PARAMS):
+    # Pair every peak with the next fan_out peaks: hash = anchor frequency | paired frequency | time between them
+    hashes, offsets = [], []
+    for k in range(1, params["fan_out"] + 1):
+        delta = times[k:] - times[:-k]
+        valid = (delta > 0) & (delta <= params["max_delta"])
+        hashes.append((frequencies[:-k][valid].astype(np.int64) << 15) | (frequencies[k:][valid].astype(np.int64) << 6) | delta[valid])
+        offsets.append(times[:-k][valid])
+    return np.concatenate(hashes), np.concatenate(offsets)
+
+def fingerprint_file(audio_file, params = FINGERPRINT_PARAMS):
+    # Runs in a worker process
+    times, frequencies = spectral_peaks(load_fingerprint_audio(audio_file, params["sample_rate"]), params)
+    hashes, offsets = peak_hashes(times, frequencies, params)
+    return audio_file, hashes, offsets
+
+class FingerprintIndex:
+    def __init__(self, database_file):
+        self.connection = sqlite3.connect(database_file, isolation_level = None)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.executescript(SCHEMA)
+
+    def add(self, audio_file, hashes, offsets):
+        # Re-adding a file replaces its fingerprint
+        audio_file = os.path.abspath(audio_file)
+        with self.connection:
+            self.connection.execute("BEGIN")
+            self.connection.execute("DELETE FROM hashes WHERE file_id IN (SELECT file_id FROM files WHERE audio_file = ?)", (audio_file,))
+            self.connection.execute("DELETE FROM files WHERE audio_file = ?", (audio_file,))
+            file_id = self.connection.execute("INSERT INTO files (audio_file, num_hashes) VALUES (?, ?)", (audio_file, len(hashes))).lastrowid
+            self.connection.executemany("INSERT INTO hashes (hash, file_id, offset) VALUES (?, ?, ?)",
+                                        zip(hashes.tolist(), [file_id] * len(hashes), offsets.tolist()))
+
+    def match(self, audio_file, hashes, offsets, min_matches = 20, min_fraction = 0.1):
+        # Files sharing enough hashes at a consistent time offset. The fraction is relative to the
+        # shorter of the two fingerprints, so excerpts match the recording they were cut from.
+        audio_file = os.path.abspath(audio_file)
+        with self.connection:
+            self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS query (hash INTEGER, offset INTEGER)")
+            self.connection.execute("DELETE FROM query")
+            self.connection.executemany("INSERT INTO query (hash, offset) VALUES (?, ?)", zip(hashes.tolist(), offsets.tolist()))
+            rows = self.connection.execute(
+                """SELECT files.audio_file, files.num_hashes, hashes.offset - query.offset, COUNT(*)
+                   FROM query JOIN hashes ON hashes.hash = query.hash JOIN files ON files.file_id = hashes.file_id
+                   WHERE files.audio_file != ? GROUP BY hashes.file_id, hashes.offset - query.offset""", (audio_file,)).fetchall()
+
+        # Histogram of time offsets per file; neighbouring offsets are pooled because resampling can shift a peak by a frame
+        histograms = {}
+        for other_file, num_hashes, offset, count in rows:
+            histograms.setdefault((other_file, num_hashes), {})[offset] = count
+        matches = []
+        for (other_file, num_hashes), histogram in histograms.items():
+            aligned = max(sum(histogram.get(offset + shift, 0) for shift in (-1, 0, 1)) for offset in histogram)
+            fraction = aligned / max(1, min(len(hashes), num_hashes))
+            if aligned >= min_matches and fraction >= min_fraction:
+                relation = "duplicate" if 0.8 <= len(hashes) / max(1, num_hashes) <= 1.25 else (
+                    "contained in" if len(hashes) < num_hashes else "contains")
+                matches.append({"audio_file": other_file, "relation": relation, "aligned_hashes": aligned, "score": fraction})
+        return sorted(matches, key = lambda match: -match["score"])
+
+    def close(self):
+        self.connection.close()
+
+def transcript_file(audio_file, text_folder):
+    return os.path.join(text_folder, os.path.splitext(os.path.basename(audio_file))[0] + ".txt")
+
+def copy_transcript(original_file, duplicate_file, text_folder):
+    # Reuse the original's transcript (and its structured records) for the duplicate; False if it has none yet
+    source = transcript_file(original_file, text_folder)
+    if not os.path.exists(source):
+        return False
+    target = transcript_file(duplicate_file, text_folder)
+    if source != target:
+        shutil.copyfile(source, target)
+        if os.path.exists(records_file(source)):
+            shutil.copyfile(records_file(source), records_file(target))
+    print(f"{os.path.basename(duplicate_file)} matches {os.path.basename(original_file)}. Reusing its transcript.")
+    return True
+
+def deduplicate_audio_files(audio_files, index, text_folder, max_workers = None):
+    # Splits audio_files into the ones that still need transcribing and {duplicate: original} for the acoustic duplicates.
+    # Duplicates of files that are only transcribed in this batch get their transcript from copy_transcripts().
+    to_transcribe, pending, scheduled = [], {}, set()
+    with ProcessPoolExecutor(max_workers = max_workers) as executor:
+        for audio_file, hashes, offsets in executor.map(fingerprint_file, audio_files):
+            matches = index.match(audio_file, hashes, offsets)
+            index.add(audio_file, hashes, offsets)
+            # Only a duplicate, which has a transcript or is about to get one, can stand in for this recording. A recording
+            # it is merely part of cannot: its transcript would cover audio this one does not contain.
+            match = next((match for match in matches if match["relation"] == "duplicate" and (
+                match["audio_file"] in scheduled or os.path.exists(transcript_file(match["audio_file"], text_folder)))), None)
+            if match is None:
+                for partial in matches:
+                    if partial["relation"] != "duplicate":
+                        print(f"{os.path.basename(audio_file)} {partial['relation']} {os.path.basename(partial['audio_file'])}. Transcribing it anyway.")
+                to_transcribe.append(audio_file)
+                scheduled.add(os.path.abspath(audio_file))
+                continue
+            print(f"{os.path.basename(audio_file)} is {match['relation']} {os.path.basename(match['audio_file'])} "
+                  f"({match['score']:.0%} of the fingerprint aligned)")
+            if not copy_transcript(match["audio_file"], audio_file, text_folder):
+                pending[audio_file] = match["audio_file"]
+    return to_transcribe, pending
+
+def copy_transcripts(pending, text_folder):
+    for duplicate_file, original_file in pending.items():
+        if not copy_transcript(original_file, duplicate_file, text_folder):
+            print(f"No transcript of {os.path.basename(original_file)} to reuse for {os.path.basename(duplicate_file)}")
@@ -0,0 +1,219 @@
+import os
+import time
+import socket
+import sqlite3
+from multiprocessing import Process
+from speech_recognition_exercise.pipeline import (probe_audio, upload_audio, submit_recognition, await_recognition,
+                                                  post_process, write_transcription)
+
+# A durable work queue for batch transcription. Every file is a row in a SQLite database (in WAL
+# mode, so readers never block the writer) that records how far it got: queued, uploaded (with its
+# GCS URI), submitted (with the name of its long-running operation), completed or failed. Workers in
+# any number of processes claim jobs inside an IMMEDIATE transaction, so no two of them ever work on
+# the same file. An interrupted batch picks up where it left off: completed files are skipped,
+# uploaded files are not uploaded again and submitted operations are resumed by name instead of
+# being paid for twice.
+
+QUEUED = "queued"
+UPLOADED = "uploaded"
+SUBMITTED = "submitted"
+COMPLETED = "completed"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    audio_file TEXT PRIMARY KEY,
+    state TEXT NOT NULL DEFAULT 'queued',
+    gcs_uri TEXT,
+    operation_name TEXT,
+    text_filename TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    claimed_at REAL,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state);
+"""
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def is_alive(worker):
+    # Only workers on this host can be checked; the ones on other hosts are left to the lease
+    hostname, pid = worker.rsplit(":", 1)
+    if hostname != socket.gethostname():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class JobQueue:
+    def __init__(self, database_file, lease_seconds = 3600.0):
+        self.database_file = database_file
+        self.lease_seconds = lease_seconds # Claims older than this are given to another worker
+        # Autocommit mode, so transactions are only the ones opened explicitly below
+        self.connection = sqlite3.connect(database_file, timeout = 60.0, isolation_level = None)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL") # Durable across crashes of the process, which is what matters here
+        self.connection.executescript(SCHEMA)
+
+    def enqueue(self, audio_files):
+        # Files that are already in the queue keep their state
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            cursor = self.connection.executemany("INSERT OR IGNORE INTO jobs (audio_file, updated_at) VALUES (?, ?)",
+                                                 [(os.path.abspath(audio_file), time.time()) for audio_file in audio_files])
+        return cursor.rowcount
+
+    def claim(self, worker, max_attempts = 3):
+        # Take the next unfinished job nobody else is working on; files furthest along go first
+        now = time.time()
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            # A job whose worker died (or whose lease ran out) counts as a failed attempt, so a file that
+            # crashes its worker process ends up failed instead of being claimed again forever
+            for row in self.connection.execute("SELECT audio_file, worker, claimed_at FROM jobs WHERE worker IS NOT NULL AND state NOT IN (?, ?)",
+                                               (COMPLETED, FAILED)).fetchall():
+                if not is_alive(row["worker"]) or row["claimed_at"] < now - self.lease_seconds:
+                    self.abandon(row["audio_file"], f"Worker {row['worker']} stopped working on it", max_attempts)
+            job = self.connection.execute(
+                """SELECT * FROM jobs WHERE state NOT IN (?, ?) AND attempts < ? AND worker IS NULL
+                   ORDER BY CASE state WHEN ? THEN 0 WHEN ? THEN 1 ELSE 2 END, audio_file LIMIT 1""",
+                (COMPLETED, FAILED, max_attempts, SUBMITTED, UPLOADED)).fetchone()
+            if job is None:
+                return None
+            self.connection.execute("UPDATE jobs SET worker = ?, claimed_at = ? WHERE audio_file = ?", (worker, now, job["audio_file"]))
+        return dict(job)
+
+    def update(self, audio_file, state, **fields):
+        fields = {"state": state, "updated_at": time.time(), **fields}
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self.connection.execute(f"UPDATE jobs SET {assignments} WHERE audio_file = ?", (*fields.values(), audio_file))
+
+    def release(self, audio_file, error = None, max_attempts = 3):
+        # Give a job back after an error; it is retried until it has failed max_attempts times
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.abandon(audio_file, error, max_attempts)
+
+    def abandon(self, audio_file, error, max_attempts):
+        # Inside a transaction
+        self.connection.execute("UPDATE jobs SET worker = NULL, attempts = attempts + 1, error = ?, updated_at = ? WHERE audio_file = ?",
+                                (error, time.time(), audio_file))
+        self.connection.execute("UPDATE jobs SET state = ? WHERE audio_file = ? AND attempts >= ?", (FAILED, audio_file, max_attempts))
+
+    def unclaim(self, audio_file):
+        # Give a job back as it is, without counting an attempt
+        self.connection.execute("UPDATE jobs SET worker = NULL, updated_at = ? WHERE audio_file = ?", (time.time(), audio_file))
+
+    def retry_failed(self):
+        # Failed jobs get max_attempts new attempts and carry on from the last step they got through: a submitted
+        # operation is resumed (and submitted again if it has expired), an uploaded file is not uploaded again
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            cursor = self.connection.execute(
+                """UPDATE jobs SET state = CASE WHEN operation_name IS NOT NULL THEN ? WHEN gcs_uri IS NOT NULL THEN ? ELSE ? END,
+                   attempts = 0, error = NULL, worker = NULL, updated_at = ? WHERE state = ?""",
+                (SUBMITTED, UPLOADED, QUEUED, time.time(), FAILED))
+        return cursor.rowcount
+
+    def uploaded_objects(self):
+        # GCS URIs of every file a worker uploaded, so the parent process can add them to the upload manifest
+        return [row[0] for row in self.connection.execute("SELECT gcs_uri FROM jobs WHERE gcs_uri IS NOT NULL").fetchall()]
+
+    def counts(self):
+        return dict(self.connection.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+
+    def close(self):
+        self.connection.close()
+
+def process_job(queue, job, storage_client, speech_client, resume_operation, gcs_bucket, gcs_folder, text_folder, manifest,
+                enable_diarization = True, min_num_speaker = 1, max_num_speaker = 2, convert_numeric_to_text = True):
+    # Runs the pipeline's stage functions from wherever the job left off, checkpointing after every paid-for step
+    audio_file = job["audio_file"]
+    item = {"local_file": audio_file, "gcs_uri": job["gcs_uri"]}
+    operation_name = job["operation_name"]
+
+    if job["state"] == SUBMITTED:
+        try:
+            item["operation"] = resume_operation(operation_name)
+            print(f"Resumed recognition of {os.path.basename(audio_file)} ({operation_name})")
+        except Exception as e:
+            # Operations are only kept for a limited time; an expired one has to be submitted again
+            if type(e).__name__ != "NotFound":
+                raise
+            print(f"Operation {operation_name} no longer exists, submitting {os.path.basename(audio_file)} again")
+            queue.update(audio_file, UPLOADED, operation_name = None)
+            job["state"] = UPLOADED
+
+    if job["state"] in (QUEUED, UPLOADED):
+        probe_audio(item)
+        if job["state"] == QUEUED:
+            upload_audio(item, storage_client, gcs_bucket, gcs_folder, manifest)
+            queue.update(audio_file, UPLOADED, gcs_uri = item["gcs_uri"])
+        submit_recognition(item, speech_client, enable_diarization, min_num_speaker, max_num_speaker)
+        operation_name = item["operation"].operation.name
+        queue.update(audio_file, SUBMITTED, operation_name = operation_name)
+
+    await_recognition(item)
+    post_process(item, convert_numeric_to_text, enable_diarization)
+    write_transcription(item, text_folder, with_speaker_labels = enable_diarization)
+    queue.update(audio_file, COMPLETED, text_filename = item["text_filename"], worker = None, error = None)
+    print(f"Transcription saved for {os.path.basename(audio_file)}")
+
+def run_worker(database_file, storage_client, speech_client, gcs_bucket, gcs_folder, text_folder, manifest,
+               resume_operation = None, max_attempts = 3, **options):
+    # Claims and processes jobs until none are left
+    # The local stand-in client resumes its own operations; the real one goes through its operations client
+    from speech_recognition_exercise.cloud import resume_recognition
+    resume_operation = (resume_operation or getattr(speech_client, "resume_operation", None)
+                        or (lambda operation_name: resume_recognition(operation_name, speech_client)))
+    queue = JobQueue(database_file)
+    worker = worker_id()
+    try:
+        while True:
+            job = queue.claim(worker, max_attempts)
+            if job is None:
+                return
+            try:
+                process_job(queue, job, storage_client, speech_client, resume_operation, gcs_bucket, gcs_folder,
+                            text_folder, manifest, **options)
+            except (KeyboardInterrupt, SystemExit):
+                # Interrupted, not failed: the next run resumes the job from its last checkpoint
+                queue.unclaim(job["audio_file"])
+                raise
+            except Exception as e:
+                print(f"Transcription failed for {os.path.basename(job['audio_file'])}: {e}")
+                queue.release(job["audio_file"], f"{type(e).__name__}: {e}", max_attempts)
+    finally:
+        queue.close()
+
+def run_cloud_worker(database_file, gcs_bucket, gcs_folder, text_folder, manifest, **options):
+    # Entry point of a worker process; every process creates its own clients and database connection
+    from google.cloud import storage, speech
+    run_worker(database_file, storage.Client(), speech.SpeechClient(), gcs_bucket, gcs_folder, text_folder, manifest, **options)
+
+def record_uploads(database_file, manifest):
+    # Every worker process uploads with its own copy of the manifest; the uploads are merged back from the job
+    # table, where the objects are named by content hash, just as in cloud.reconcile_upload_manifest
+    queue = JobQueue(database_file)
+    try:
+        for gcs_uri in queue.uploaded_objects():
+            manifest[os.path.splitext(os.path.basename(gcs_uri))[0]] = gcs_uri
+    finally:
+        queue.close()
+    return manifest
+
+def run_worker_processes(database_file, num_processes, gcs_bucket, gcs_folder, text_folder, manifest, **options):
+    processes = [Process(target = run_cloud_worker, args = (database_file, gcs_bucket, gcs_folder, text_folder, manifest), kwargs = options)
+                 for _ in range(num_processes)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
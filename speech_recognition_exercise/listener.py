@@ -0,0 +1,90 @@
+import time
+import queue
+import threading
+from datetime import datetime
+import speech_recognition as sr
+
+# A long-running listener that keeps one calibrated Recognizer and one open microphone stream.
+# The listening thread only segments the audio into utterances and puts them on a queue; a pool
+# of worker threads recognizes them, so listening never pauses while earlier phrases are being
+# recognized and no utterance pays for opening the device or recalibrating.
+
+class ListeningService:
+    def __init__(self, engine = "google", workers = 4, device_index = None, sample_rate = 16000,
+                 calibration_seconds = 1.0, phrase_time_limit = None, on_result = None):
+        self.recognizer = sr.Recognizer()
+        self.microphone = sr.Microphone(device_index = device_index, sample_rate = sample_rate)
+        self.recognize = getattr(self.recognizer, f"recognize_{engine}") # e.g. recognize_google or recognize_sphinx
+        self.workers = workers
+        self.calibration_seconds = calibration_seconds
+        self.phrase_time_limit = phrase_time_limit
+        self.on_result = on_result or print_result
+        self.utterances = queue.Queue() # Unbounded, so the listening thread never waits on recognition
+        self.stop_event = threading.Event()
+        self.threads = []
+
+    def start(self):
+        # Open the stream once and calibrate the energy threshold to the room's ambient noise
+        self.source = self.microphone.__enter__()
+        print(f"Calibrating for ambient noise ({self.calibration_seconds:.1f} seconds)...")
+        self.recognizer.adjust_for_ambient_noise(self.source, duration = self.calibration_seconds)
+        print(f"Energy threshold set to {self.recognizer.energy_threshold:.0f}. Listening...")
+
+        self.threads = [threading.Thread(target = self.recognize_utterances, daemon = True) for _ in range(self.workers)]
+        self.threads.append(threading.Thread(target = self.listen_loop, daemon = True))
+        for thread in self.threads:
+            thread.start()
+
+    def listen_loop(self):
+        while not self.stop_event.is_set():
+            try:
+                # Wake up every second to check whether we were asked to stop
+                audio = self.recognizer.listen(self.source, timeout = 1, phrase_time_limit = self.phrase_time_limit)
+            except sr.WaitTimeoutError:
+                continue
+            # Approximate wall-clock time at which the utterance started
+            duration = len(audio.frame_data) / (audio.sample_rate * audio.sample_width)
+            self.utterances.put((time.time() - duration, audio))
+
+    def recognize_utterances(self):
+        while True:
+            item = self.utterances.get()
+            if item is None:
+                return
+            started_at, audio = item
+            try:
+                text = self.recognize(audio)
+            except sr.UnknownValueError:
+                continue
+            except sr.RequestError as e:
+                print(f"Could not request results from speech recognition service: {e}")
+                continue
+            self.on_result(started_at, text)
+
+    def stop(self):
+        self.stop_event.set()
+        self.threads[-1].join() # The listening thread
+
+        # Let the workers finish the utterances that are still queued
+        for _ in range(self.workers):
+            self.utterances.put(None)
+        for thread in self.threads[:-1]:
+            thread.join()
+        self.microphone.__exit__(None, None, None)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+def print_result(started_at, text):
+    print(f"[{datetime.fromtimestamp(started_at).strftime('%H:%M:%S')}] {text}")
+
+def run_listener(**kwargs):
+    with ListeningService(**kwargs):
+        try:
+            input("Press Enter to stop listening...\n")
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,160 @@
+import os
+import io
+import csv
+import time
+import asyncio
+import tempfile
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import soundfile as sf
+from speech_recognition_exercise.audio_files import list_audio_files, measure_duration, measure_sample_rate
+from speech_recognition_exercise.cloud import upload_audio_to_gcs, transcribe_audio, get_audio_encoding, save_transcription
+from speech_recognition_exercise.pipeline import run_transcription_pipeline
+from speech_recognition_exercise.local_clients import LocalStorageClient, LocalSpeechClient, QuotaLimitedBackend
+
+# Load testing of the transcription path against the local stand-in clients. A corpus of recordings
+# (or synthetic audio) is replayed at increasing concurrency, either as independent streams that each
+# upload and transcribe one file at a time, or as batches through the asyncio pipeline. The stand-ins
+# simulate latency, transient errors and quota responses, and every level reports throughput, latency
+# percentiles and error rates, so the point where throughput stops growing can be found.
+
+def synthetic_recordings(output_folder, count = 8, duration = 10.0, sample_rate = 16000, seed = 0):
+    # Speech-like test signals: noise bursts shaped by a slow envelope, with a different length per file
+    os.makedirs(output_folder, exist_ok = True)
+    rng = np.random.default_rng(seed)
+    audio_files = []
+    for i in range(count):
+        num_samples = int(sample_rate * duration * rng.uniform(0.5, 1.5))
+        t = np.arange(num_samples) / sample_rate
+        envelope = np.clip(np.sin(2 * np.pi * rng.uniform(0.5, 2.0) * t), 0, None)
+        signal = 0.3 * envelope * rng.standard_normal(num_samples)
+        audio_file = os.path.join(output_folder, f"synthetic_{i:03d}.wav")
+        sf.write(audio_file, signal, sample_rate, subtype = "PCM_16")
+        audio_files.append(audio_file)
+    return audio_files
+
+def replay_list(audio_files, num_requests):
+    # Cycle through the corpus until there are enough requests
+    return [audio_files[i % len(audio_files)] for i in range(num_requests)]
+
+def unique_requests(audio_files, num_requests, output_folder):
+    # Every request gets its own copy of a corpus file with the request number written into its first two samples.
+    # Uploads are deduplicated by content hash, so without this a replayed file would only be uploaded once.
+    os.makedirs(output_folder, exist_ok = True)
+    requests = []
+    for i, audio_file in enumerate(replay_list(audio_files, num_requests)):
+        info = sf.info(audio_file)
+        signal, sample_rate = sf.read(audio_file, dtype = 'int16', always_2d = True)
+        signal[:2, 0] = (i & 0x7fff, i >> 15)
+        request_file = os.path.join(output_folder, f"request_{i:06d}_{os.path.basename(audio_file)}")
+        sf.write(request_file, signal, sample_rate, format = info.format, subtype = info.subtype)
+        requests.append(request_file)
+    return requests
+
+def run_streams(audio_files, concurrency, storage_client, speech_client, text_folder, gcs_bucket = "loadtest", gcs_folder = "audio_files"):
+    # Each stream runs the same upload -> recognize -> save steps as `transcribe --engine cloud`
+    manifest = {}
+
+    def transcribe_file(audio_file):
+        start_time = time.perf_counter()
+        gcs_uri = upload_audio_to_gcs(audio_file, gcs_bucket, gcs_folder, manifest, client = storage_client)
+        transcriptions = transcribe_audio(gcs_uri, sample_rate = measure_sample_rate(audio_file),
+                                          encoding = get_audio_encoding(audio_file), client = speech_client)
+        save_transcription(transcriptions, os.path.join(text_folder, os.path.splitext(os.path.basename(audio_file))[0] + ".txt"))
+        return time.perf_counter() - start_time
+
+    latencies, errors = [], []
+    with ThreadPoolExecutor(max_workers = concurrency) as executor:
+        futures = [executor.submit(transcribe_file, audio_file) for audio_file in audio_files]
+        for future in futures:
+            try:
+                latencies.append(future.result())
+            except Exception as e:
+                errors.append(type(e).__name__)
+    return latencies, errors
+
+def run_batch(audio_files, concurrency, storage_client, speech_client, text_folder, gcs_bucket = "loadtest", gcs_folder = "audio_files"):
+    # The asyncio pipeline with its I/O-bound stages widened to the concurrency level
+    stage_concurrency = {"probe": max(2, concurrency // 4), "upload": concurrency, "submit": concurrency, "await": concurrency}
+    completed = asyncio.run(run_transcription_pipeline(audio_files, storage_client, speech_client, gcs_bucket, gcs_folder,
+                                                       text_folder, {}, concurrency = stage_concurrency,
+                                                       queue_size = max(4, concurrency)))
+    # The pipeline reports failures per file and drops them, so every missing file counts as an error
+    return [item["latency"] for item in completed], ["Dropped"] * (len(audio_files) - len(completed))
+
+def summarize(mode, concurrency, latencies, errors, elapsed, audio_seconds, quota_rejections):
+    num_requests = len(latencies) + len(errors)
+    percentiles = np.percentile(latencies, [50, 95, 99]) if latencies else [float("nan")] * 3
+    return {
+        "Mode": mode,
+        "Concurrency": concurrency,
+        "Requests": num_requests,
+        "Succeeded": len(latencies),
+        "Errors": len(errors),
+        "Error Rate": len(errors) / num_requests if num_requests else 0.0,
+        "Quota Rejections": quota_rejections,
+        "Throughput (files/sec)": len(latencies) / elapsed,
+        "Throughput (audio sec/sec)": audio_seconds / elapsed,
+        "p50 Latency": percentiles[0],
+        "p95 Latency": percentiles[1],
+        "p99 Latency": percentiles[2],
+    }
+
+def run_load_test(audio_files, concurrency_levels = (1, 2, 4, 8, 16), mode = "streams", num_requests = None,
+                  upload_latency = 0.05, recognize_latency = 1.0, jitter = 0.5, error_rate = 0.0,
+                  requests_per_minute = None, audio_seconds_per_minute = None, output_file = None):
+    run = run_streams if mode == "streams" else run_batch
+    results = []
+    for concurrency in concurrency_levels:
+        with tempfile.TemporaryDirectory() as work_directory:
+            requests = unique_requests(audio_files, num_requests or max(len(audio_files), 4 * concurrency),
+                                       os.path.join(work_directory, "requests"))
+            audio_seconds = sum(measure_duration(request_file) for request_file in requests)
+            storage_root = os.path.join(work_directory, "gcs")
+            text_folder = os.path.join(work_directory, "transcriptions")
+            os.makedirs(text_folder)
+
+            # New stand-ins per level, so quota windows and counters start from scratch
+            quota = None
+            if requests_per_minute or audio_seconds_per_minute:
+                quota = QuotaLimitedBackend(requests_per_minute or float("inf"), audio_seconds_per_minute or float("inf"))
+            storage_client = LocalStorageClient(storage_root, latency = upload_latency, jitter = jitter * upload_latency,
+                                                error_rate = error_rate)
+            speech_client = LocalSpeechClient(latency = recognize_latency, jitter = jitter * recognize_latency,
+                                              error_rate = error_rate, quota = quota, storage_root = storage_root)
+
+            # The transcription path prints progress for every file, which would drown out the report
+            start_time = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                latencies, errors = run(requests, concurrency, storage_client, speech_client, text_folder)
+            elapsed = time.perf_counter() - start_time
+
+        audio_seconds *= len(latencies) / len(requests)
+        result = summarize(mode, concurrency, latencies, errors, elapsed, audio_seconds, quota.rejected if quota else 0)
+        results.append(result)
+        print(f"concurrency {concurrency:4d}: {result['Throughput (files/sec)']:7.2f} files/sec, "
+              f"p50/p95/p99 {result['p50 Latency']:.2f}/{result['p95 Latency']:.2f}/{result['p99 Latency']:.2f} sec, "
+              f"{result['Error Rate']:.1%} errors ({result['Quota Rejections']} quota rejections)")
+
+    saturation = find_saturation(results)
+    if saturation is not None:
+        print(f"Throughput stops scaling beyond concurrency {saturation}")
+
+    if output_file:
+        with open(output_file, "w", newline = "") as f:
+            writer = csv.DictWriter(f, fieldnames = list(results[0]))
+            writer.writeheader()
+            writer.writerows(results)
+        print(f"Results saved as: {output_file}")
+    return results
+
+def find_saturation(results, min_gain = 0.1):
+    # The first concurrency level after which throughput grows by less than min_gain (10%)
+    for previous, current in zip(results, results[1:]):
+        if current["Throughput (files/sec)"] < previous["Throughput (files/sec)"] * (1 + min_gain):
+            return previous["Concurrency"]
+    return None
+
+def corpus_files(directory):
+    return [os.path.join(directory, audio_file) for audio_file in list_audio_files(directory)]
@@ -0,0 +1,114 @@
+import os
+import time
+import random
+import itertools
+import shutil
+import threading
+from datetime import timedelta
+from types import SimpleNamespace
+from collections import deque
+from google.api_core.exceptions import NotFound, PreconditionFailed, ResourceExhausted, ServiceUnavailable
+
+# Local stand-ins for storage.Client() and speech.SpeechClient(), so that code taking a client as an
+# argument can be run without credentials or network access. Latency (with optional random jitter),
+# transient errors and quota responses can be configured to simulate a loaded backend.
+
+def simulate_request(latency, jitter, error_rate, service):
+    time.sleep(latency + random.uniform(0.0, jitter))
+    if error_rate and random.random() < error_rate:
+        raise ServiceUnavailable(f"Simulated {service} error")
+
+class LocalStorageClient:
+    # Stand-in for storage.Client() that copies "uploads" into a local directory
+    def __init__(self, root_directory, latency = 0.0, jitter = 0.0, error_rate = 0.0):
+        self.root_directory = root_directory
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+    def bucket(self, gcs_bucket):
+        return SimpleNamespace(blob = lambda gcs_filename: LocalBlob(os.path.join(self.root_directory, gcs_bucket, gcs_filename), self))
+
+    def list_blobs(self, gcs_bucket, prefix = ""):
+        bucket_directory = os.path.join(self.root_directory, gcs_bucket)
+        for directory, _, files in os.walk(bucket_directory):
+            for file in files:
+                name = os.path.relpath(os.path.join(directory, file), bucket_directory).replace(os.sep, "/")
+                if name.startswith(prefix):
+                    yield SimpleNamespace(name = name)
+
+class LocalBlob:
+    def __init__(self, path, client):
+        self.path = path
+        self.client = client
+
+    def upload_from_filename(self, local_file, if_generation_match = None):
+        simulate_request(self.client.latency, self.client.jitter, self.client.error_rate, "storage")
+        if if_generation_match == 0 and os.path.exists(self.path):
+            raise PreconditionFailed(f"{self.path} already exists")
+        os.makedirs(os.path.dirname(self.path), exist_ok = True)
+        shutil.copyfile(local_file, self.path)
+
+class LocalSpeechClient:
+    # Stand-in for speech.SpeechClient() whose operations finish after a delay with a placeholder transcript.
+    # With a quota backend, requests are charged against its limits; the audio length is then read from the
+    # uploaded file when storage_root (the LocalStorageClient's root directory) is given.
+    def __init__(self, latency = 1.0, jitter = 0.0, error_rate = 0.0, submit_latency = 0.0, quota = None, storage_root = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.submit_latency = submit_latency
+        self.quota = quota
+        self.storage_root = storage_root
+        self.operations = {} # Operations by name, so they can be resumed like the real ones
+        self.operation_ids = itertools.count() # Unlike len(self.operations), unique when requests are made from several threads
+
+    def audio_seconds(self, gcs_uri):
+        if self.storage_root is None or not gcs_uri.startswith("gs://"):
+            return 0.0
+        from speech_recognition_exercise.audio_files import measure_duration
+        return measure_duration(os.path.join(self.storage_root, gcs_uri[len("gs://"):]))
+
+    def long_running_recognize(self, config, audio):
+        simulate_request(self.submit_latency, 0.0, self.error_rate, "speech")
+        if self.quota is not None:
+            self.quota.recognize(self.audio_seconds(audio.uri))
+        words = [SimpleNamespace(word = word, speaker_tag = 1, start_time = timedelta(seconds = 0.5 * i), end_time = timedelta(seconds = 0.5 * i + 0.4))
+                 for i, word in enumerate(f"transcript of {audio.uri}".split())]
+        response = SimpleNamespace(results = [SimpleNamespace(alternatives = [SimpleNamespace(words = words, confidence = 0.9)])])
+        finish_time = time.time() + self.latency + random.uniform(0.0, self.jitter)
+        name = f"local-{os.getpid()}-{next(self.operation_ids)}"
+        self.operations[name] = SimpleNamespace(operation = SimpleNamespace(name = name),
+                                                result = lambda: time.sleep(max(0.0, finish_time - time.time())) or response)
+        return self.operations[name]
+
+    def resume_operation(self, operation_name):
+        # Counterpart of cloud.resume_recognition; operations only live as long as this client
+        if operation_name not in self.operations:
+            raise NotFound(f"Operation {operation_name} not found")
+        return self.operations[operation_name]
+
+class QuotaLimitedBackend:
+    # Stand-in recognition backend that enforces requests-per-minute and audio-seconds-per-minute
+    # limits over a sliding window, raising ResourceExhausted like the real API does
+    def __init__(self, requests_per_minute, audio_seconds_per_minute, latency = 0.0, window_seconds = 60.0):
+        self.requests_per_minute = requests_per_minute
+        self.audio_seconds_per_minute = audio_seconds_per_minute
+        self.latency = latency
+        self.window_seconds = window_seconds
+        self.history = deque() # (time, audio seconds) of the accepted requests
+        self.lock = threading.Lock()
+        self.rejected = 0
+
+    def recognize(self, audio_seconds, result = None):
+        with self.lock:
+            now = time.monotonic()
+            while self.history and self.history[0][0] <= now - self.window_seconds:
+                self.history.popleft()
+            used_audio = sum(seconds for _, seconds in self.history)
+            if len(self.history) >= self.requests_per_minute or used_audio + audio_seconds > self.audio_seconds_per_minute:
+                self.rejected += 1
+                raise ResourceExhausted("Quota exceeded for recognition requests")
+            self.history.append((now, audio_seconds))
+        time.sleep(self.latency)
+        return result
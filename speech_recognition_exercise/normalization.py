@@ -0,0 +1,116 @@
+import os
+import math
+import tempfile
+from fractions import Fraction
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import soundfile as sf
+from scipy.signal import resample_poly
+
+# Pre-upload normalization. Speech models only need 16 kHz mono, so 44.1/48 kHz stereo recordings are
+# downmixed, resampled with a polyphase filter and peak-normalized before they are uploaded, which
+# cuts the bytes uploaded and billed per recording by 3-6x. Files are processed block by block, so
+# long recordings never have to fit in memory, and several files are normalized in parallel.
+
+TARGET_SAMPLE_RATE = 16000
+TARGET_PEAK_DB = -1.0 # Peak level after normalization, in dB relative to full scale
+MAX_GAIN_DB = 20.0 # Quiet recordings are amplified at most this much, so silence does not turn into loud noise
+
+def resampling_factors(sample_rate, target_sample_rate):
+    ratio = Fraction(target_sample_rate, sample_rate)
+    return ratio.numerator, ratio.denominator
+
+def read_downmixed(sound_file, start, stop):
+    sound_file.seek(start)
+    block = sound_file.read(stop - start, dtype = 'float32', always_2d = True)
+    return block.mean(axis = 1) if block.shape[1] > 1 else block[:, 0]
+
+def measure_peak(sound_file, block_frames):
+    peak = 0.0
+    for start in range(0, sound_file.frames, block_frames):
+        block = read_downmixed(sound_file, start, min(start + block_frames, sound_file.frames))
+        peak = max(peak, float(np.abs(block).max(initial = 0.0)))
+    return peak
+
+def iter_resampled_blocks(sound_file, up, down, block_frames):
+    # Every block starts on a multiple of `down` input samples, i.e. on a whole output sample, and is resampled together
+    # with enough context on both sides for the polyphase filter, so the blocks join up exactly as if the whole file
+    # had been resampled at once
+    pad = down * math.ceil(10 * max(up, down) / up / down + 1) # resample_poly's filter reaches 10 * max(up, down) / up input samples
+    block_frames = max(down, block_frames - block_frames % down)
+    for start in range(0, sound_file.frames, block_frames):
+        stop = min(start + block_frames, sound_file.frames)
+        context_start = max(0, start - pad)
+        segment = read_downmixed(sound_file, context_start, min(stop + pad, sound_file.frames))
+        if up == down:
+            resampled = segment
+        else:
+            resampled = resample_poly(segment, up, down)
+        offset = (start - context_start) * up // down
+        length = math.ceil(stop * up / down) - start * up // down
+        yield resampled[offset:offset + length]
+
+def normalize_audio_file(audio_file, output_file, target_sample_rate = TARGET_SAMPLE_RATE, block_seconds = 30.0):
+    # Runs in a worker process; skips files whose normalized version is newer than the source
+    if os.path.exists(output_file) and os.path.getmtime(output_file) >= os.path.getmtime(audio_file):
+        return audio_file, output_file, None
+
+    with sf.SoundFile(audio_file, "r") as sound_file:
+        up, down = resampling_factors(sound_file.samplerate, target_sample_rate)
+        block_frames = int(block_seconds * sound_file.samplerate)
+
+        # First pass: the peak of the downmixed signal; second pass: resample, apply the gain and write
+        peak = measure_peak(sound_file, block_frames)
+        gain = min(10 ** (TARGET_PEAK_DB / 20) / peak, 10 ** (MAX_GAIN_DB / 20)) if peak > 0 else 1.0
+
+        # Write to a temporary file first so an interrupted run never leaves a half-written file behind
+        fd, temp_file = tempfile.mkstemp(dir = os.path.dirname(output_file), suffix = ".tmp")
+        os.close(fd)
+        output_format = "FLAC" if output_file.endswith(".flac") else "WAV"
+        with sf.SoundFile(temp_file, "w", samplerate = target_sample_rate, channels = 1, subtype = "PCM_16", format = output_format) as output:
+            for block in iter_resampled_blocks(sound_file, up, down, block_frames):
+                output.write(np.clip(block * gain, -1.0, 1.0))
+        stats = {"sample_rate": sound_file.samplerate, "channels": sound_file.channels, "gain_db": 20 * math.log10(gain)}
+    os.replace(temp_file, output_file)
+    stats["input_bytes"] = os.path.getsize(audio_file)
+    stats["output_bytes"] = os.path.getsize(output_file)
+    return audio_file, output_file, stats
+
+def normalized_output_file(audio_file, output_folder, file_format):
+    return os.path.join(output_folder, os.path.splitext(os.path.basename(audio_file))[0] + f".{file_format}")
+
+def find_output_conflicts(audio_files, output_folder, file_format):
+    # Normalized files that several recordings would be written to, e.g. talk.wav and talk.flac -> talk.wav
+    sources = {}
+    for audio_file in audio_files:
+        sources.setdefault(normalized_output_file(audio_file, output_folder, file_format), []).append(audio_file)
+    return {output_file: files for output_file, files in sources.items() if len(files) > 1}
+
+def normalize_audio_files(audio_files, output_folder, target_sample_rate = TARGET_SAMPLE_RATE, file_format = "wav", max_workers = None):
+    # Returns the normalized files in the order of audio_files, keeping each file's base name
+    # Two recordings with the same output would overwrite each other, and the second would be transcribed as the first
+    conflicts = find_output_conflicts(audio_files, output_folder, file_format)
+    if conflicts:
+        raise ValueError("Several files would be normalized to the same output: " + "; ".join(
+            f"{', '.join(os.path.basename(audio_file) for audio_file in files)} -> {os.path.basename(output_file)}"
+            for output_file, files in conflicts.items()))
+    os.makedirs(output_folder, exist_ok = True)
+    output_files = [normalized_output_file(audio_file, output_folder, file_format) for audio_file in audio_files]
+    total_input_bytes = total_output_bytes = 0
+    with ProcessPoolExecutor(max_workers = max_workers) as executor:
+        futures = [executor.submit(normalize_audio_file, audio_file, output_file, target_sample_rate)
+                   for audio_file, output_file in zip(audio_files, output_files)]
+        for future in futures:
+            audio_file, output_file, stats = future.result()
+            if stats is None:
+                print(f"{os.path.basename(output_file)} is up to date. Skipping normalization.")
+                continue
+            total_input_bytes += stats["input_bytes"]
+            total_output_bytes += stats["output_bytes"]
+            print(f"Normalized {os.path.basename(audio_file)}: {stats['sample_rate']} Hz, {stats['channels']} channel(s) -> "
+                  f"{target_sample_rate} Hz mono, {stats['gain_db']:+.1f} dB, "
+                  f"{stats['input_bytes'] / 1e6:.1f} MB -> {stats['output_bytes'] / 1e6:.1f} MB")
+    if total_output_bytes:
+        print(f"Upload size reduced {total_input_bytes / total_output_bytes:.1f}x "
+              f"({total_input_bytes / 1e6:.1f} MB -> {total_output_bytes / 1e6:.1f} MB)")
+    return output_files
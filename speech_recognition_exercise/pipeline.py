@@ -0,0 +1,110 @@
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from google.cloud import speech
+from speech_recognition_exercise.audio_files import measure_sample_rate, hash_audio_pcm
+from speech_recognition_exercise.cloud import (get_audio_encoding, upload_audio_to_gcs, build_recognition_config,
+                                               extract_transcriptions, save_transcription)
+
+PIPELINE_DONE = object() # Placed on a queue once the previous stage has no more files to pass on
+
+def probe_audio(item):
+    # Read the header information and content hash the later stages need
+    item["sample_rate"] = measure_sample_rate(item["local_file"])
+    item["encoding"] = get_audio_encoding(item["local_file"])
+    item["audio_hash"] = hash_audio_pcm(item["local_file"])
+    return item
+
+def upload_audio(item, storage_client, gcs_bucket, gcs_folder, manifest):
+    item["gcs_uri"] = upload_audio_to_gcs(item["local_file"], gcs_bucket, gcs_folder, manifest,
+                                          client = storage_client, audio_hash = item["audio_hash"])
+    return item
+
+def submit_recognition(item, speech_client, enable_diarization = True, min_num_speaker = 1, max_num_speaker = 2):
+    # Start the long-running operation but do not wait for it, so this worker can submit the next file right away
+    audio = speech.RecognitionAudio(uri = item["gcs_uri"])
+    config = build_recognition_config(item["sample_rate"], item["encoding"], enable_diarization, min_num_speaker, max_num_speaker)
+    item["operation"] = speech_client.long_running_recognize(config = config, audio = audio)
+    return item
+
+def await_recognition(item):
+    item["response"] = item.pop("operation").result()
+    return item
+
+def post_process(item, convert_numeric_to_text = True, enable_diarization = True):
+    item["transcriptions"] = extract_transcriptions(item.pop("response"), convert_numeric_to_text, enable_diarization)
+    return item
+
+def write_transcription(item, text_folder, with_speaker_labels = True):
+    text_filename = os.path.join(text_folder, os.path.splitext(os.path.basename(item["local_file"]))[0] + ".txt")
+    save_transcription(item["transcriptions"], text_filename, with_speaker_labels = with_speaker_labels)
+    item["text_filename"] = text_filename
+    return item
+
+async def run_stage(name, stage_function, in_queue, out_queue, concurrency, executor):
+    # The executor has (at least) concurrency threads of its own, so the stages never compete for threads
+    loop = asyncio.get_running_loop()
+
+    async def worker():
+        while True:
+            item = await in_queue.get()
+            if item is PIPELINE_DONE:
+                await in_queue.put(PIPELINE_DONE) # Pass the signal on to the other workers of this stage
+                return
+            try:
+                # The client libraries are blocking, so each call runs in a thread while the event loop keeps the other stages going
+                item = await loop.run_in_executor(executor, stage_function, item)
+            except Exception as e:
+                print(f"{name} failed for {os.path.basename(item['local_file'])}: {e}")
+                continue
+            if out_queue is not None:
+                await out_queue.put(item)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    if out_queue is not None:
+        await out_queue.put(PIPELINE_DONE)
+
+async def run_transcription_pipeline(local_files, storage_client, speech_client, gcs_bucket, gcs_folder, text_folder, manifest,
+                                     concurrency = None, queue_size = 4, enable_diarization = True,
+                                     min_num_speaker = 1, max_num_speaker = 2, convert_numeric_to_text = True):
+    # Number of workers per stage; recognition gets the most since that is where files spend most of their time
+    concurrency = {"probe": 2, "upload": 4, "submit": 2, "await": 8, "post-process": 1, "write": 1, **(concurrency or {})}
+    completed = []
+
+    def record_completed(item):
+        item["latency"] = time.perf_counter() - item["queued_at"]
+        completed.append(item)
+        print(f"Transcription saved for {os.path.basename(item['local_file'])}")
+        return item
+
+    stages = [
+        ("probe", probe_audio),
+        ("upload", lambda item: upload_audio(item, storage_client, gcs_bucket, gcs_folder, manifest)),
+        ("submit", lambda item: submit_recognition(item, speech_client, enable_diarization, min_num_speaker, max_num_speaker)),
+        ("await", await_recognition),
+        ("post-process", lambda item: post_process(item, convert_numeric_to_text, enable_diarization)),
+        ("write", lambda item: record_completed(write_transcription(item, text_folder, with_speaker_labels = enable_diarization))),
+    ]
+
+    # One bounded queue in front of every stage, which is what provides the backpressure between them, and one
+    # thread pool per stage, since asyncio's shared default executor would cap every stage at a handful of threads
+    queues = [asyncio.Queue(maxsize = queue_size) for _ in stages]
+    executors = {name: ThreadPoolExecutor(max_workers = concurrency[name], thread_name_prefix = f"pipeline-{name}") for name, _ in stages}
+    tasks = [asyncio.ensure_future(run_stage(name, function, queues[i], queues[i + 1] if i + 1 < len(queues) else None,
+                                             concurrency[name], executors[name]))
+             for i, (name, function) in enumerate(stages)]
+
+    try:
+        for local_file in local_files:
+            await queues[0].put({"local_file": local_file, "queued_at": time.perf_counter()})
+        await queues[0].put(PIPELINE_DONE)
+        await asyncio.gather(*tasks)
+    finally:
+        # A file that fails in a stage is reported and dropped while the others carry on; the stages themselves
+        # are only cancelled when the run is (e.g. Ctrl+C), which must not leave them running in the background
+        for task in tasks:
+            task.cancel()
+        for executor in executors.values():
+            executor.shutdown(wait = False)
+    return completed
@@ -0,0 +1,13 @@
+import os
+
+def play_audio_file(directory, audio_file):
+    # For notebooks: returns a widget that plays the file in the browser
+    from IPython.display import Audio
+    audio_path = os.path.join(directory, audio_file)
+    return Audio(audio_path, autoplay = True, normalize = False)
+
+def play_audio_file_locally(audio_path):
+    # For the command line: plays the file on the default output device
+    from pydub import AudioSegment
+    from pydub.playback import play
+    play(AudioSegment.from_file(audio_path))
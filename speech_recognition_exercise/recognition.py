@@ -0,0 +1,86 @@
+import speech_recognition as sr
+import soundfile as sf
+from speech_recognition_exercise.audio_files import WavWindowReader
+
+def recognize_speech(audio_file = None):
+    r = sr.Recognizer()
+
+    # Load audio from a file or capture audio from a microphone
+    if audio_file is None:
+        with sr.Microphone() as source:
+            print("Speak something...")
+            audio = r.listen(source)
+            recording_duration = len(audio.frame_data) / float(audio.sample_rate * audio.sample_width)
+            print("Recording Duration: {:.2f} seconds".format(recording_duration))
+    else:
+        with sr.AudioFile(audio_file) as source:
+            audio = r.record(source)
+
+    try:
+        # Recognize speech using the default engine
+        text = r.recognize_google(audio)
+        print("Speech Recognition Result:", text)
+        return text
+    except sr.UnknownValueError:
+        print("Unable to recognize speech")
+    except sr.RequestError as e:
+        print("Error: {0}".format(e))
+
+def recognize_audio_data(audio, recognizer = None, on_start = None):
+    # Recognize audio that is already in memory, e.g. straight from a CaptureSession
+    r = recognizer or sr.Recognizer()
+    if on_start is not None:
+        on_start()
+    try:
+        return r.recognize_google(audio)
+    except sr.UnknownValueError:
+        print("Speech recognition could not understand audio")
+    except sr.RequestError as e:
+        print(f"Could not request results from speech recognition service: {e}")
+
+# The Web Speech API rejects long requests, and recording a whole multi-hour file would hold all of it in one AudioData,
+# so longer WAV files are recognized in windows read straight from the memory-mapped file
+MAX_REQUEST_SECONDS = 60
+
+def is_windowed(audio_file, max_seconds = MAX_REQUEST_SECONDS):
+    if not audio_file.lower().endswith(".wav"):
+        return False
+    info = sf.info(audio_file)
+    return info.duration > max_seconds and info.subtype in ("PCM_16", "PCM_32") # The formats WavWindowReader can map
+
+def iter_audio_windows(audio_file, window_seconds = 30):
+    with WavWindowReader(audio_file) as reader:
+        for start_seconds, window in reader.iter_windows(window_seconds):
+            # Only mono audio can be recognized, so multi-channel windows are downmixed first
+            if reader.channels > 1:
+                window = window.mean(axis = 1).astype(window.dtype)
+            # AudioData needs its own bytes, so this is the only copy made, and only of the current window
+            yield start_seconds, sr.AudioData(window.tobytes(), reader.sample_rate, reader.sample_width)
+
+def transcribe_audio_file(audio_file):
+    if is_windowed(audio_file):
+        texts = [text for _, text in transcribe_audio_windows(audio_file)]
+        return " ".join(texts) if texts else None
+
+    # Initialize the recognizer
+    r = sr.Recognizer()
+
+    # Load audio file
+    with sr.AudioFile(audio_file) as source:
+        # Read the audio data from the file
+        audio = r.record(source)
+
+    # Perform speech recognition
+    return recognize_audio_data(audio, r)
+
+def transcribe_audio_windows(audio_file, window_seconds = 30):
+    # Initialize the recognizer once and feed it one window at a time
+    r = sr.Recognizer()
+
+    for start_seconds, audio in iter_audio_windows(audio_file, window_seconds):
+        try:
+            yield start_seconds, r.recognize_google(audio)
+        except sr.UnknownValueError:
+            print(f"Speech recognition could not understand audio at {start_seconds:.0f} seconds")
+        except sr.RequestError as e:
+            print(f"Could not request results from speech recognition service: {e}")
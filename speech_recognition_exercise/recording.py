@@ -0,0 +1,302 @@
+import os
+import time
+import queue
+import threading
+import wave
+from datetime import datetime
+import numpy as np
+import pyaudio
+import soundfile as sf
+
+class CaptureSession:
+    def __init__(self, sample_rate, channels = 1, frames_per_buffer = 1024, input_device_index = None):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.frames_per_buffer = frames_per_buffer
+        self.input_device_index = input_device_index
+        self.bytes_per_frame = 2 * channels # 16-bit samples
+        self.frames = queue.Queue() # Recorded audio; None is put on it once the recording has stopped
+        self.started = threading.Event()
+        self.start_time = None # Stream clock time at which to start/stop keeping samples
+        self.stop_time = None
+        self.start_timestamp = None # Wall-clock time of the first recorded sample
+        self.frames_captured = 0
+        self.finished = False
+
+    def open(self):
+        # Initialize PyAudio and open the stream right away, so the device is already running by the time we start recording
+        self.audio = pyaudio.PyAudio()
+        self.stream = self.audio.open(format = pyaudio.paInt16,
+                                      channels = self.channels,
+                                      rate = self.sample_rate,
+                                      input = True,
+                                      input_device_index = self.input_device_index,
+                                      frames_per_buffer = self.frames_per_buffer,
+                                      stream_callback = self.callback) # PortAudio calls this with every buffer it captures
+        # Offset between the stream's sample clock and the wall clock, used to timestamp the recording
+        self.clock_offset = time.time() - self.stream.get_time()
+        self.input_latency = self.stream.get_input_latency()
+
+    def callback(self, in_data, frame_count, time_info, status):
+        if self.start_time is None or self.finished:
+            return (None, pyaudio.paContinue) # Still warming up (or already done), so the buffer is discarded
+
+        # Time at which the first sample of this buffer was captured by the sound card
+        adc_time = time_info.get("input_buffer_adc_time") or (time_info["current_time"] - self.input_latency)
+        buffer_end_time = adc_time + frame_count / self.sample_rate
+
+        # Keep only the samples captured between the start and stop times
+        first = max(0, min(frame_count, int(round((self.start_time - adc_time) * self.sample_rate))))
+        last = frame_count
+        if self.stop_time is not None:
+            last = max(first, min(frame_count, int(round((self.stop_time - adc_time) * self.sample_rate))))
+
+        if last > first:
+            if not self.started.is_set():
+                self.start_timestamp = adc_time + first / self.sample_rate + self.clock_offset
+                self.started.set()
+            self.frames.put(in_data[first * self.bytes_per_frame:last * self.bytes_per_frame])
+            self.frames_captured += last - first
+
+        if self.stop_time is not None and self.stop_time <= buffer_end_time:
+            self.finished = True
+            if not self.started.is_set():
+                self.start_timestamp = self.start_time + self.clock_offset
+                self.started.set()
+            self.frames.put(None)
+        return (None, pyaudio.paContinue)
+
+    def start(self, at = None):
+        # Ready signal: samples captured from this moment (or from the given wall-clock time) on are kept
+        self.start_time = self.stream.get_time() if at is None else at - self.clock_offset
+
+    def stop(self, at = None):
+        self.stop_time = self.stream.get_time() if at is None else at - self.clock_offset
+
+    @property
+    def duration(self):
+        # Based on the number of samples recorded rather than the wall clock
+        return self.frames_captured / self.sample_rate
+
+    def close(self):
+        self.stream.stop_stream()
+        self.stream.close()
+        self.audio.terminate()
+
+def save_audio_from_microphone(output_folder, sample_rate, file_format = "wav"):
+    run_interactive_session(CaptureSession(sample_rate), record_audio, output_folder, file_format)
+
+def run_interactive_session(session, worker, *args):
+    # Open and warm up the microphone before the countdown, so device initialization never cuts off the start of the speech
+    session.open()
+
+    print("Press Enter to start recording...")
+    input()
+
+    print("Recording will start in:")
+    for i in range(5, 0, -1):
+        print(i)
+        time.sleep(1)
+
+    session.start()
+    print()
+    print("Recording started. Speak now...")
+    print()
+
+    # Process the audio captured from the default microphone in a separate thread
+    recording_thread = threading.Thread(target = worker, args = (*args, session))
+    recording_thread.start()
+
+    # Stop the recording when the user presses Enter again
+    input("Press Enter again to stop recording...")
+    print()
+    session.stop()
+
+    # Wait for the recording thread to finish
+    recording_thread.join()
+    session.close()
+
+def encode_flac(file_path, sample_rate, frame_queue):
+    # Losslessly encode the audio frames to FLAC as they arrive from the recording loop
+    with sf.SoundFile(file_path, 'w', samplerate = sample_rate, channels = 1, format = 'FLAC', subtype = 'PCM_16') as flac_file:
+        while True:
+            data = frame_queue.get()
+            if data is None: # The recording loop puts None on the queue once it has stopped
+                break
+            flac_file.buffer_write(data, dtype = 'int16')
+
+def write_wav(file_path, sample_rate, frame_queue):
+    # Write the audio frames to a WAV file as they arrive; the header is completed when the file is closed
+    wf = wave.open(file_path, 'wb')
+    wf.setnchannels(1)
+    wf.setsampwidth(pyaudio.get_sample_size(pyaudio.paInt16))
+    wf.setframerate(sample_rate)
+    while True:
+        data = frame_queue.get()
+        if data is None:
+            break
+        wf.writeframes(data)
+    wf.close()
+
+def recording_file_path(output_folder, session, file_format):
+    # Wait for the first sample so the recording can be named after the moment it was actually captured
+    session.started.wait()
+    timestamp = datetime.fromtimestamp(session.start_timestamp).strftime("%Y-%m-%d_%H-%M-%S") # Note, we utilize current timestamp to name our recordings!!
+    return os.path.join(output_folder, f"recording_{timestamp}.{file_format}")
+
+def print_recording_summary(session, file_path):
+    print("Recording finished.")
+    print()
+    print(f"Audio saved as '{os.path.basename(file_path)}'.")
+    print(f"Started at {datetime.fromtimestamp(session.start_timestamp).isoformat(timespec = 'milliseconds')}, duration: {session.duration:.3f} seconds")
+
+def record_audio(output_folder, session, file_format = "wav"):
+    file_path = recording_file_path(output_folder, session, file_format)
+
+    # Encode the frames to FLAC, or write them to a WAV file, while the microphone keeps recording
+    if file_format == "flac":
+        encode_flac(file_path, session.sample_rate, session.frames)
+    else:
+        write_wav(file_path, session.sample_rate, session.frames)
+    print_recording_summary(session, file_path)
+
+def capture_audio_data(session, file_path, file_format = "wav"):
+    # Collect the session's buffers for recognition while a writer thread saves the very same buffers to disk.
+    # Returns the AudioData as soon as the recording stops, the writer thread, which may still be running, and the
+    # perf_counter() time at which the end of the recording arrived.
+    import speech_recognition as sr
+    disk_frames = queue.Queue()
+    writer = threading.Thread(target = encode_flac if file_format == "flac" else write_wav, args = (file_path, session.sample_rate, disk_frames))
+    writer.start()
+
+    frames = []
+    while True:
+        data = session.frames.get()
+        disk_frames.put(data) # The same bytes object, not a copy
+        if data is None:
+            stopped_at = time.perf_counter()
+            break
+        frames.append(data)
+
+    # Joining the buffers into the contiguous bytes AudioData needs is the only copy of the audio
+    return sr.AudioData(b''.join(frames), session.sample_rate, pyaudio.get_sample_size(pyaudio.paInt16)), writer, stopped_at
+
+def record_and_transcribe(output_folder, text_folder, sample_rate, file_format = "wav"):
+    # Record from the microphone and recognize the recording straight from memory, without reading it back from disk
+    run_interactive_session(CaptureSession(sample_rate), transcribe_session, output_folder, text_folder, file_format)
+
+def transcribe_session(output_folder, text_folder, file_format, session):
+    from speech_recognition_exercise.recognition import recognize_audio_data
+    file_path = recording_file_path(output_folder, session, file_format)
+    audio, writer, stopped_at = capture_audio_data(session, file_path, file_format)
+    transcription = recognize_audio_data(audio, on_start = lambda: print(
+        f"Recognition started {1000 * (time.perf_counter() - stopped_at):.1f} ms after the recording stopped"))
+    writer.join()
+    print_recording_summary(session, file_path)
+
+    if transcription is not None:
+        text_filename = os.path.join(text_folder, os.path.splitext(os.path.basename(file_path))[0] + ".txt")
+        with open(text_filename, "w") as f:
+            f.write(transcription)
+        print(f"Transcription saved as: {text_filename}")
+    return transcription
+
+def list_input_devices():
+    audio = pyaudio.PyAudio()
+    devices = []
+    for index in range(audio.get_device_count()):
+        info = audio.get_device_info_by_index(index)
+        if info["maxInputChannels"] > 0:
+            devices.append((index, info["name"], info["maxInputChannels"]))
+    audio.terminate()
+    return devices
+
+def read_session_frames(session):
+    # Yield the session's buffers as (num_frames, channels) arrays until the recording stops
+    while True:
+        data = session.frames.get()
+        if data is None:
+            return
+        yield np.frombuffer(data, dtype = np.int16).reshape(-1, session.channels)
+
+def write_channels(session, file_paths, file_format):
+    # One mono file per channel of this source
+    files = [sf.SoundFile(path, 'w', samplerate = session.sample_rate, channels = 1, format = file_format.upper(), subtype = 'PCM_16')
+             for path in file_paths]
+    for block in read_session_frames(session):
+        for channel, sound_file in enumerate(files):
+            sound_file.write(block[:, channel])
+    for sound_file in files:
+        sound_file.close()
+
+def write_interleaved(sessions, file_path, file_format):
+    # One file with the channels of every source side by side, written as soon as every source has delivered the samples
+    total_channels = sum(session.channels for session in sessions)
+    readers = [read_session_frames(session) for session in sessions]
+    pending = [np.zeros((0, session.channels), dtype = np.int16) for session in sessions]
+    finished = [False] * len(sessions)
+
+    with sf.SoundFile(file_path, 'w', samplerate = sessions[0].sample_rate, channels = total_channels,
+                      format = file_format.upper(), subtype = 'PCM_16') as sound_file:
+        while not all(finished):
+            for i, reader in enumerate(readers):
+                if not finished[i]:
+                    block = next(reader, None)
+                    if block is None:
+                        finished[i] = True
+                    else:
+                        pending[i] = np.concatenate([pending[i], block])
+            # Write the part that every source has already captured
+            ready = min(len(samples) for samples in pending)
+            if ready:
+                sound_file.write(np.hstack([samples[:ready] for samples in pending]))
+                pending = [samples[ready:] for samples in pending]
+
+        # Pad sources that stopped a few samples early so the file ends cleanly
+        longest = max(len(samples) for samples in pending)
+        if longest:
+            sound_file.write(np.hstack([np.pad(samples, ((0, longest - len(samples)), (0, 0))) for samples in pending]))
+
+def record_multichannel(output_folder, sources, sample_rate, output_mode = "per_channel", file_format = "wav"):
+    # sources is a list of (device index, number of channels) pairs
+    sessions = [CaptureSession(sample_rate, channels = channels, input_device_index = device_index)
+                for device_index, channels in sources]
+    for session in sessions:
+        session.open()
+
+    input("Press Enter to start recording...")
+
+    # A common start time slightly in the future, so every stream is already running when it is reached
+    start_timestamp = time.time() + 0.1
+    for session in sessions:
+        session.start(at = start_timestamp)
+
+    timestamp = datetime.fromtimestamp(start_timestamp).strftime("%Y-%m-%d_%H-%M-%S")
+    if output_mode == "per_channel":
+        writers = []
+        for session, (device_index, channels) in zip(sessions, sources):
+            file_paths = [os.path.join(output_folder, f"recording_{timestamp}_device{device_index}_ch{channel}.{file_format}")
+                          for channel in range(channels)]
+            writers.append(threading.Thread(target = write_channels, args = (session, file_paths, file_format)))
+    else:
+        file_path = os.path.join(output_folder, f"recording_{timestamp}_multichannel.{file_format}")
+        writers = [threading.Thread(target = write_interleaved, args = (sessions, file_path, file_format))]
+
+    for writer in writers:
+        writer.start()
+
+    print("Recording started. Speak now...")
+    input("Press Enter again to stop recording...")
+    print()
+
+    stop_timestamp = time.time()
+    for session in sessions:
+        session.stop(at = stop_timestamp)
+    for writer in writers:
+        writer.join()
+    for session in sessions:
+        session.close()
+
+    print("Recording finished.")
+    for session, (device_index, channels) in zip(sessions, sources):
+        print(f"Device {device_index}: {channels} channel(s), {session.duration:.3f} seconds")
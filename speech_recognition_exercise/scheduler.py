@@ -0,0 +1,177 @@
+import re
+import time
+import heapq
+import random
+import itertools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Quota-aware scheduling of recognition requests. Requests are admitted by two token buckets, one
+# for requests per minute and one for seconds of audio per minute, and are started in priority
+# order (shortest audio first within a priority class). The buckets only allow a small burst and
+# refill at the rate that leaves room for it, so no quota window ever sees more than the quota.
+# Quota errors from the backend still slow the scheduler down (exponential backoff, capped at the
+# window length, plus a lower admission rate), and the rate recovers within a few successful requests.
+
+INTERACTIVE = 0
+NORMAL = 1
+BACKFILL = 2
+
+WINDOW_SECONDS = 60.0 # The quotas are per minute
+BURST_FRACTION = 5.0 / 60.0 # A full bucket holds five seconds' worth of a minute's quota
+
+# Messages of quota errors from backends without a dedicated exception type. A bare "quota" would also match
+# unrelated errors, e.g. a TypeError that names a class called QuotaSomething.
+QUOTA_MESSAGE = re.compile(r"\b429\b|quota exceeded|exceeded .*quota|rate limit|resource[ _]exhausted", re.IGNORECASE)
+
+class TokenBucket:
+    def __init__(self, per_window, capacity = None, window_seconds = WINDOW_SECONDS):
+        burst_fraction = BURST_FRACTION if capacity is None else capacity / per_window
+        self.capacity = per_window * burst_fraction
+        # The burst plus what is refilled during one window add up to the quota, so any window holds at most per_window
+        self.base_rate = per_window * (1.0 - burst_fraction) / window_seconds
+        self.rate = self.base_rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount):
+        # Seconds until `amount` tokens are available; larger requests than the capacity wait for a full bucket
+        self.refill()
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+    def consume(self, amount):
+        # Requests larger than the capacity are charged in full and leave the bucket in debt, so they still count against the rate
+        self.refill()
+        self.tokens -= amount
+
+def is_quota_error(error):
+    # Matches google.api_core's ResourceExhausted/TooManyRequests and HTTP 429 errors from other backends without importing them
+    if type(error).__name__ in ("ResourceExhausted", "TooManyRequests"):
+        return True
+    if getattr(error, "code", None) == 429:
+        return True
+    return QUOTA_MESSAGE.search(str(error)) is not None
+
+class QuotaScheduler:
+    def __init__(self, requests_per_minute, audio_seconds_per_minute, max_workers = 8, max_retries = 8,
+                 initial_backoff = 1.0, max_backoff = WINDOW_SECONDS, window_seconds = WINDOW_SECONDS):
+        self.request_bucket = TokenBucket(requests_per_minute, window_seconds = window_seconds)
+        self.audio_bucket = TokenBucket(audio_seconds_per_minute, window_seconds = window_seconds)
+        self.executor = ThreadPoolExecutor(max_workers = max_workers)
+        self.in_flight = threading.Semaphore(max_workers)
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = min(max_backoff, window_seconds) # Once a whole window has passed, its quota is free again
+        self.backoff = 0.0
+        self.backoff_until = 0.0
+        self.rate_scale = 1.0
+        self.queue = []
+        self.pending = 0 # Submitted jobs whose future has not been resolved yet, including ones waiting to be retried
+        self.counter = itertools.count() # Keeps the heap order stable for jobs with equal priority and duration
+        self.condition = threading.Condition()
+        self.running = True
+        self.dispatcher = threading.Thread(target = self.dispatch, daemon = True)
+        self.dispatcher.start()
+
+    def submit(self, function, audio_seconds, *args, priority = NORMAL, **kwargs):
+        future = Future()
+        with self.condition:
+            heapq.heappush(self.queue, (priority, audio_seconds, next(self.counter), function, args, kwargs, future, 0))
+            self.pending += 1
+            self.condition.notify()
+        return future
+
+    def dispatch(self):
+        while True:
+            with self.condition:
+                while not self.queue and (self.running or self.pending):
+                    self.condition.wait()
+                if not self.queue:
+                    return
+                priority, audio_seconds = self.queue[0][:2]
+
+                # Wait until both buckets have enough tokens and any backoff period is over
+                wait_time = max(self.request_bucket.time_until(1), self.audio_bucket.time_until(audio_seconds),
+                                self.backoff_until - time.monotonic())
+                if wait_time > 0:
+                    self.condition.wait(wait_time)
+                    continue
+                self.request_bucket.consume(1)
+                self.audio_bucket.consume(audio_seconds)
+                job = heapq.heappop(self.queue)
+
+            self.in_flight.acquire()
+            self.executor.submit(self.run_job, job)
+
+    def run_job(self, job):
+        priority, audio_seconds, order, function, args, kwargs, future, attempts = job
+        try:
+            result = function(*args, **kwargs)
+        except Exception as e:
+            if is_quota_error(e) and attempts < self.max_retries:
+                self.on_quota_error()
+                with self.condition:
+                    heapq.heappush(self.queue, (priority, audio_seconds, order, function, args, kwargs, future, attempts + 1))
+                    self.condition.notify()
+            else:
+                self.resolve(future.set_exception, e)
+        else:
+            self.on_success()
+            self.resolve(future.set_result, result)
+        finally:
+            self.in_flight.release()
+
+    def resolve(self, set_outcome, outcome):
+        set_outcome(outcome)
+        with self.condition:
+            self.pending -= 1
+            self.condition.notify()
+
+    def on_quota_error(self):
+        with self.condition:
+            # Requests that were already in flight when we started backing off do not slow us down any further
+            if time.monotonic() < self.backoff_until:
+                return
+            # Back off exponentially (with jitter) and lower the admission rate by a quarter
+            self.backoff = min(self.max_backoff, self.backoff * 2 or self.initial_backoff)
+            self.backoff_until = time.monotonic() + self.backoff * random.uniform(0.5, 1.0)
+            self.set_rate_scale(max(0.25, self.rate_scale * 0.75))
+            print(f"Quota exceeded, backing off for {self.backoff:.1f} seconds at {self.rate_scale:.0%} of the configured rate")
+
+    def on_success(self):
+        with self.condition:
+            # Recover the admission rate within a few requests once they go through again
+            self.backoff = 0.0
+            self.set_rate_scale(min(1.0, self.rate_scale + 0.1))
+
+    def set_rate_scale(self, rate_scale):
+        self.rate_scale = rate_scale
+        for bucket in (self.request_bucket, self.audio_bucket):
+            bucket.refill()
+            bucket.rate = bucket.base_rate * rate_scale
+
+    def shutdown(self, wait = True):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if wait:
+            self.dispatcher.join()
+        self.executor.shutdown(wait = wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+def schedule_audio_files(scheduler, audio_files, function, priority = NORMAL):
+    # Probe each file's duration from its header, so short files are started first and charged to the audio bucket
+    from speech_recognition_exercise.audio_files import measure_duration
+    return {audio_file: scheduler.submit(function, measure_duration(audio_file), audio_file, priority = priority)
+            for audio_file in audio_files}
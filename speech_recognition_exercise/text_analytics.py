@@ -0,0 +1,168 @@
+import os
+import csv
+import time
+import zlib
+from array import array
+from collections import Counter
+import numpy as np
+from scipy import sparse
+from speech_recognition_exercise.tokenizer import tokenize, report_throughput
+from speech_recognition_exercise.transcripts import read_transcript_records
+
+# Sparse n-gram / TF-IDF analytics over whole transcript collections. Instead of one dictionary or
+# DataFrame of word counts per transcript, every (transcript, speaker) document becomes a row of a
+# single SciPy CSR document-term matrix with unigrams, bigrams and trigrams as columns. Columns
+# come either from a shared vocabulary or from hashing the n-grams into a fixed number of
+# buckets, which keeps memory bounded no matter how many distinct n-grams the corpus contains.
+
+def read_transcript_documents(transcriptions_folder):
+    # One document per speaker of each transcript; files without speaker labels become a single document
+    documents = []
+    for file_name in sorted(os.listdir(transcriptions_folder)):
+        if not file_name.endswith(".txt"):
+            continue
+        speaker_text = {}
+        for speaker, text in read_transcript_records(os.path.join(transcriptions_folder, file_name)):
+            speaker_text.setdefault(speaker, []).append(text)
+        transcription = os.path.splitext(file_name)[0]
+        for speaker, lines in speaker_text.items():
+            documents.append((transcription, speaker, " ".join(lines)))
+    return documents
+
+def ngrams(tokens, ngram_range = (1, 3)):
+    for n in range(ngram_range[0], ngram_range[1] + 1):
+        for i in range(len(tokens) - n + 1):
+            yield " ".join(tokens[i:i + n])
+
+class NgramVectorizer:
+    def __init__(self, ngram_range = (1, 3), n_features = None):
+        # With n_features, n-grams are hashed into that many columns; otherwise a shared vocabulary is built
+        self.ngram_range = ngram_range
+        self.n_features = n_features
+        self.vocabulary = {}
+        self.terms = [] # Vocabulary terms by column
+        self.bucket_terms = {} # For hashing: the first n-gram seen in each bucket, used to label the columns
+        self.num_tokens = 0 # Tokens and seconds spent in transform, for throughput reports
+        self.elapsed = 0.0
+
+    def column(self, term):
+        if self.n_features is None:
+            column = self.vocabulary.get(term)
+            if column is None:
+                column = self.vocabulary[term] = len(self.terms)
+                self.terms.append(term)
+            return column
+        bucket = zlib.crc32(term.encode()) % self.n_features # Stable across runs and processes, unlike hash()
+        self.bucket_terms.setdefault(bucket, term)
+        return bucket
+
+    def transform(self, texts):
+        # Build the CSR arrays directly, one document at a time
+        start_time = time.perf_counter()
+        indptr, indices, data = array("q", [0]), array("i"), array("i")
+        for text in texts:
+            tokens = tokenize(text)
+            self.num_tokens += len(tokens)
+            counts = Counter(self.column(term) for term in ngrams(tokens, self.ngram_range))
+            indices.extend(counts.keys())
+            data.extend(counts.values())
+            indptr.append(len(indices))
+        n_columns = self.n_features or len(self.vocabulary)
+        matrix = sparse.csr_matrix((np.frombuffer(data, dtype = np.int32), np.frombuffer(indices, dtype = np.int32),
+                                    np.frombuffer(indptr, dtype = np.int64)), shape = (len(indptr) - 1, n_columns))
+        matrix.sum_duplicates()
+        self.elapsed += time.perf_counter() - start_time
+        return matrix
+
+    def term(self, column):
+        if self.n_features is None:
+            return self.terms[column]
+        return self.bucket_terms.get(column, f"<bucket {column}>")
+
+def tfidf(counts, sublinear_tf = True):
+    # Smoothed inverse document frequency, as in scikit-learn, followed by L2 row normalization
+    n_documents = counts.shape[0]
+    document_frequency = np.bincount(counts.indices, minlength = counts.shape[1])
+    idf = np.log((1 + n_documents) / (1 + document_frequency)) + 1.0
+
+    weights = counts.astype(np.float64)
+    if sublinear_tf:
+        weights.data = 1.0 + np.log(weights.data)
+    weights = weights @ sparse.diags(idf)
+    return normalize_rows(weights.tocsr())
+
+def normalize_rows(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis = 1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.diags(1.0 / norms) @ matrix
+
+def top_terms(matrix, vectorizer, k = 10):
+    # Top-k columns of every row, looking only at the row's non-zero entries
+    results = []
+    for row in range(matrix.shape[0]):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        values, columns = matrix.data[start:end], matrix.indices[start:end]
+        count = min(k, len(values))
+        if count == 0:
+            results.append([])
+            continue
+        best = np.argpartition(-values, count - 1)[:count]
+        best = best[np.argsort(-values[best])]
+        results.append([(vectorizer.term(columns[i]), float(values[i])) for i in best])
+    return results
+
+def top_similar(matrix, k = 5, chunk_size = 1024):
+    # Cosine similarity of L2-normalized rows, computed a block of rows at a time so the full matrix is never materialized
+    results = []
+    for start in range(0, matrix.shape[0], chunk_size):
+        similarity = (matrix[start:start + chunk_size] @ matrix.T).toarray()
+        for offset, row in enumerate(similarity):
+            row[start + offset] = -1.0 # Exclude the document itself
+            count = min(k, len(row) - 1)
+            if count <= 0:
+                results.append([])
+                continue
+            best = np.argpartition(-row, count - 1)[:count]
+            best = best[np.argsort(-row[best])]
+            results.append([(int(i), float(row[i])) for i in best])
+    return results
+
+def group_rows(matrix, groups):
+    # Sum the rows that share a group label (e.g. all speakers of a transcript) with one sparse product
+    labels = sorted(set(groups))
+    index = {label: i for i, label in enumerate(labels)}
+    indicator = sparse.csr_matrix((np.ones(len(groups)), ([index[group] for group in groups], np.arange(len(groups)))),
+                                  shape = (len(labels), len(groups)))
+    return labels, (indicator @ matrix).tocsr()
+
+def tfidf_report(transcriptions_folder, output_directory, k = 10, n_features = None, ngram_range = (1, 3)):
+    documents = read_transcript_documents(transcriptions_folder)
+    vectorizer = NgramVectorizer(ngram_range, n_features)
+    speaker_counts = vectorizer.transform(text for _, _, text in documents)
+    report_throughput(vectorizer.num_tokens, vectorizer.elapsed, "Vectorized")
+    transcriptions, transcript_counts = group_rows(speaker_counts, [transcription for transcription, _, _ in documents])
+
+    transcript_tfidf = tfidf(transcript_counts)
+    speaker_tfidf = tfidf(speaker_counts)
+
+    with open(os.path.join(output_directory, "tfidf_top_terms_by_transcript.csv"), "w", newline = "") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Transcription", "Rank", "Term", "TF-IDF"])
+        for transcription, terms in zip(transcriptions, top_terms(transcript_tfidf, vectorizer, k)):
+            writer.writerows((transcription, rank + 1, term, f"{score:.4f}") for rank, (term, score) in enumerate(terms))
+
+    with open(os.path.join(output_directory, "tfidf_top_terms_by_speaker.csv"), "w", newline = "") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Transcription", "Speaker_Label", "Rank", "Term", "TF-IDF"])
+        for (transcription, speaker, _), terms in zip(documents, top_terms(speaker_tfidf, vectorizer, k)):
+            writer.writerows((transcription, speaker, rank + 1, term, f"{score:.4f}") for rank, (term, score) in enumerate(terms))
+
+    with open(os.path.join(output_directory, "transcript_similarity.csv"), "w", newline = "") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Transcription", "Similar Transcription", "Cosine Similarity"])
+        for transcription, similar in zip(transcriptions, top_similar(transcript_tfidf, k)):
+            writer.writerows((transcription, transcriptions[i], f"{score:.4f}") for i, score in similar)
+
+    print(f"{len(transcriptions)} transcripts, {len(documents)} speaker documents, {transcript_counts.shape[1]} n-gram columns, "
+          f"{transcript_counts.nnz} non-zero entries")
+    return transcript_tfidf, speaker_tfidf, vectorizer
@@ -0,0 +1,25 @@
+import re
+import time
+
+# The one tokenizer used by every analysis, so the same text always produces the same tokens.
+# A token is a run of Unicode letters/digits, optionally joined by apostrophes ("can't", "o'clock");
+# everything else (ASCII or Unicode punctuation, whitespace, underscores) separates tokens, so empty
+# tokens never occur. Tokens are case-folded and typographic apostrophes are normalized to "'".
+# The regex is compiled once and applied to whole lines or documents rather than word by word.
+
+APOSTROPHES = str.maketrans({"’": "'", "‘": "'", "ʼ": "'", "＇": "'"})
+TOKEN = re.compile(r"[^\W_]+(?:'[^\W_]+)*")
+
+def tokenize(text):
+    return TOKEN.findall(text.translate(APOSTROPHES).casefold())
+
+def measure_throughput(texts):
+    # Tokenize the texts and report how fast it went, in tokens per second
+    start_time = time.perf_counter()
+    num_tokens = sum(len(tokenize(text)) for text in texts)
+    return report_throughput(num_tokens, time.perf_counter() - start_time)
+
+def report_throughput(num_tokens, elapsed, action = "Tokenized"):
+    tokens_per_second = num_tokens / elapsed if elapsed > 0 else float("inf")
+    print(f"{action} {num_tokens} tokens in {elapsed:.3f} seconds ({tokens_per_second:,.0f} tokens/sec)")
+    return tokens_per_second
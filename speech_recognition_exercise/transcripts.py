@@ -0,0 +1,45 @@
+import os
+import re
+import json
+
+# Transcripts are saved twice: as readable "Speaker N: text" lines (.txt) and as structured records
+# (.jsonl next to it, one JSON object per segment with the speaker, text, confidence and word
+# timings). The analyses read the records, so nothing has to be recovered from the text by splitting
+# on colons; the text is only parsed for transcripts saved before the records existed.
+
+SPEAKER_LINE = re.compile(r"^Speaker (\d+): ?(.*)$")
+
+def records_file(text_filename):
+    return os.path.splitext(text_filename)[0] + ".jsonl"
+
+def save_transcript_records(transcriptions, text_filename):
+    with open(records_file(text_filename), "w") as f:
+        for transcription in transcriptions:
+            f.write(json.dumps(transcription) + "\n")
+
+def speaker_of(record):
+    # Speaker labels are compared as strings, as parsed from the text; transcripts without diarization have None
+    return None if record.get("speaker_label") is None else str(record["speaker_label"])
+
+def parse_record(line):
+    # (speaker, text) of a JSONL record
+    record = json.loads(line)
+    return speaker_of(record), record["transcript"]
+
+def parse_archive_record(line):
+    # (transcription, speaker, text) of a record in a partitioned dataset, where records of many transcripts are mixed
+    record = json.loads(line)
+    return record["transcription"], speaker_of(record), record["transcript"]
+
+def parse_transcript_line(line):
+    # (speaker, text) of a "Speaker N: text" line, or (None, line) for lines without a speaker label
+    match = SPEAKER_LINE.match(line)
+    return (match.group(1), match.group(2)) if match else (None, line.rstrip("\n"))
+
+def read_transcript_records(text_file):
+    # (speaker, text) per segment, from the records when they exist and from the text otherwise
+    if os.path.exists(records_file(text_file)):
+        with open(records_file(text_file)) as f:
+            return [parse_record(line) for line in f if line.strip()]
+    with open(text_file) as f:
+        return [parse_transcript_line(line) for line in f]
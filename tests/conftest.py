@@ -0,0 +1,14 @@
+import os
+import numpy as np
+import pytest
+import soundfile as sf
+
+@pytest.fixture
+def make_wav(tmp_path):
+    # Writes a short 16-bit recording of noise (seeded, so equal seeds give equal audio) and returns its path
+    def make(name, seconds = 1.0, sample_rate = 16000, seed = 0, directory = None):
+        path = os.path.join(directory or tmp_path, name)
+        signal = np.random.default_rng(seed).uniform(-0.5, 0.5, int(seconds * sample_rate))
+        sf.write(path, signal, sample_rate, subtype = "PCM_16")
+        return path
+    return make
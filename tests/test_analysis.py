@@ -0,0 +1,75 @@
+import os
+import json
+import tempfile
+import pytest
+from speech_recognition_exercise.transcripts import save_transcript_records
+
+pyspark = pytest.importorskip("pyspark")
+from speech_recognition_exercise.analysis import (transcript_records, count_word_occurrences, count_conversational_turns,
+                                                  count_speaker_statistics)
+
+@pytest.fixture(scope = "module")
+def sc():
+    try:
+        sc = pyspark.SparkContext("local[2]", "tests")
+    except Exception as e: # No Java, for instance
+        pytest.skip(f"Spark is not available: {e}")
+    yield sc
+    sc.stop()
+
+def write_transcripts(folder, count):
+    # Diarized transcripts with structured records, plus one older transcript that only has its text
+    os.makedirs(folder)
+    for i in range(count):
+        save_transcript_records([{"speaker_label": 1, "transcript": f"hello there number {i}"},
+                                 {"speaker_label": 2, "transcript": "hello again"},
+                                 {"speaker_label": 1, "transcript": f"hello there number {i}"}], os.path.join(folder, f"talk_{i}.txt"))
+        open(os.path.join(folder, f"talk_{i}.txt"), "w").close()
+    with open(os.path.join(folder, "legacy.txt"), "w") as f:
+        f.write("Speaker 3: Good morning, good people\n")
+
+def jobs_run(sc, function, records, group):
+    sc.setJobGroup(group, group)
+    function(records)
+    sc.setLocalProperty("spark.jobGroup.id", None)
+    return len(sc.statusTracker().getJobIdsForGroup(group))
+
+def test_counts_per_transcription(sc, tmp_path):
+    write_transcripts(str(tmp_path / "text"), 2)
+    transcriptions, records = transcript_records(sc, str(tmp_path / "text"))
+    assert transcriptions == ["legacy", "talk_0", "talk_1"]
+
+    word_counts = count_word_occurrences(records)
+    assert word_counts["talk_0"] == {"hello": 3, "there": 2, "number": 2, "0": 2, "again": 1}
+    assert word_counts["legacy"] == {"good": 2, "morning": 1, "people": 1}
+
+    _, turns, total_words, total_lines = count_conversational_turns(records)
+    assert (turns["talk_1"], total_words["talk_1"], total_lines["talk_1"]) == (2, 10, 2)
+
+    speaker_word_counts, speaker_turns, speaker_lines, speaker_words, unique_words = count_speaker_statistics(records)
+    assert speaker_word_counts["talk_0"]["1"] == {"hello": 2, "there": 2, "number": 2, "0": 2}
+    assert (speaker_turns["talk_0"]["1"], speaker_lines["talk_0"]["1"], speaker_words["talk_0"]["1"], unique_words["talk_0"]["1"]) == (2, 1, 8, 4)
+    assert speaker_words["legacy"] == {"3": 4}
+
+@pytest.mark.parametrize("function", [count_word_occurrences, count_conversational_turns, count_speaker_statistics])
+def test_spark_jobs_do_not_grow_with_the_archive(sc, tmp_path, function):
+    write_transcripts(str(tmp_path / "small"), 2)
+    write_transcripts(str(tmp_path / "large"), 8)
+    small = jobs_run(sc, function, transcript_records(sc, str(tmp_path / "small"))[1], f"{function.__name__}-small")
+    large = jobs_run(sc, function, transcript_records(sc, str(tmp_path / "large"))[1], f"{function.__name__}-large")
+    assert small == large <= 4
+
+def test_fake_backend_archive(sc, tmp_path, make_wav):
+    from speech_recognition_exercise.distributed import transcribe_archive
+    audio_files = [make_wav(f"recording_{i}.wav", seconds = 0.2, seed = i) for i in range(4)]
+    temp_directories = set(os.listdir(tempfile.gettempdir()))
+    transcribe_archive(sc, audio_files, str(tmp_path / "archive"), backend = "fake", num_partitions = 2)
+    # The stand-in "buckets" of the partitions are removed once they are done
+    assert not {name for name in set(os.listdir(tempfile.gettempdir())) - temp_directories if name.startswith("fake_gcs_")}
+
+    transcriptions, records = transcript_records(sc, str(tmp_path / "archive"))
+    assert transcriptions == [f"recording_{i}" for i in range(4)]
+    word_counts = count_word_occurrences(records)
+    assert word_counts["recording_2"]["transcript"] == 1
+    with open(os.path.join(tmp_path / "archive", "part-00000")) as f:
+        assert json.loads(f.readline())["transcription"] == "recording_0"
@@ -0,0 +1,19 @@
+import pytest
+from speech_recognition_exercise.audio_files import WavWindowReader
+
+def test_overlapping_windows_cover_the_file(make_wav):
+    reader = WavWindowReader(make_wav("speech.wav", seconds = 2.5))
+    try:
+        windows = [(start, len(samples)) for start, samples in reader.iter_windows(window_seconds = 1, overlap_seconds = 0.5)]
+    finally:
+        reader.close()
+    assert windows == [(0.0, 16000), (0.5, 16000), (1.0, 16000), (1.5, 16000), (2.0, 8000)]
+
+@pytest.mark.parametrize("window_seconds, overlap_seconds", [(30, 30), (30, 45), (0, 0), (-5, 0), (30, -1)])
+def test_windows_that_never_advance_are_rejected(make_wav, window_seconds, overlap_seconds):
+    reader = WavWindowReader(make_wav("speech.wav"))
+    try:
+        with pytest.raises(ValueError):
+            reader.iter_windows(window_seconds = window_seconds, overlap_seconds = overlap_seconds)
+    finally:
+        reader.close()
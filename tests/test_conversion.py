@@ -0,0 +1,40 @@
+import os
+import numpy as np
+import pytest
+import soundfile as sf
+from speech_recognition_exercise.conversion import convert_audio_files
+
+@pytest.fixture
+def stereo_wav(tmp_path):
+    path = str(tmp_path / "talk.wav")
+    sf.write(path, np.random.default_rng(0).uniform(-0.5, 0.5, (8000, 2)), 16000, subtype = "PCM_16")
+    return path
+
+def directory_files(directory):
+    return sorted(os.path.join(directory, file) for file in os.listdir(directory) if file.endswith(".wav"))
+
+def test_mono_outputs_are_not_converted_again(tmp_path, stereo_wav):
+    assert convert_audio_files([stereo_wav], mono = True, max_workers = 1) == [str(tmp_path / "talk_mono.wav")]
+    assert sf.info(str(tmp_path / "talk_mono.wav")).channels == 1
+
+    # The rerun sees talk_mono.wav in the directory, but neither converts it nor talk.wav again
+    outputs = convert_audio_files(directory_files(str(tmp_path)), mono = True, max_workers = 1)
+    assert outputs == [str(tmp_path / "talk_mono.wav")]
+    assert not os.path.exists(tmp_path / "talk_mono_mono.wav")
+
+def test_sources_with_the_same_output_are_refused(tmp_path, stereo_wav):
+    flac_file = str(tmp_path / "talk.flac")
+    sf.write(flac_file, sf.read(stereo_wav)[0], 16000)
+    with pytest.raises(ValueError, match = "talk.wav, talk.flac -> talk_mono.wav"):
+        convert_audio_files([stereo_wav, flac_file], mono = True, max_workers = 1)
+    assert not os.path.exists(tmp_path / "talk_mono.wav")
+    # Without --mono, converting talk.flac would overwrite the source talk.wav
+    with pytest.raises(ValueError):
+        convert_audio_files([stereo_wav, flac_file], max_workers = 1)
+
+def test_up_to_date_outputs_are_skipped_by_hash(tmp_path, stereo_wav, capsys):
+    output_directory = str(tmp_path / "mono")
+    convert_audio_files([stereo_wav], output_directory, mono = True, check = "hash", max_workers = 1)
+    capsys.readouterr()
+    convert_audio_files([stereo_wav], output_directory, mono = True, check = "hash", max_workers = 1)
+    assert "Converting 0 files, 1 already up to date" in capsys.readouterr().out
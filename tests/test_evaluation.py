@@ -0,0 +1,43 @@
+import os
+import random
+from speech_recognition_exercise.evaluation import align, evaluate_transcripts, EQUAL
+
+def brute_force_distance(reference, hypothesis):
+    # Textbook cell-by-cell edit distance
+    previous = list(range(len(hypothesis) + 1))
+    for i, reference_word in enumerate(reference, 1):
+        row = [i]
+        for j, hypothesis_word in enumerate(hypothesis, 1):
+            row.append(min(previous[j - 1] + (reference_word != hypothesis_word), previous[j] + 1, row[j - 1] + 1))
+        previous = row
+    return previous[-1]
+
+def test_alignment_matches_brute_force_edit_distance():
+    generator = random.Random(0)
+    for _ in range(300):
+        reference = [generator.choice("abcd") for _ in range(generator.randint(0, 12))]
+        hypothesis = [generator.choice("abcde") for _ in range(generator.randint(0, 12))]
+        alignment = align(reference, hypothesis)
+        assert sum(operation != EQUAL for operation, _, _ in alignment) == brute_force_distance(reference, hypothesis)
+        # The alignment uses every word exactly once, in order
+        assert [i for _, i, _ in alignment if i is not None] == list(range(len(reference)))
+        assert [j for _, _, j in alignment if j is not None] == list(range(len(hypothesis)))
+
+def write_transcript(folder, text):
+    os.makedirs(folder, exist_ok = True)
+    with open(os.path.join(folder, "meeting.txt"), "w") as f:
+        f.write(text + "\n")
+
+def test_hypothesis_folders_with_the_same_name_keep_separate_diffs(tmp_path):
+    write_transcript(tmp_path / "reference", "the cat sat on the mat")
+    write_transcript(tmp_path / "a" / "Transcriptions", "the cat sat on the mat")
+    write_transcript(tmp_path / "b" / "Transcriptions", "the dog sat on a mat")
+    output_directory = tmp_path / "evaluation"
+    hypothesis_folders = [str(tmp_path / "a" / "Transcriptions"), str(tmp_path / "b" / "Transcriptions")]
+    file_rows, _ = evaluate_transcripts(str(tmp_path / "reference"), hypothesis_folders, str(output_directory), max_workers = 1)
+
+    assert [row["WER"] for row in file_rows] == [0.0, 2 / 6]
+    with open(output_directory / "diffs" / "a" / "Transcriptions" / "meeting_diff.txt") as f:
+        assert "S" not in [line[0] for line in f]
+    with open(output_directory / "diffs" / "b" / "Transcriptions" / "meeting_diff.txt") as f:
+        assert f.read().splitlines()[1] == "S cat -> dog"
@@ -0,0 +1,24 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import soundfile as sf
+from speech_recognition_exercise.features import save_feature_array, extract_corpus_features
+
+def test_concurrent_saves_of_the_same_array_do_not_collide(tmp_path):
+    path = str(tmp_path / "features.npy")
+    array = np.arange(10000, dtype = np.float32)
+    with ThreadPoolExecutor(max_workers = 8) as executor:
+        for future in [executor.submit(save_feature_array, array, path) for _ in range(64)]:
+            future.result()
+    assert np.array_equal(np.load(path), array)
+    assert os.listdir(tmp_path) == ["features.npy"]
+
+def test_recordings_with_the_same_audio_share_cached_features(tmp_path, make_wav):
+    original = make_wav("original.wav", seed = 4)
+    copy = str(tmp_path / "copy.wav")
+    sf.write(copy, sf.read(original, dtype = 'int16')[0], 16000, subtype = "PCM_16")
+    cache_directory = str(tmp_path / "cache")
+    features = extract_corpus_features([original, copy], cache_directory, max_workers = 2)
+    assert np.array_equal(features[original]["mfcc"], features[copy]["mfcc"])
+    assert sorted(os.listdir(cache_directory)) == sorted(os.path.basename(path) for path in
+                                                        (features[original]["log_mel"].filename, features[original]["mfcc"].filename))
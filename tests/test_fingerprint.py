@@ -0,0 +1,36 @@
+import os
+import soundfile as sf
+from speech_recognition_exercise.fingerprint import FingerprintIndex, fingerprint_file, deduplicate_audio_files
+
+def test_only_duplicates_reuse_a_transcript(tmp_path, make_wav, capsys):
+    original = make_wav("original.wav", seconds = 20.0, seed = 1)
+    signal, sample_rate = sf.read(original)
+    duplicate = str(tmp_path / "duplicate.flac")
+    sf.write(duplicate, signal, sample_rate)
+    excerpt = str(tmp_path / "excerpt.wav")
+    sf.write(excerpt, signal[5 * sample_rate:9 * sample_rate], sample_rate, subtype = "PCM_16")
+    unrelated = make_wav("unrelated.wav", seconds = 5.0, seed = 2)
+
+    text_folder = tmp_path / "text"
+    text_folder.mkdir()
+    (text_folder / "original.txt").write_text("the whole twenty seconds")
+    index = FingerprintIndex(str(tmp_path / "fingerprints.db"))
+    index.add(original, *fingerprint_file(original)[1:])
+
+    to_transcribe, pending = deduplicate_audio_files([duplicate, excerpt, unrelated], index, str(text_folder), max_workers = 1)
+    assert to_transcribe == [excerpt, unrelated]
+    assert pending == {}
+    assert (text_folder / "duplicate.txt").read_text() == "the whole twenty seconds"
+    # The excerpt is recognized as part of the original, but transcribed on its own
+    assert "excerpt.wav contained in original.wav" in capsys.readouterr().out
+    assert not os.path.exists(text_folder / "excerpt.txt")
+
+def test_duplicates_in_the_same_batch_wait_for_the_original(tmp_path, make_wav):
+    original = make_wav("original.wav", seconds = 10.0, seed = 3)
+    signal, sample_rate = sf.read(original)
+    duplicate = str(tmp_path / "original_mono.flac")
+    sf.write(duplicate, signal, sample_rate)
+    index = FingerprintIndex(str(tmp_path / "fingerprints.db"))
+    to_transcribe, pending = deduplicate_audio_files([original, duplicate], index, str(tmp_path), max_workers = 1)
+    assert to_transcribe == [original]
+    assert pending == {duplicate: os.path.abspath(original)}
@@ -0,0 +1,108 @@
+import os
+import socket
+import subprocess
+import sys
+from types import SimpleNamespace
+import pytest
+from speech_recognition_exercise import jobqueue
+from speech_recognition_exercise.audio_files import hash_audio_pcm
+from speech_recognition_exercise.jobqueue import JobQueue, run_worker, record_uploads, QUEUED, UPLOADED, SUBMITTED, COMPLETED, FAILED
+from speech_recognition_exercise.local_clients import LocalStorageClient, LocalSpeechClient
+
+@pytest.fixture
+def database(tmp_path):
+    return str(tmp_path / "jobs.db")
+
+def dead_worker():
+    # The id of a worker process on this host that has exited
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return f"{socket.gethostname()}:{process.pid}"
+
+def run_local_worker(database, tmp_path, speech_client, manifest = None):
+    text_folder = tmp_path / "text"
+    text_folder.mkdir(exist_ok = True)
+    run_worker(database, LocalStorageClient(str(tmp_path / "gcs")), speech_client, "bucket", "audio", str(text_folder),
+               {} if manifest is None else manifest)
+
+def test_jobs_of_dead_workers_count_as_attempts(database, make_wav):
+    queue = JobQueue(database)
+    audio_file = make_wav("crash.wav")
+    queue.enqueue([audio_file])
+    for _ in range(3):
+        job = queue.claim(dead_worker())
+        assert job is not None
+    # The third crash used up the last attempt
+    assert queue.claim("someone:1") is None
+    assert queue.counts() == {FAILED: 1}
+
+def test_interrupted_jobs_do_not_count_as_attempts(database, tmp_path, make_wav, monkeypatch):
+    audio_file = make_wav("interrupted.wav")
+    queue = JobQueue(database)
+    queue.enqueue([audio_file])
+
+    def interrupt(*args):
+        raise KeyboardInterrupt
+    monkeypatch.setattr(jobqueue, "await_recognition", interrupt)
+    for _ in range(4):
+        with pytest.raises(KeyboardInterrupt):
+            run_local_worker(database, tmp_path, LocalSpeechClient(latency = 0.0))
+    job = dict(queue.connection.execute("SELECT * FROM jobs").fetchone())
+    assert (job["state"], job["attempts"], job["worker"]) == (SUBMITTED, 0, None)
+
+    monkeypatch.undo()
+    run_local_worker(database, tmp_path, LocalSpeechClient(latency = 0.0))
+    assert queue.counts() == {COMPLETED: 1}
+
+def test_failed_jobs_are_retried_from_their_last_step(database, make_wav):
+    audio_files = [make_wav(f"file_{i}.wav", seed = i) for i in range(3)]
+    queue = JobQueue(database)
+    queue.enqueue(audio_files)
+    queue.update(os.path.abspath(audio_files[1]), FAILED, gcs_uri = "gs://bucket/audio/1.wav", attempts = 3)
+    queue.update(os.path.abspath(audio_files[2]), FAILED, gcs_uri = "gs://bucket/audio/2.wav", operation_name = "local-0-2", attempts = 3)
+    queue.update(os.path.abspath(audio_files[0]), FAILED, attempts = 3)
+
+    # Enqueueing the files again leaves them failed; only an explicit retry resets them
+    assert queue.enqueue(audio_files) == 0
+    assert queue.claim("someone:1") is None
+    assert queue.retry_failed() == 3
+    assert queue.counts() == {QUEUED: 1, UPLOADED: 1, SUBMITTED: 1}
+    assert queue.claim("someone:1")["attempts"] == 0
+
+def test_worker_completes_queued_files_and_records_uploads(database, tmp_path, make_wav):
+    audio_files = [make_wav(f"file_{i}.wav", seed = i) for i in range(3)]
+    queue = JobQueue(database)
+    queue.enqueue(audio_files)
+    run_local_worker(database, tmp_path, LocalSpeechClient(latency = 0.0))
+    assert queue.counts() == {COMPLETED: 3}
+
+    # The worker's copy of the manifest is lost with its process; the parent rebuilds the entries from the job table
+    manifest = record_uploads(database, {})
+    assert set(manifest) == {hash_audio_pcm(audio_file) for audio_file in audio_files}
+
+def test_submitted_jobs_resume_without_uploading_again(database, tmp_path, make_wav, monkeypatch):
+    audio_file = make_wav("resume.wav")
+    speech_client = LocalSpeechClient(latency = 0.0)
+    operation = speech_client.long_running_recognize(config = None, audio = SimpleNamespace(uri = "gs://bucket/audio/x.wav"))
+    queue = JobQueue(database)
+    queue.enqueue([audio_file])
+    queue.update(queue.claim("setup:1")["audio_file"], SUBMITTED, gcs_uri = "gs://bucket/audio/x.wav",
+                 operation_name = operation.operation.name, worker = None)
+
+    monkeypatch.setattr(jobqueue, "upload_audio", lambda *args: pytest.fail("uploaded again"))
+    monkeypatch.setattr(jobqueue, "submit_recognition", lambda *args: pytest.fail("submitted again"))
+    run_local_worker(database, tmp_path, speech_client)
+    assert queue.counts() == {COMPLETED: 1}
+
+def test_expired_operations_are_submitted_again(database, tmp_path, make_wav):
+    audio_file = make_wav("expired.wav")
+    queue = JobQueue(database)
+    queue.enqueue([audio_file])
+    run_local_worker(database, tmp_path, LocalSpeechClient(latency = 0.0))
+    gcs_uri = queue.uploaded_objects()[0]
+    queue.update(queue.connection.execute("SELECT audio_file FROM jobs").fetchone()[0], SUBMITTED,
+                 gcs_uri = gcs_uri, operation_name = "local-0-unknown")
+
+    # A new client knows nothing about the operation, like the API once an operation has expired
+    run_local_worker(database, tmp_path, LocalSpeechClient(latency = 0.0))
+    assert queue.counts() == {COMPLETED: 1}
@@ -0,0 +1,45 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+import pytest
+from speech_recognition_exercise import local_clients
+from speech_recognition_exercise.audio_files import hash_audio_pcm
+from speech_recognition_exercise.local_clients import LocalStorageClient, LocalSpeechClient
+from speech_recognition_exercise.loadtest import unique_requests, run_streams, run_batch
+
+@pytest.fixture
+def upload_calls(monkeypatch):
+    # Counts the files actually written to the stand-in bucket
+    calls = []
+    lock = threading.Lock()
+    upload = local_clients.LocalBlob.upload_from_filename
+
+    def counting_upload(self, local_file, if_generation_match = None):
+        upload(self, local_file, if_generation_match)
+        with lock:
+            calls.append(self.path)
+    monkeypatch.setattr(local_clients.LocalBlob, "upload_from_filename", counting_upload)
+    return calls
+
+@pytest.fixture
+def requests(tmp_path, make_wav):
+    corpus = [make_wav(f"corpus_{i}.wav", seconds = 0.2, seed = i) for i in range(4)]
+    return unique_requests(corpus, 64, str(tmp_path / "requests"))
+
+def test_replayed_requests_have_distinct_content(requests):
+    assert len({hash_audio_pcm(request_file) for request_file in requests}) == 64
+
+@pytest.mark.parametrize("run", [run_streams, run_batch])
+def test_every_request_is_uploaded(run, requests, upload_calls, tmp_path):
+    text_folder = tmp_path / "text"
+    text_folder.mkdir()
+    latencies, errors = run(requests, 16, LocalStorageClient(str(tmp_path / "gcs")), LocalSpeechClient(latency = 0.0), str(text_folder))
+    assert (len(latencies), errors) == (64, [])
+    assert len(set(upload_calls)) == 64
+
+def test_operation_names_are_unique_across_threads():
+    client = LocalSpeechClient(latency = 0.0)
+    audio = SimpleNamespace(uri = "gs://bucket/audio.wav")
+    with ThreadPoolExecutor(max_workers = 8) as executor:
+        operations = list(executor.map(lambda _: client.long_running_recognize(config = None, audio = audio), range(400)))
+    assert len({operation.operation.name for operation in operations}) == 400
@@ -0,0 +1,35 @@
+import os
+import numpy as np
+import pytest
+import soundfile as sf
+from scipy.signal import resample_poly
+from speech_recognition_exercise.normalization import iter_resampled_blocks, normalize_audio_files, read_downmixed
+
+@pytest.fixture
+def stereo_recording(tmp_path):
+    path = str(tmp_path / "talk.wav")
+    sf.write(path, np.random.default_rng(0).uniform(-0.5, 0.5, (44100 * 3 + 123, 2)), 44100, subtype = "PCM_16")
+    return path
+
+@pytest.mark.parametrize("block_frames", [441, 10000, 44100])
+def test_blockwise_resampling_equals_whole_file_resampling(stereo_recording, block_frames):
+    with sf.SoundFile(stereo_recording) as sound_file:
+        whole = resample_poly(read_downmixed(sound_file, 0, sound_file.frames), 160, 441)
+        blocks = np.concatenate(list(iter_resampled_blocks(sound_file, 160, 441, block_frames)))
+    assert len(blocks) == len(whole)
+    np.testing.assert_allclose(blocks, whole, atol = 1e-6)
+
+def test_recordings_are_normalized_to_16_khz_mono(tmp_path, stereo_recording):
+    output_folder = str(tmp_path / "Normalized")
+    [output_file] = normalize_audio_files([stereo_recording], output_folder, max_workers = 1)
+    info = sf.info(output_file)
+    assert (info.samplerate, info.channels) == (16000, 1)
+    assert abs(info.duration - sf.info(stereo_recording).duration) < 1e-3
+    assert os.listdir(output_folder) == ["talk.wav"]
+
+def test_recordings_with_the_same_output_are_refused(tmp_path, stereo_recording):
+    flac_file = str(tmp_path / "talk.flac")
+    sf.write(flac_file, np.zeros((16000, 2)), 44100)
+    with pytest.raises(ValueError, match = "talk.wav, talk.flac -> talk.wav"):
+        normalize_audio_files([stereo_recording, flac_file], str(tmp_path / "Normalized"), max_workers = 1)
+    assert not os.path.exists(tmp_path / "Normalized")
@@ -0,0 +1,32 @@
+import time
+import asyncio
+from speech_recognition_exercise.local_clients import LocalStorageClient, LocalSpeechClient
+from speech_recognition_exercise.pipeline import run_transcription_pipeline
+
+def run_pipeline(audio_files, tmp_path, speech_client, **options):
+    text_folder = tmp_path / "text"
+    text_folder.mkdir(exist_ok = True)
+    return asyncio.run(run_transcription_pipeline(audio_files, LocalStorageClient(str(tmp_path / "gcs")), speech_client,
+                                                  "bucket", "audio", str(text_folder), {}, **options))
+
+def test_stages_run_at_their_own_concurrency(tmp_path, make_wav):
+    audio_files = [make_wav(f"file_{i}.wav", seconds = 0.1, seed = i) for i in range(32)]
+    start = time.perf_counter()
+    completed = run_pipeline(audio_files, tmp_path, LocalSpeechClient(latency = 0.5),
+                             concurrency = {"await": 32}, queue_size = 32)
+    elapsed = time.perf_counter() - start
+    assert len(completed) == 32
+    # The await stage has 32 threads of its own, so all 32 recognitions wait at the same time: about one 0.5 s latency in total
+    assert elapsed < 1.5
+
+def test_failed_file_is_dropped_without_stopping_the_others(tmp_path, make_wav):
+    audio_files = [make_wav("good.wav"), str(tmp_path / "missing.wav")]
+    completed = run_pipeline(audio_files, tmp_path, LocalSpeechClient(latency = 0.0))
+    assert [item["local_file"] for item in completed] == [audio_files[0]]
+
+def test_speaker_labels_only_with_diarization(tmp_path, make_wav):
+    audio_file = make_wav("talk.wav")
+    for enable_diarization in (False, True):
+        completed = run_pipeline([audio_file], tmp_path, LocalSpeechClient(latency = 0.0), enable_diarization = enable_diarization)
+        with open(completed[0]["text_filename"]) as f:
+            assert f.read().startswith("Speaker") == enable_diarization
@@ -0,0 +1,43 @@
+import os
+import numpy as np
+import pytest
+import soundfile as sf
+import speech_recognition as sr
+from speech_recognition_exercise.audio_files import WavWindowReader
+from speech_recognition_exercise.distributed import web_backend
+from speech_recognition_exercise.recognition import transcribe_audio_file
+
+@pytest.fixture
+def requests(monkeypatch):
+    # Stands in for the Web Speech API: records the length of every request and answers with its number
+    durations = []
+    def recognize_google(recognizer, audio):
+        durations.append(len(audio.frame_data) / (audio.sample_rate * audio.sample_width))
+        return f"window{len(durations)}"
+    monkeypatch.setattr(sr.Recognizer, "recognize_google", recognize_google)
+    return durations
+
+def test_long_recordings_are_recognized_in_windows(make_wav, requests):
+    assert transcribe_audio_file(make_wav("long.wav", seconds = 75, sample_rate = 8000)) == "window1 window2 window3"
+    assert requests == [30.0, 30.0, 15.0]
+
+def test_short_recordings_are_recognized_in_one_request(make_wav, requests):
+    assert transcribe_audio_file(make_wav("short.wav", seconds = 5, sample_rate = 8000)) == "window1"
+    assert requests == [5.0]
+
+def test_web_backend_recognizes_long_stereo_recordings_in_windows(tmp_path, requests):
+    audio_file = str(tmp_path / "stereo.wav")
+    sf.write(audio_file, np.zeros((8000 * 61, 2)), 8000, subtype = "PCM_16")
+    assert web_backend()(audio_file) == [{"transcript": "window1 window2 window3", "speaker_label": None}]
+    assert requests == [30.0, 30.0, 1.0]
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason = "needs /proc to count open files")
+def test_reader_closes_the_file_when_it_is_not_a_wav(tmp_path):
+    not_wav = tmp_path / "notes.wav"
+    not_wav.write_bytes(b"just some text, not audio")
+    open_files = len(os.listdir("/proc/self/fd"))
+    with pytest.raises(ValueError, match = "Not a WAV file") as error:
+        WavWindowReader(str(not_wav))
+    # The traceback still references the half-constructed reader, so only an explicit close releases the file
+    assert error.value.__traceback__ is not None
+    assert len(os.listdir("/proc/self/fd")) == open_files
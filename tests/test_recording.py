@@ -0,0 +1,52 @@
+import queue
+import wave
+from types import SimpleNamespace
+import numpy as np
+import pytest
+import soundfile as sf
+
+recording = pytest.importorskip("speech_recognition_exercise.recording", exc_type = ImportError) # Needs PyAudio
+
+def fake_session(buffers, sample_rate = 16000):
+    # What a CaptureSession hands over: its recorded buffers followed by None once the recording has stopped
+    frames = queue.Queue()
+    for data in buffers + [None]:
+        frames.put(data)
+    return SimpleNamespace(frames = frames, sample_rate = sample_rate, channels = 1, bytes_per_frame = 2)
+
+@pytest.fixture
+def buffers():
+    samples = np.random.default_rng(0).integers(-2 ** 15, 2 ** 15, 5000, dtype = np.int16)
+    return [samples[start:start + 1024].tobytes() for start in range(0, len(samples), 1024)]
+
+def test_sample_width_is_the_size_of_one_sample(tmp_path, buffers):
+    # Not the size of a frame, which only coincides with it for mono sessions
+    session = fake_session(buffers)
+    session.channels, session.bytes_per_frame = 2, 4
+    audio, writer, _ = recording.capture_audio_data(session, str(tmp_path / "recording.wav"))
+    writer.join()
+    assert audio.sample_width == 2
+
+def test_the_writer_receives_the_recognized_buffers(tmp_path, buffers, monkeypatch):
+    received = []
+    def write_wav(file_path, sample_rate, frame_queue):
+        while (data := frame_queue.get()) is not None:
+            received.append(data)
+    monkeypatch.setattr(recording, "write_wav", write_wav)
+    audio, writer, _ = recording.capture_audio_data(fake_session(buffers), str(tmp_path / "recording.wav"))
+    writer.join()
+    assert len(received) == len(buffers) and all(data is buffer for data, buffer in zip(received, buffers))
+    assert audio.get_raw_data() == b"".join(buffers)
+
+@pytest.mark.parametrize("file_format", ["wav", "flac"])
+def test_audio_data_equals_the_written_file(tmp_path, buffers, file_format):
+    file_path = str(tmp_path / f"recording.{file_format}")
+    audio, writer, _ = recording.capture_audio_data(fake_session(buffers), file_path, file_format)
+    writer.join()
+    assert (audio.sample_rate, audio.sample_width) == (16000, 2)
+    samples, sample_rate = sf.read(file_path, dtype = "int16")
+    assert sample_rate == 16000
+    assert samples.tobytes() == audio.get_raw_data()
+    if file_format == "wav":
+        with wave.open(file_path) as wav_file:
+            assert wav_file.getsampwidth() == audio.sample_width
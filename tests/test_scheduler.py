@@ -0,0 +1,56 @@
+import time
+import pytest
+from speech_recognition_exercise.local_clients import QuotaLimitedBackend
+from speech_recognition_exercise.scheduler import TokenBucket, QuotaScheduler, is_quota_error, INTERACTIVE, BACKFILL
+
+def test_bucket_holds_a_few_seconds_of_quota():
+    bucket = TokenBucket(60)
+    assert bucket.capacity == pytest.approx(5.0)
+    # Burst plus one window of refill is exactly the quota
+    assert bucket.capacity + 60.0 * bucket.rate == pytest.approx(60.0)
+
+def test_unlimited_bucket_never_waits():
+    bucket = TokenBucket(float("inf"))
+    bucket.consume(1000.0)
+    assert bucket.time_until(1000.0) == 0.0
+
+def test_scheduler_stays_within_a_sliding_window_quota():
+    # The backend rejects any request beyond 20 in a sliding 2 second window, so no rejections means the scheduler
+    # never admitted more than per_window requests in any window
+    backend = QuotaLimitedBackend(20, float("inf"), window_seconds = 2.0)
+    start = time.monotonic()
+    with QuotaScheduler(20, float("inf"), max_workers = 8, window_seconds = 2.0) as scheduler:
+        futures = [scheduler.submit(backend.recognize, 1.0, 1.0) for _ in range(30)]
+        for future in futures:
+            future.result()
+    elapsed = time.monotonic() - start
+    assert backend.rejected == 0
+    # A small burst and then the steady refill rate: 30 jobs at 20 per window finish within two windows
+    assert elapsed < 4.0
+
+def test_quota_errors_back_off_and_recover():
+    with QuotaScheduler(float("inf"), float("inf"), initial_backoff = 0.01, window_seconds = 2.0) as scheduler:
+        scheduler.on_quota_error()
+        assert scheduler.rate_scale == 0.75
+        for _ in range(3):
+            scheduler.on_success()
+        assert scheduler.rate_scale == 1.0
+        assert scheduler.max_backoff == 2.0
+
+def test_interactive_jobs_start_first():
+    started = []
+    with QuotaScheduler(2, float("inf"), max_workers = 1, window_seconds = 1.0) as scheduler:
+        # The bucket only holds a fraction of a request, so every job after the first has to wait its turn
+        futures = [scheduler.submit(started.append, 1.0, name, priority = priority)
+                   for name, priority in [("backfill", BACKFILL), ("backfill", BACKFILL), ("interactive", INTERACTIVE)]]
+        for future in futures:
+            future.result()
+    assert started.index("interactive") < 2
+
+def test_quota_errors_are_recognized_by_type_code_or_message():
+    from google.api_core.exceptions import ResourceExhausted
+    assert is_quota_error(ResourceExhausted("Quota exceeded"))
+    assert is_quota_error(RuntimeError("HTTP 429 Too Many Requests"))
+    assert is_quota_error(RuntimeError("Quota exceeded for quota metric 'Requests'"))
+    assert not is_quota_error(TypeError("QuotaLimitedBackend.recognize() missing 1 required positional argument"))
+    assert not is_quota_error(FileNotFoundError("recording_14290.wav"))
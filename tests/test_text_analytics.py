@@ -0,0 +1,64 @@
+import os
+import zlib
+import numpy as np
+from scipy import sparse
+from speech_recognition_exercise.text_analytics import NgramVectorizer, tfidf, top_terms, top_similar, tfidf_report
+
+TEXTS = ["The cat sat on the mat.", "The dog sat on the log!", "A cat and a dog.", "the cat sat on the mat"]
+
+def test_counts_are_n_gram_occurrences_per_document():
+    vectorizer = NgramVectorizer(ngram_range = (1, 2))
+    counts = vectorizer.transform(TEXTS)
+    assert isinstance(counts, sparse.csr_matrix)
+    assert counts.shape == (4, len(vectorizer.terms))
+    first = {vectorizer.term(column): count for column, count in zip(counts[0].indices, counts[0].data)}
+    assert first == {"the": 2, "cat": 1, "sat": 1, "on": 1, "mat": 1, "the cat": 1, "cat sat": 1, "sat on": 1, "on the": 1, "the mat": 1}
+    # Case and punctuation do not make different n-grams
+    assert (counts[0] != counts[3]).nnz == 0
+    assert vectorizer.num_tokens == 6 + 6 + 5 + 6
+
+def test_hashed_columns_match_vocabulary_columns():
+    vocabulary_counts = NgramVectorizer().transform(TEXTS)
+    vectorizer = NgramVectorizer(n_features = 2 ** 20)
+    hashed_counts = vectorizer.transform(TEXTS)
+    terms = NgramVectorizer()
+    terms.transform(TEXTS)
+    buckets = [zlib.crc32(term.encode()) % 2 ** 20 for term in terms.terms]
+    assert len(set(buckets)) == len(buckets) # No collisions, so hashing only moves the columns
+    assert (hashed_counts[:, buckets] != vocabulary_counts).nnz == 0
+    assert [vectorizer.term(bucket) for bucket in buckets] == terms.terms
+
+def test_tfidf_rows_have_unit_norm():
+    weights = tfidf(NgramVectorizer().transform(TEXTS + [""]))
+    norms = np.sqrt(np.asarray(weights.multiply(weights).sum(axis = 1)).ravel())
+    np.testing.assert_allclose(norms, [1.0, 1.0, 1.0, 1.0, 0.0])
+
+def test_top_terms_are_the_highest_weights_in_order():
+    vectorizer = NgramVectorizer(ngram_range = (1, 1))
+    weights = tfidf(vectorizer.transform(TEXTS))
+    for row, terms in enumerate(top_terms(weights, vectorizer, k = 3)):
+        dense = weights[row].toarray().ravel()
+        assert [score for _, score in terms] == sorted(dense, reverse = True)[:3]
+        assert all(dense[vectorizer.vocabulary[term]] == score for term, score in terms)
+
+def test_similar_documents_exclude_the_document_itself():
+    weights = tfidf(NgramVectorizer().transform(TEXTS))
+    similar = top_similar(weights, k = 2, chunk_size = 3)
+    for row, matches in enumerate(similar):
+        assert row not in [i for i, _ in matches]
+        assert len(matches) == 2
+    # Documents 0 and 3 only differ in case and punctuation
+    assert similar[0][0][0] == 3 and np.isclose(similar[0][0][1], 1.0)
+    assert similar[3][0][0] == 0
+
+def test_report_writes_top_terms_and_similarities(tmp_path):
+    folder = tmp_path / "WithDiarization"
+    folder.mkdir()
+    for i, text in enumerate(TEXTS):
+        (folder / f"talk_{i}.txt").write_text(f"Speaker 1: {text}\nSpeaker 2: something else entirely\n")
+    output_directory = tmp_path / "TFIDF"
+    output_directory.mkdir()
+    transcript_tfidf, speaker_tfidf, _ = tfidf_report(str(folder), str(output_directory), k = 2)
+    assert (transcript_tfidf.shape[0], speaker_tfidf.shape[0]) == (4, 8)
+    assert sorted(os.listdir(output_directory)) == ["tfidf_top_terms_by_speaker.csv", "tfidf_top_terms_by_transcript.csv",
+                                                   "transcript_similarity.csv"]
@@ -0,0 +1,29 @@
+from datetime import timedelta
+from types import SimpleNamespace
+import pytest
+from speech_recognition_exercise.cloud import extract_transcriptions, save_transcription
+from speech_recognition_exercise.transcripts import records_file, read_transcript_records, parse_transcript_line
+
+def response(speaker_tag):
+    words = [SimpleNamespace(word = word, speaker_tag = speaker_tag, start_time = timedelta(seconds = i), end_time = timedelta(seconds = i + 0.5))
+             for i, word in enumerate(["Ratio:", "3", "to", "1"])]
+    return SimpleNamespace(results = [SimpleNamespace(alternatives = [SimpleNamespace(words = words, confidence = 0.9)])])
+
+@pytest.mark.parametrize("enable_diarization, speaker_tag, expected_speaker", [(False, 0, None), (True, 2, "2")])
+def test_records_and_text_agree_on_speakers(tmp_path, enable_diarization, speaker_tag, expected_speaker):
+    transcriptions = extract_transcriptions(response(speaker_tag), enable_diarization = enable_diarization)
+    assert transcriptions[0]["transcript"] == "Ratio: three to one"
+    text_file = str(tmp_path / "talk.txt")
+    save_transcription(transcriptions, text_file, with_speaker_labels = enable_diarization)
+
+    from_records = read_transcript_records(text_file)
+    with open(text_file) as f:
+        from_text = [parse_transcript_line(line) for line in f]
+    assert from_records == from_text == [(expected_speaker, "Ratio: three to one")]
+
+def test_records_keep_colons_in_the_text(tmp_path):
+    text_file = str(tmp_path / "talk.txt")
+    save_transcription(extract_transcriptions(response(1), enable_diarization = True), text_file)
+    with open(records_file(text_file)) as f:
+        assert '"speaker_label": 1' in f.readline()
+    assert read_transcript_records(text_file) == [("1", "Ratio: three to one")]